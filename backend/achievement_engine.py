@@ -0,0 +1,137 @@
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+
+# Requirement key -> user profile counter the requirement is evaluated against
+REQUIREMENT_COUNTERS = {
+    "sessions": "total_sessions",
+    "consecutive_days": "consecutive_days",
+    "courses": "courses_completed",
+    "mood_entries": "mood_entries",
+    "referrals": "referrals",
+}
+
+# Pseudo-counter for {"daily": True}: today's ordinal if the user practiced today, else 0
+PRACTICE_DAY = "practice_day"
+
+
+def _as_date(value) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def profile_metric(profile: Dict[str, Any], metric: str, today: date) -> int:
+    """Read a counter from a user profile document"""
+    if metric == PRACTICE_DAY:
+        return today.toordinal() if _as_date(profile.get("last_practice_date")) == today else 0
+    return profile.get(metric, 0) or 0
+
+
+class CompiledRule:
+    """One achievement reduced to counter thresholds"""
+
+    __slots__ = ("achievement", "id", "conditions", "repeatable", "reward")
+
+    def __init__(self, achievement: Dict[str, Any], conditions: List[tuple]):
+        self.achievement = achievement
+        self.id = achievement["id"]
+        self.conditions = conditions
+        self.repeatable = achievement.get("is_repeatable", False)
+        self.reward = achievement["zen_coin_reward"]
+
+    def progress(self, profile: Dict[str, Any], today: date) -> int:
+        """Value of the leading counter; repeatable rules fire once per increase of it"""
+        return profile_metric(profile, self.conditions[0][0], today)
+
+    def awards(self, profile: Dict[str, Any], mark: int, today: date) -> int:
+        """Awards a repeatable rule has earned since its mark
+
+        One per unit the leading counter rose past both the mark and the
+        threshold, so three referrals coalesced into one evaluation pay three
+        times. A practice day is an ordinal, not a count: one award per day.
+        """
+        metric, threshold = self.conditions[0]
+        if metric == PRACTICE_DAY:
+            return 1
+        return max(self.progress(profile, today) - max(mark, threshold - 1), 0)
+
+    def is_met(self, profile: Dict[str, Any], today: date) -> bool:
+        return all(profile_metric(profile, metric, today) >= threshold for metric, threshold in self.conditions)
+
+
+def compile_rule(achievement: Dict[str, Any]) -> Optional[CompiledRule]:
+    """Compile an achievement document; returns None if no requirement is evaluable"""
+    conditions = []
+    for key, value in achievement.get("requirements", {}).items():
+        if key == "daily" and value:
+            conditions.append((PRACTICE_DAY, 1))
+        elif key in REQUIREMENT_COUNTERS:
+            conditions.append((REQUIREMENT_COUNTERS[key], value))
+    if not conditions:
+        return None
+    return CompiledRule(achievement, conditions)
+
+
+class AchievementEngine:
+    """Achievement catalog compiled once and evaluated against profile counters only"""
+
+    def __init__(self, achievements: List[Dict[str, Any]]):
+        self.achievements = {achievement["id"]: achievement for achievement in achievements}
+        self.rules = [rule for rule in map(compile_rule, achievements) if rule is not None]
+
+    def evaluate(self, profile: Dict[str, Any], today: Optional[date] = None) -> List[CompiledRule]:
+        """Return the rules this profile newly satisfies, a repeatable rule once per award it earned"""
+        today = today or datetime.utcnow().date()
+        earned = set(profile.get("achievements", []))
+        marks = profile.get("achievement_marks", {})
+
+        unlocked = []
+        for rule in self.rules:
+            if rule.repeatable:
+                if rule.progress(profile, today) <= marks.get(rule.id, 0):
+                    continue
+            elif rule.id in earned:
+                continue
+            if not rule.is_met(profile, today):
+                continue
+            count = rule.awards(profile, marks.get(rule.id, 0), today) if rule.repeatable else 1
+            unlocked.extend([rule] * count)
+        return unlocked
+
+    def unlock_update(self, rules: List[CompiledRule], profile: Dict[str, Any], today: Optional[date] = None):
+        """Build (filter guard, update) applying all unlocks in one atomic write
+
+        The guard makes the update a no-op if a concurrent evaluation already
+        applied the same unlocks.
+        """
+        today = today or datetime.utcnow().date()
+        guard: Dict[str, Any] = {}
+        marks = {}
+        once = []
+        for rule in rules:
+            if rule.repeatable:
+                progress = rule.progress(profile, today)
+                marks[f"achievement_marks.{rule.id}"] = progress
+                guard[f"achievement_marks.{rule.id}"] = {"$not": {"$gte": progress}}
+            else:
+                once.append(rule.id)
+        if once:
+            guard["achievements"] = {"$nin": once}
+
+        update = {
+            "$addToSet": {"achievements": {"$each": list(dict.fromkeys(rule.id for rule in rules))}},
+            "$inc": {"zen_coins": sum(rule.reward for rule in rules)},
+            "$set": {**marks, "updated_at": datetime.utcnow()},
+        }
+        return guard, update
+
+    def baseline_marks(self, profile: Dict[str, Any], today: Optional[date] = None) -> Dict[str, int]:
+        """Marks for repeatable achievements a profile already holds, so they are not re-awarded"""
+        today = today or datetime.utcnow().date()
+        earned = set(profile.get("achievements", []))
+        return {
+            rule.id: rule.progress(profile, today)
+            for rule in self.rules
+            if rule.repeatable and rule.id in earned
+        }
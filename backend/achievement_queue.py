@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Count down one finished evaluation; the key goes away at zero, and a key that
+# already expired is not recreated at -1
+_PENDING_DONE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local left = redis.call('DECR', KEYS[1])
+if left <= 0 then
+    redis.call('DEL', KEYS[1])
+end
+return left
+"""
+
+
+class InMemoryPending:
+    """Process-local count of scheduled evaluations per user"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+
+    async def add(self, user_id: str):
+        self.counts[user_id] = self.counts.get(user_id, 0) + 1
+
+    async def done(self, user_id: str):
+        left = self.counts.get(user_id, 0) - 1
+        if left > 0:
+            self.counts[user_id] = left
+        else:
+            self.counts.pop(user_id, None)
+
+    async def is_pending(self, user_id: str) -> bool:
+        return user_id in self.counts
+
+    async def close(self):
+        pass
+
+
+class RedisPending:
+    """Scheduled evaluations per user counted in Redis, so every worker answers unlock polls alike
+
+    Each count expires ttl seconds after its last increment, so evaluations
+    lost with a crashed worker stop reporting pending eventually.
+    """
+
+    def __init__(self, redis_url: str, prefix: str = "zen:achievements:pending:", ttl: int = 300):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(redis_url)
+        self.prefix = prefix
+        self.ttl = ttl
+        self._done = self.redis.register_script(_PENDING_DONE_LUA)
+
+    async def add(self, user_id: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(self.prefix + user_id)
+            pipe.expire(self.prefix + user_id, self.ttl)
+            await pipe.execute()
+
+    async def done(self, user_id: str):
+        await self._done(keys=[self.prefix + user_id])
+
+    async def is_pending(self, user_id: str) -> bool:
+        return bool(await self.redis.exists(self.prefix + user_id))
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_pending(redis_url: Optional[str] = None):
+    """Set of users with an evaluation queued, shared by every worker through Redis
+
+    With no redis_url each worker tracks only the evaluations it queued itself.
+    """
+    if redis_url:
+        return RedisPending(redis_url)
+    return InMemoryPending()
+
+
+class AchievementQueue:
+    """Bounded work queue evaluating achievements off the request path
+
+    enqueue() is coalesced per user: a user already waiting in the queue is not
+    queued again, since one evaluation sees every counter committed before it
+    starts. A user enqueued while their evaluation is running is queued once
+    more so the newer writes are evaluated too. When the queue is full, or the
+    workers are not running, the caller evaluates inline; that is the
+    backpressure, and it is counted in stats().
+
+    Every scheduled evaluation is also counted in pending (see create_pending)
+    until it finishes, which is what is_pending() reports.
+    """
+
+    def __init__(self, evaluate: Callable[[str], Awaitable], workers: int = 4, maxsize: int = 10000, pending=None):
+        self.evaluate = evaluate
+        self.pending = pending or InMemoryPending()
+        self.workers = workers
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._closing = False
+        self._queued: Dict[str, float] = {}  # user id -> enqueue time
+        self._running: Dict[str, int] = {}  # user id -> evaluations in progress
+        self.counters = {"enqueued": 0, "coalesced": 0, "overflowed": 0, "processed": 0, "failed": 0}
+        self.max_depth = 0
+        self.last_wait = 0.0
+
+    def start(self):
+        if not self._tasks:
+            self._closing = False
+            self._queue = asyncio.Queue(self.maxsize)
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Finish every queued evaluation, then stop the workers"""
+        if not self._tasks:
+            return
+        self._closing = True
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def is_pending(self, user_id: str) -> bool:
+        """Whether an evaluation for user_id is queued or running on any worker sharing pending"""
+        return await self.pending.is_pending(user_id)
+
+    async def _mark(self, mark, user_id: str):
+        try:
+            await mark(user_id)
+        except Exception as e:
+            logger.warning("Could not update pending evaluations for %s: %s", user_id, e)
+
+    async def enqueue(self, user_id: str):
+        if user_id in self._queued:
+            self.counters["coalesced"] += 1
+            return
+        # Claimed before awaiting the pending count, so a concurrent enqueue coalesces into this one
+        self._queued[user_id] = time.monotonic()
+        await self._mark(self.pending.add, user_id)
+        if self._tasks and not self._closing:
+            try:
+                self._queue.put_nowait(user_id)
+                self.counters["enqueued"] += 1
+                self.max_depth = max(self.max_depth, self._queue.qsize())
+                return
+            except asyncio.QueueFull:
+                self.counters["overflowed"] += 1
+        # Not running (scripts, shutdown) or full: evaluate inline
+        del self._queued[user_id]
+        await self._run_one(user_id)
+
+    async def _work(self):
+        while True:
+            user_id = await self._queue.get()
+            try:
+                self.last_wait = time.monotonic() - self._queued.pop(user_id)
+                await self._run_one(user_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run_one(self, user_id: str):
+        self._running[user_id] = self._running.get(user_id, 0) + 1
+        try:
+            await self.evaluate(user_id)
+            self.counters["processed"] += 1
+        except Exception as e:
+            self.counters["failed"] += 1
+            logger.error("Achievement evaluation for %s failed: %s", user_id, e)
+        finally:
+            self._running[user_id] -= 1
+            if not self._running[user_id]:
+                del self._running[user_id]
+            await self._mark(self.pending.done, user_id)
+
+    def stats(self) -> Dict:
+        return {
+            "depth": self._queue.qsize() if self._queue else 0,
+            "max_depth": self.max_depth,
+            "maxsize": self.maxsize,
+            "workers": len(self._tasks),
+            "running": sum(self._running.values()),
+            "last_wait_seconds": round(self.last_wait, 6),
+            **self.counters,
+        }
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+CATALOG_COLLECTIONS = ["achievements", "courses", "catalog_meta"]
+CATALOG_VERSION_ID = "catalog"
+
+
+def render_json(content: Any) -> bytes:
+    """Encode exactly like the app's ORJSONResponse so cached bytes match live responses"""
+    return orjson.dumps(jsonable_encoder(content), option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+async def bump_catalog_version(db):
+    """Mark the catalog as changed; every worker's cache reloads on its next poll"""
+    await db.catalog_meta.update_one({"_id": CATALOG_VERSION_ID}, {"$inc": {"version": 1}}, upsert=True)
+
+
+class CatalogCache:
+    """In-memory, versioned copy of the near-static catalog collections
+
+    Holds validated models plus their pre-serialized JSON so catalog endpoints
+    never touch Mongo in steady state. Refreshes from a change stream when the
+    deployment supports one, otherwise by polling the catalog_meta version stamp.
+
+    Reloads read from read_db (a secondary-preferring handle, when given) in one
+    causally consistent session, so the version and documents come from a
+    consistent point no older than the change that triggered the reload.
+    """
+
+    def __init__(
+        self, db, achievement_model, course_model, donation_packages: Dict, poll_interval: float = 30.0,
+        read_db=None, max_time_ms: Optional[int] = None,
+    ):
+        self.db = db
+        self.read_db = read_db
+        self.max_time_ms = max_time_ms
+        self.achievement_model = achievement_model
+        self.course_model = course_model
+        self.poll_interval = poll_interval
+        self.version: Optional[int] = None
+        self.loaded = False
+
+        self.achievements: List[Any] = []
+        self.achievements_by_id: Dict[str, Any] = {}
+        self.courses: List[Any] = []
+        self.courses_by_id: Dict[str, Any] = {}
+        self.achievements_json = b"[]"
+        self.courses_json = b"[]"
+        self.donation_packages_json = render_json(donation_packages)
+
+        self._listeners: List[Callable] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def on_refresh(self, callback: Callable):
+        """Register a callback(cache) run after every reload"""
+        self._listeners.append(callback)
+
+    @asynccontextmanager
+    async def _reads(self, after=None):
+        """(database, session) for one reload; no session when reading from db itself"""
+        if self.read_db is None or self.read_db is self.db:
+            yield self.db, None
+            return
+        async with await self.read_db.client.start_session(causal_consistency=True) as session:
+            if after is not None:
+                session.advance_operation_time(after)
+            yield self.read_db, session
+
+    async def _read_version(self, db=None, session=None) -> Optional[int]:
+        db = db if db is not None else self.db
+        meta = await db.catalog_meta.find_one({"_id": CATALOG_VERSION_ID}, session=session, max_time_ms=self.max_time_ms)
+        return meta.get("version") if meta else None
+
+    async def refresh(self, after=None):
+        """Reload every catalog collection and re-render its JSON
+
+        after is the operation time of a change the reload must include.
+        """
+        async with self._reads(after) as (db, session):
+            version = await self._read_version(db, session)
+            achievement_docs = await db.achievements.find(
+                {}, {"_id": 0}, session=session, max_time_ms=self.max_time_ms
+            ).to_list(1000)
+            course_docs = await db.courses.find(
+                {}, {"_id": 0}, session=session, max_time_ms=self.max_time_ms
+            ).to_list(1000)
+
+        achievements = [self.achievement_model(**doc) for doc in achievement_docs]
+        courses = [self.course_model(**doc) for doc in course_docs]
+        active_courses = [course for course in courses if course.is_active]
+
+        self.achievements = achievements
+        self.achievements_by_id = {achievement.id: achievement for achievement in achievements}
+        self.courses = active_courses
+        self.courses_by_id = {course.id: course for course in courses}
+        self.achievements_json = render_json(achievements)
+        self.courses_json = render_json(active_courses)
+        self.version = version
+        self.loaded = True
+
+        for callback in self._listeners:
+            result = callback(self)
+            if asyncio.iscoroutine(result):
+                await result
+        logger.info("Catalog loaded (version %s): %d achievements, %d courses", version, len(achievements), len(courses))
+
+    async def ensure_loaded(self):
+        if not self.loaded:
+            await self.refresh()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self):
+        """Follow the change stream, or poll without one; runs until stop()
+
+        A reload that fails keeps the catalog already loaded and is retried on
+        the next change or poll; only stop() ends the task.
+        """
+        try:
+            pipeline = [{"$match": {"ns.coll": {"$in": CATALOG_COLLECTIONS}}}]
+            async with self.db.watch(pipeline) as stream:
+                logger.info("Catalog cache following change stream")
+                async for change in stream:
+                    try:
+                        await self.refresh(after=change.get("clusterTime"))
+                    except PyMongoError:
+                        raise
+                    except Exception:
+                        # A document the models reject, or a failing on_refresh callback
+                        logger.exception("Catalog reload after a change failed; keeping the loaded catalog")
+        except OperationFailure:
+            # Standalone mongod: change streams need a replica set
+            logger.info("Change streams unavailable; polling catalog version every %ss", self.poll_interval)
+        except PyMongoError as e:
+            logger.warning("Catalog change stream closed (%s); falling back to polling", e)
+        except Exception:
+            logger.exception("Catalog change stream failed; falling back to polling")
+        await self._poll()
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if await self._read_version() != self.version:
+                    await self.refresh()
+            except PyMongoError as e:
+                logger.warning("Catalog version poll failed: %s", e)
+            except Exception:
+                logger.exception("Catalog reload failed; keeping the loaded catalog")
@@ -0,0 +1,136 @@
+import logging
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Completion bits are stored on the profile as {word index: int64 word}; 63 bits
+# per word keeps every word a non-negative BSON long
+WORD_BITS = 63
+
+
+def course_slug(name: str) -> str:
+    """Slug prerequisites refer to a course by"""
+    return name.lower().replace(" ", "-")
+
+
+def bits_to_int(course_bits: Optional[Dict[str, int]]) -> int:
+    """Fold a profile's course_bits words into one integer bitset"""
+    value = 0
+    for word, bits in (course_bits or {}).items():
+        value |= bits << (int(word) * WORD_BITS)
+    return value
+
+
+def int_to_bits(value: int) -> Dict[str, int]:
+    """Split an integer bitset into course_bits words, omitting empty ones"""
+    words = {}
+    word = 0
+    while value:
+        bits = value & ((1 << WORD_BITS) - 1)
+        if bits:
+            words[str(word)] = bits
+        value >>= WORD_BITS
+        word += 1
+    return words
+
+
+def bit_update(bit: int) -> Dict[str, Dict[str, int]]:
+    """$bit operand setting one completion bit"""
+    return {f"course_bits.{bit // WORD_BITS}": {"or": 1 << (bit % WORD_BITS)}}
+
+
+class CourseGraph:
+    """Course prerequisite DAG compiled to bitmasks
+
+    Each course is keyed by its stable slug and owns a completion bit. A course
+    is available once every bit in its prerequisite mask is set in the user's
+    bitset. Courses with an unknown prerequisite, or on or behind a
+    prerequisite cycle, can never become available.
+    """
+
+    def __init__(self, courses: Iterable[Dict[str, Any]]):
+        courses = list(courses)
+        self.by_slug: Dict[str, Dict[str, Any]] = {}
+        for course in courses:
+            self.by_slug[course.get("slug") or course_slug(course["name"])] = course
+        self.slug_by_id = {course["id"]: slug for slug, course in self.by_slug.items()}
+        self.bit_by_id = {
+            course["id"]: course["completion_bit"]
+            for course in courses if course.get("completion_bit") is not None
+        }
+
+        self.order, self.cycle = self._toposort()
+        # course id -> prerequisite mask, or None when it can never be met
+        self.required: Dict[str, Optional[int]] = {}
+        blocked = set(self.cycle)
+        for slug in self.order + self.cycle:
+            course = self.by_slug[slug]
+            mask = 0
+            for prereq in course.get("prerequisites", []):
+                target = self.by_slug.get(prereq)
+                if prereq in blocked or target is None or target["id"] not in self.bit_by_id:
+                    mask = None
+                    break
+                mask |= 1 << self.bit_by_id[target["id"]]
+            if mask is None:
+                blocked.add(slug)
+            self.required[course["id"]] = mask
+
+    def _toposort(self):
+        """(slugs in prerequisite order, slugs on or behind a cycle) via Kahn's algorithm"""
+        indegree = {slug: 0 for slug in self.by_slug}
+        dependents: Dict[str, List[str]] = {slug: [] for slug in self.by_slug}
+        for slug, course in self.by_slug.items():
+            for prereq in set(course.get("prerequisites", [])):
+                if prereq in self.by_slug:
+                    indegree[slug] += 1
+                    dependents[prereq].append(slug)
+
+        queue = deque(slug for slug, degree in indegree.items() if degree == 0)
+        order = []
+        while queue:
+            slug = queue.popleft()
+            order.append(slug)
+            for dependent in dependents[slug]:
+                indegree[dependent] -= 1
+                if indegree[dependent] == 0:
+                    queue.append(dependent)
+
+        cycle = [slug for slug, degree in indegree.items() if degree > 0]
+        if cycle:
+            logger.error("Course prerequisites form a cycle; never available: %s", ", ".join(sorted(cycle)))
+        return order, cycle
+
+    def completed_bits(self, course_ids: Iterable[str]) -> int:
+        value = 0
+        for course_id in course_ids:
+            if course_id in self.bit_by_id:
+                value |= 1 << self.bit_by_id[course_id]
+        return value
+
+    def is_available(self, course_id: str, completed: int) -> bool:
+        mask = self.required.get(course_id)
+        return mask is not None and mask & ~completed == 0
+
+
+async def assign_course_keys(db) -> bool:
+    """Freeze a slug and completion bit on every course that lacks one
+
+    Bits are never reused, so profile bitsets stay valid when courses are
+    renamed, deactivated or added. Returns True if any course changed.
+    """
+    courses = await db.courses.find({}, {"_id": 0, "id": 1, "name": 1, "slug": 1, "completion_bit": 1}).to_list(None)
+    next_bit = max((c["completion_bit"] for c in courses if c.get("completion_bit") is not None), default=-1) + 1
+    changed = False
+    for course in courses:
+        update = {}
+        if not course.get("slug"):
+            update["slug"] = course_slug(course["name"])
+        if course.get("completion_bit") is None:
+            update["completion_bit"] = next_bit
+            next_bit += 1
+        if update:
+            await db.courses.update_one({"id": course["id"]}, {"$set": update})
+            changed = True
+    return changed
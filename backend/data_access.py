@@ -0,0 +1,247 @@
+import base64
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+import bson
+from bson import Timestamp
+from pymongo import monitoring
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+# Returned on successful writes; sent back on later reads for read-your-writes
+CAUSAL_TOKEN_HEADER = "X-Causal-Token"
+
+# Smallest maxStalenessSeconds a server accepts
+MIN_MAX_STALENESS_SECONDS = 90
+
+# Commands whose reply carries the operationTime of a write
+WRITE_COMMANDS = {"insert", "update", "delete", "findAndModify", "commitTransaction"}
+
+logger = logging.getLogger(__name__)
+
+_read_after: ContextVar[Optional[Dict[str, Any]]] = ContextVar("causal_read_after", default=None)
+
+
+class QueryBudgets:
+    """maxTimeMS per read class; 0 leaves a class unbounded
+
+    lookup: single documents by key. batch: bounded lists ($in lookups, catalog
+    reloads, unlock polls). history: keyset pages of the per-user history
+    collections. Backfill and warm-up scans are never bounded.
+    """
+
+    def __init__(self, lookup_ms: int = 1000, batch_ms: int = 2000, history_ms: int = 3000):
+        self.lookup = lookup_ms or None
+        self.batch = batch_ms or None
+        self.history = history_ms or None
+
+
+class MongoSettings:
+    """Connection pool, timeouts and read routing for the app's Motor client"""
+
+    def __init__(
+        self,
+        max_pool_size: int = 100,
+        min_pool_size: int = 0,
+        connect_timeout_ms: int = 5000,
+        server_selection_timeout_ms: int = 5000,
+        wait_queue_timeout_ms: int = 2000,
+        secondary_reads: bool = True,
+        max_staleness_seconds: int = MIN_MAX_STALENESS_SECONDS,
+        budgets: Optional[QueryBudgets] = None,
+    ):
+        if secondary_reads and max_staleness_seconds < MIN_MAX_STALENESS_SECONDS:
+            raise ValueError(f"max_staleness_seconds must be at least {MIN_MAX_STALENESS_SECONDS}")
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+        self.connect_timeout_ms = connect_timeout_ms
+        self.server_selection_timeout_ms = server_selection_timeout_ms
+        self.wait_queue_timeout_ms = wait_queue_timeout_ms
+        self.secondary_reads = secondary_reads
+        self.max_staleness_seconds = max_staleness_seconds
+        self.budgets = budgets or QueryBudgets()
+
+    def client_options(self) -> Dict[str, Any]:
+        """Keyword arguments for AsyncIOMotorClient"""
+        return {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms or None,
+        }
+
+    def read_preference(self):
+        """Read preference for staleness-tolerant reads
+
+        secondaryPreferred only ever picks a secondary at most
+        max_staleness_seconds behind the primary, and falls back to the primary
+        on a standalone server or when no secondary qualifies.
+        """
+        if not self.secondary_reads:
+            return Primary()
+        return SecondaryPreferred(max_staleness=self.max_staleness_seconds)
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _signature(key: bytes, raw: bytes) -> bytes:
+    return hmac.new(key, raw, hashlib.sha256).digest()[:16]
+
+
+def valid_read_after(doc: Dict[str, Any]) -> bool:
+    """Whether doc has exactly the shape of an operationTime and $clusterTime a server sent"""
+    cluster_time = doc.get("$clusterTime")
+    if set(doc) != {"operationTime", "$clusterTime"} or not isinstance(doc["operationTime"], Timestamp):
+        return False
+    if not isinstance(cluster_time, dict) or not set(cluster_time) <= {"clusterTime", "signature"} \
+            or not isinstance(cluster_time.get("clusterTime"), Timestamp):
+        return False
+    signature = cluster_time.get("signature", {"hash": b"", "keyId": 0})
+    return isinstance(signature, dict) and set(signature) == {"hash", "keyId"} \
+        and isinstance(signature["hash"], bytes) and isinstance(signature["keyId"], int) \
+        and doc["operationTime"] <= cluster_time["clusterTime"]
+
+
+def encode_causal_token(operation_time: Timestamp, cluster_time: Dict[str, Any], key: bytes) -> str:
+    """operationTime and $clusterTime as BSON, signed with key so clients cannot forge them"""
+    raw = bson.encode({"operationTime": operation_time, "$clusterTime": cluster_time})
+    return f"{_b64encode(raw)}.{_b64encode(_signature(key, raw))}"
+
+
+def decode_causal_token(token: str, key: bytes) -> Dict[str, Any]:
+    """Inverse of encode_causal_token; raises ValueError for malformed or forged tokens"""
+    try:
+        payload, signature = token.split(".")
+        raw = _b64decode(payload)
+        if not hmac.compare_digest(_b64decode(signature), _signature(key, raw)):
+            raise ValueError("bad signature")
+        doc = bson.decode(raw)
+    except Exception as e:
+        raise ValueError(f"invalid causal token: {token!r}") from e
+    if not valid_read_after(doc):
+        raise ValueError(f"invalid causal token: {token!r}")
+    return doc
+
+
+class OperationTimeTracker(monitoring.CommandListener):
+    """Latest operationTime (with its $clusterTime) acknowledged for a write on this client
+
+    Standalone servers report neither, so nothing is tracked there. Writes
+    from every task count, including the ledger's batches, which finish on
+    the ledger task before the request that submitted them responds.
+
+    Tokens are signed with key; workers that should accept each other's
+    tokens need the same one. Without a key a random one is used, so tokens
+    only work on the worker that issued them.
+    """
+
+    def __init__(self, key: Optional[bytes] = None):
+        self.key = key or secrets.token_bytes(32)
+        self.latest: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name not in WRITE_COMMANDS:
+            return
+        operation_time = event.reply.get("operationTime")
+        cluster_time = event.reply.get("$clusterTime")
+        if operation_time is None or cluster_time is None:
+            return
+        with self._lock:
+            if self.latest is None or operation_time > self.latest["operationTime"]:
+                self.latest = {"operationTime": operation_time, "$clusterTime": cluster_time}
+
+    def failed(self, event):
+        pass
+
+    def operation_time(self) -> Optional[Timestamp]:
+        latest = self.latest
+        return latest["operationTime"] if latest is not None else None
+
+    def token(self) -> Optional[str]:
+        latest = self.latest
+        if latest is None:
+            return None
+        return encode_causal_token(latest["operationTime"], latest["$clusterTime"], self.key)
+
+
+@asynccontextmanager
+async def causal_session(collection):
+    """Session whose reads see at least the request's X-Causal-Token, or None without one
+
+    A secondary waits until it has applied the token's operation time before
+    answering, so a user reading right after their own write sees it.
+    """
+    read_after = _read_after.get()
+    if read_after is not None and not valid_read_after(read_after):
+        logger.warning("Ignoring malformed causal read-after %r", read_after)
+        read_after = None
+    if read_after is None:
+        yield None
+        return
+    async with await collection.database.client.start_session(causal_consistency=True) as session:
+        session.advance_cluster_time(read_after["$clusterTime"])
+        session.advance_operation_time(read_after["operationTime"])
+        yield session
+
+
+class CausalConsistencyMiddleware:
+    """Read-your-writes across primary writes and secondary reads
+
+    Successful writes (any method other than GET, HEAD and OPTIONS) respond
+    with an X-Causal-Token covering every write this worker has seen
+    acknowledged, the request's own included. Requests sending the token back
+    run their secondary reads in a causally consistent session after it;
+    malformed tokens, and tokens not signed with the tracker's key, are
+    ignored.
+    """
+
+    def __init__(self, app, tracker: OperationTimeTracker):
+        self.app = app
+        self.tracker = tracker
+
+    def _read_after(self, scope) -> Optional[Dict[str, Any]]:
+        for name, value in scope["headers"]:
+            if name == b"x-causal-token":
+                try:
+                    return decode_causal_token(value.decode("latin-1"), self.tracker.key)
+                except ValueError:
+                    return None
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        writes = scope["method"] not in ("GET", "HEAD", "OPTIONS")
+
+        async def send_wrapper(message):
+            if writes and message["type"] == "http.response.start" and message["status"] < 400:
+                token = self.tracker.token()
+                if token is not None:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-causal-token", token.encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        token = _read_after.set(self._read_after(scope))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _read_after.reset(token)
@@ -0,0 +1,51 @@
+import zlib
+from typing import Any, AsyncIterator, Dict
+
+import orjson
+
+# (record type, collection, time field) for every per-user collection in an export
+EXPORT_SECTIONS = [
+    ("breathing_session", "breathing_sessions", "completed_at"),
+    ("mood_diary_entry", "mood_diary_entries", "created_at"),
+    ("zen_coin_transaction", "zen_coin_transactions", "timestamp"),
+    ("course_completion", "course_completions", None),
+]
+
+
+def encode_record(record_type: str, doc: Dict[str, Any]) -> bytes:
+    """One NDJSON line: {"type": ..., "data": {...}}"""
+    return orjson.dumps({"type": record_type, "data": doc}, option=orjson.OPT_APPEND_NEWLINE)
+
+
+async def iter_user_export(db, profile: Dict[str, Any], batch_size: int = 500) -> AsyncIterator[bytes]:
+    """Stream a user's profile and full history as NDJSON lines, oldest first
+
+    Reads through server-side cursors, so memory use does not grow with the
+    size of the history.
+    """
+    profile = {key: value for key, value in profile.items() if key != "_id"}
+    yield encode_record("user_profile", profile)
+
+    for record_type, collection_name, time_field in EXPORT_SECTIONS:
+        cursor = db[collection_name].find({"user_id": profile["id"]}, {"_id": 0}, batch_size=batch_size)
+        if time_field:
+            cursor = cursor.sort([(time_field, 1), ("id", 1)])
+        async for doc in cursor:
+            yield encode_record(record_type, doc)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes], flush_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """Incrementally gzip an async byte stream, emitting roughly flush_size pieces"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    pending = []
+    pending_size = 0
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            pending.append(compressed)
+            pending_size += len(compressed)
+        if pending_size >= flush_size:
+            yield b"".join(pending)
+            pending, pending_size = [], 0
+    pending.append(compressor.flush())
+    yield b"".join(pending)
@@ -0,0 +1,10 @@
+"""gunicorn hooks for launcher.py; everything else is set on its command line"""
+import os
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges (in-flight requests, pool sizes) from /metrics
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
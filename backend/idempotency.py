@@ -0,0 +1,218 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import orjson
+from pymongo.errors import DuplicateKeyError
+
+from request_body import buffer_body
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+IDEMPOTENT_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+MAX_KEY_LENGTH = 255
+
+IN_PROGRESS = "in_progress"
+DONE = "done"
+
+
+class StoredResponse:
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: List[List[bytes]], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class IdempotencyStore:
+    """Idempotency records in the idempotency_keys collection behind a per-worker LRU
+
+    Records are keyed by method, path and key. Completed responses are cached
+    in memory, so a retry storm hitting one worker is answered without a
+    database round-trip; other workers answer it with one _id lookup. The
+    collection's TTL index (see indexes.py) expires records after a day.
+    """
+
+    def __init__(self, db, lru_size: int = 10000, ttl: float = 24 * 3600, lock_timeout: float = 60.0):
+        self.db = db
+        self.lru_size = lru_size
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        # record id -> (fingerprint, response, monotonic expiry)
+        self._lru: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _cached(self, record_id: str):
+        entry = self._lru.get(record_id)
+        if entry is None:
+            return None
+        if entry[2] < time.monotonic():
+            del self._lru[record_id]
+            return None
+        self._lru.move_to_end(record_id)
+        return entry
+
+    def _cache(self, record_id: str, fingerprint: str, response: StoredResponse, created_at: datetime):
+        expires = time.monotonic() + self.ttl - (datetime.utcnow() - created_at).total_seconds()
+        self._lru[record_id] = (fingerprint, response, expires)
+        self._lru.move_to_end(record_id)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    async def begin(self, record_id: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Claim record_id for this request
+
+        Returns None when the caller now owns the key and must run the request,
+        otherwise the existing record ({"state", "fingerprint", "response"}).
+        """
+        cached = self._cached(record_id)
+        if cached:
+            return {"state": DONE, "fingerprint": cached[0], "response": cached[1]}
+
+        collection = self.db.idempotency_keys
+        doc = await collection.find_one({"_id": record_id})
+        if doc is None:
+            try:
+                await collection.insert_one({
+                    "_id": record_id, "state": IN_PROGRESS, "fingerprint": fingerprint,
+                    "created_at": datetime.utcnow(),
+                })
+                return None
+            except DuplicateKeyError:
+                doc = await collection.find_one({"_id": record_id})
+                if doc is None:
+                    return await self.begin(record_id, fingerprint)
+
+        if doc["state"] == DONE:
+            response = StoredResponse(doc["status"], [[k, v] for k, v in doc["headers"]], doc["body"])
+            self._cache(record_id, doc["fingerprint"], response, doc["created_at"])
+            return {"state": DONE, "fingerprint": doc["fingerprint"], "response": response}
+
+        if doc["created_at"] < datetime.utcnow() - timedelta(seconds=self.lock_timeout):
+            # The request that claimed the key died mid-flight: take it over
+            result = await collection.update_one(
+                {"_id": record_id, "state": IN_PROGRESS, "created_at": doc["created_at"]},
+                {"$set": {"fingerprint": fingerprint, "created_at": datetime.utcnow()}}
+            )
+            if result.modified_count:
+                return None
+        return {"state": IN_PROGRESS, "fingerprint": doc["fingerprint"], "response": None}
+
+    async def complete(self, record_id: str, fingerprint: str, response: StoredResponse):
+        created_at = datetime.utcnow()
+        await self.db.idempotency_keys.update_one(
+            {"_id": record_id},
+            {"$set": {
+                "state": DONE, "status": response.status, "headers": response.headers,
+                "body": response.body, "created_at": created_at,
+            }}
+        )
+        self._cache(record_id, fingerprint, response, created_at)
+
+    async def abandon(self, record_id: str):
+        """Release the key so the client can retry (the request failed server-side)"""
+        await self.db.idempotency_keys.delete_one({"_id": record_id, "state": IN_PROGRESS})
+
+
+def request_fingerprint(scope, body: bytes) -> str:
+    """sha256 over method, path, query string and body
+
+    The record id only separates keys by method and path, so without the query
+    string a reused key with other query parameters would replay a response
+    to a different request.
+    """
+    digest = hashlib.sha256()
+    for part in (scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b"")):
+        digest.update(part + b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _error(status: int, detail: str) -> StoredResponse:
+    return StoredResponse(status, [[b"content-type", b"application/json"]], orjson.dumps({"detail": detail}))
+
+
+class IdempotencyMiddleware:
+    """Replay stored responses for write requests that repeat an Idempotency-Key
+
+    Requests without the header pass straight through. The first request with
+    a key runs normally and its response is stored unless it is a 5xx;
+    repeats get that response back (with Idempotent-Replayed: true) without
+    reaching the endpoint. A repeat arriving while the first is still running
+    gets 409, and reusing a key with a different query string or body gets 422.
+    """
+
+    def __init__(self, app, store: IdempotencyStore):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in IDEMPOTENT_METHODS:
+            await self.app(scope, receive, send)
+            return
+        key = None
+        for name, value in scope["headers"]:
+            if name == b"idempotency-key":
+                key = value.decode("latin-1")
+                break
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await self._send(send, _error(400, f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters"))
+            return
+
+        # Read the body up front to fingerprint it, then hand it to the app unchanged
+        body, receive = await buffer_body(receive)
+        if body is None:
+            return
+        fingerprint = request_fingerprint(scope, body)
+        record_id = f"{scope['method']} {scope['path']} {key}"
+
+        existing = await self.store.begin(record_id, fingerprint)
+        if existing is not None:
+            if existing["fingerprint"] != fingerprint:
+                await self._send(send, _error(422, f"{IDEMPOTENCY_HEADER} was already used with a different request"))
+            elif existing["state"] == IN_PROGRESS:
+                await self._send(send, _error(409, "A request with this Idempotency-Key is still being processed"))
+            else:
+                await self._send(send, existing["response"], replayed=True)
+            return
+
+        status = 500
+        headers: List[List[bytes]] = []
+        response_chunks = []
+
+        async def capture(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [[name, value] for name, value in message.get("headers", [])]
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+
+        try:
+            await self.app(scope, receive, capture)
+        except Exception:
+            await self.store.abandon(record_id)
+            raise
+
+        response = StoredResponse(status, headers, b"".join(response_chunks))
+        if status >= 500:
+            await self.store.abandon(record_id)
+        else:
+            await self.store.complete(record_id, fingerprint, response)
+        await self._send(send, response)
+
+    @staticmethod
+    async def _send(send, response: StoredResponse, replayed: bool = False):
+        headers = [(name, value) for name, value in response.headers]
+        if replayed:
+            headers.append((REPLAYED_HEADER.lower().encode(), b"true"))
+        await send({"type": "http.response.start", "status": response.status, "headers": headers})
+        await send({"type": "http.response.body", "body": response.body})
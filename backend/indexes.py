@@ -0,0 +1,84 @@
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+
+# Declarative index registry: collection name -> indexes every hot query relies on.
+# Index names are fixed so create_indexes() is a no-op when the spec is unchanged.
+INDEXES = {
+    "user_profiles": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("referral_code", ASCENDING)], name="referral_code_unique", unique=True),
+        IndexModel([("referred_by", ASCENDING)], name="referred_by"),
+    ],
+    "breathing_sessions": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("completed_at", DESCENDING), ("id", DESCENDING)], name="user_id_completed_at_id"),
+    ],
+    "mood_diary_entries": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_id_created_at_id"),
+    ],
+    "zen_coin_transactions": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="user_id_timestamp_id"),
+    ],
+    "course_completions": [
+        IndexModel([("user_id", ASCENDING), ("course_id", ASCENDING)], name="user_id_course_id_unique", unique=True),
+    ],
+    "courses": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("is_active", ASCENDING)], name="is_active"),
+    ],
+    "achievements": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "oasis_active_users": [
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=2 * 24 * 3600),
+    ],
+    "idempotency_keys": [
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=24 * 3600),
+    ],
+    "payment_transactions": [
+        IndexModel([("session_id", ASCENDING)], name="session_id_unique", unique=True),
+    ],
+}
+
+
+async def duplicate_keys(collection, keys, limit: int = 10):
+    """Up to limit key values held by more than one document (a missing field counts as null)"""
+    fields = [field for field, _ in keys]
+    pipeline = [
+        {"$group": {"_id": {field.replace(".", "_"): f"${field}" for field in fields}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    return [row["_id"] async for row in collection.aggregate(pipeline, allowDiskUse=True)]
+
+
+async def ensure_indexes(db):
+    """Create every registered index; safe to run on each startup
+
+    A unique index that does not exist yet is only built once its keys are
+    checked for duplicates. If any exist, that index is skipped with an error
+    naming some of them, and the remaining indexes are still created.
+    """
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        existing = set(await collection.index_information())
+        buildable = []
+        for index in indexes:
+            document = index.document
+            if document.get("unique") and document["name"] not in existing:
+                duplicates = await duplicate_keys(collection, list(document["key"].items()))
+                if duplicates:
+                    logger.error(
+                        "Not creating unique index %s.%s: duplicate keys such as %s must be resolved first",
+                        collection_name, document["name"], duplicates,
+                    )
+                    continue
+            buildable.append(index)
+        if buildable:
+            await collection.create_indexes(buildable)
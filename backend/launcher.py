@@ -0,0 +1,216 @@
+"""Production launcher: prepare the database once, run the API workers, then nginx.
+
+    python launcher.py [--workers N] [--bind 0.0.0.0:8001] [-- nginx -g 'daemon off;']
+
+1. Runs server.prepare_database() (indexes, default catalog, backfills) once, in
+   a child process, so workers neither race on it nor inherit its Motor client.
+2. Starts gunicorn with uvicorn workers, one per core by default
+   (WEB_CONCURRENCY overrides), with DATABASE_PREPARED=1 so they skip step 1.
+3. Polls /api/readyz and starts the command after "--" (nginx) as soon as a
+   worker reports ready, instead of sleeping a fixed time.
+
+Workers share a CAUSAL_TOKEN_SECRET (random unless one is given), so any of
+them accepts another's X-Causal-Token, and a PROMETHEUS_MULTIPROC_DIR (a fresh
+temporary directory unless one is given), so /metrics reports every worker,
+not just the one that answered the scrape.
+
+SIGHUP is forwarded to both: gunicorn starts fresh workers and retires the old
+ones once their in-flight requests finish, and nginx reloads its config.
+SIGTERM/SIGINT stop both. If either process dies the other is stopped and the
+launcher exits non-zero.
+
+Without REDIS_URL the leaderboard, the rate limit buckets and the set of
+pending achievement checks live in each worker's memory and would diverge, so
+the launcher runs a single worker. (Idempotency keys are stored in MongoDB and
+need no Redis.)
+"""
+import argparse
+import logging
+import os
+import secrets
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import List, Mapping, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+logger = logging.getLogger("launcher")
+
+
+def worker_count(environ: Mapping[str, str], cpus: Optional[int]) -> int:
+    """WEB_CONCURRENCY, else one per core; a single worker without Redis"""
+    workers = int(environ.get("WEB_CONCURRENCY") or cpus or 1)
+    if workers > 1 and not environ.get("REDIS_URL"):
+        logger.warning("REDIS_URL is not set; running 1 worker instead of %d (per-process state would diverge)", workers)
+        return 1
+    return max(workers, 1)
+
+
+def gunicorn_command(workers: int, bind: str, graceful_timeout: int) -> List[str]:
+    return [
+        sys.executable, "-m", "gunicorn", "server:app",
+        "--worker-class", "uvicorn.workers.UvicornWorker",
+        "--workers", str(workers),
+        "--bind", bind,
+        "--graceful-timeout", str(graceful_timeout),
+        "--config", str(BACKEND_DIR / "gunicorn.conf.py"),
+    ]
+
+
+def prepare_metrics_dir(environ: Mapping[str, str]) -> Tuple[str, bool]:
+    """(PROMETHEUS_MULTIPROC_DIR for the workers, whether it was created here)
+
+    A given directory is emptied of the previous run's sample files, which
+    would otherwise be counted again.
+    """
+    path = environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        return tempfile.mkdtemp(prefix="prometheus-"), True
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith(".db"):
+            os.remove(os.path.join(path, name))
+    return path, False
+
+
+def readiness_url(bind: str) -> str:
+    host, _, port = bind.rpartition(":")
+    if host in ("", "0.0.0.0", "[::]"):
+        host = "127.0.0.1"
+    return f"http://{host}:{port}/api/readyz"
+
+
+def wait_until_ready(url: str, process, timeout: float, interval: float = 0.5) -> bool:
+    """Poll url until it answers 200; False if process exits or timeout passes first"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(interval)
+    return False
+
+
+def prepare_database():
+    import asyncio
+
+    import server
+
+    async def prepare():
+        try:
+            await server.prepare_database()
+        finally:
+            server.client.close()
+
+    asyncio.run(prepare())
+
+
+def stop(processes, timeout: float):
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        try:
+            process.wait(max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def serve(args, env) -> int:
+    """Run gunicorn, then the follow-up command once it is ready, until either exits or a stop signal"""
+    workers = worker_count(env, os.cpu_count())
+    logger.info("Starting %d API worker(s) on %s", workers, args.bind)
+    api = subprocess.Popen(gunicorn_command(workers, args.bind, args.graceful_timeout), cwd=BACKEND_DIR, env=env)
+    processes = [api]
+
+    stopping = False
+
+    def on_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+
+    def on_reload(signum, frame):
+        logger.info("Reloading")
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGHUP)
+
+    signal.signal(signal.SIGTERM, on_stop)
+    signal.signal(signal.SIGINT, on_stop)
+    signal.signal(signal.SIGHUP, on_reload)
+
+    url = readiness_url(args.bind)
+    if not wait_until_ready(url, api, args.ready_timeout):
+        if not stopping:
+            logger.error("API did not become ready at %s", url)
+        stop(processes, args.graceful_timeout)
+        return 0 if stopping else 1
+    logger.info("API ready")
+
+    then = args.then[1:] if args.then[:1] == ["--"] else args.then
+    if then and not stopping:
+        processes.append(subprocess.Popen(then))
+
+    while not stopping and all(process.poll() is None for process in processes):
+        time.sleep(0.5)
+
+    if not stopping:
+        logger.error("%s exited; shutting down", "API" if api.poll() is not None else then[0])
+    stop(processes, args.graceful_timeout)
+    return 0 if stopping else 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, help="uvicorn workers (default: WEB_CONCURRENCY or one per core)")
+    parser.add_argument("--bind", default=os.environ.get("BIND", "0.0.0.0:8001"))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.environ.get("GRACEFUL_TIMEOUT", "30")),
+                        help="seconds workers get to finish in-flight requests on reload or shutdown")
+    parser.add_argument("--ready-timeout", type=float, default=float(os.environ.get("READY_TIMEOUT", "120")),
+                        help="seconds to wait for /api/readyz before giving up")
+    parser.add_argument("--prepare-only", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("then", nargs=argparse.REMAINDER, help="command to start once the API is ready")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.prepare_only:
+        prepare_database()
+        return 0
+
+    logger.info("Preparing database")
+    if subprocess.run([sys.executable, str(Path(__file__).resolve()), "--prepare-only"], cwd=BACKEND_DIR).returncode:
+        logger.error("Database preparation failed")
+        return 1
+
+    env = {**os.environ, "DATABASE_PREPARED": "1"}
+    # Workers must accept each other's X-Causal-Token
+    env.setdefault("CAUSAL_TOKEN_SECRET", secrets.token_hex(32))
+    if args.workers:
+        env["WEB_CONCURRENCY"] = str(args.workers)
+    metrics_dir, created = prepare_metrics_dir(env)
+    env["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    try:
+        return serve(args, env)
+    finally:
+        if created:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+import random
+import uuid
+from collections import deque
+from typing import AsyncIterable, Dict, Iterable, List, Optional, Tuple
+
+LEADERBOARD_KEY = "zen:leaderboard"
+
+# While a rebuild holds KEYS[2], its scratch set is KEYS[1]:rebuild:<token>.
+# Members already loaded there get the increment too; the others are read
+# from the database after it, so the scanned score includes it.
+_INCR_LUA = """
+local score = redis.call('ZINCRBY', KEYS[1], ARGV[1], ARGV[2])
+local token = redis.call('GET', KEYS[2])
+if token then
+    local scratch = KEYS[1] .. ':rebuild:' .. token
+    if redis.call('ZSCORE', scratch, ARGV[2]) then
+        redis.call('ZINCRBY', scratch, ARGV[1], ARGV[2])
+    end
+end
+return score
+"""
+
+# A set score is current, so it goes to a running rebuild's scratch set as is
+_SET_LUA = """
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+local token = redis.call('GET', KEYS[2])
+if token then
+    redis.call('ZADD', KEYS[1] .. ':rebuild:' .. token, ARGV[1], ARGV[2])
+end
+"""
+
+# Move the scratch set over the live one and release the lock, if this worker
+# still holds it (the lock expiring stops increments reaching the scratch set)
+_SWAP_LUA = """
+if redis.call('GET', KEYS[3]) ~= ARGV[1] then
+    return 0
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('RENAME', KEYS[2], KEYS[1])
+else
+    redis.call('DEL', KEYS[1])
+end
+redis.call('DEL', KEYS[3])
+return 1
+"""
+
+# Delete the lock only if this worker still holds it
+_RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class _Node:
+    __slots__ = ("key", "priority", "left", "right", "size")
+
+    def __init__(self, key, priority=None):
+        self.key = key
+        self.priority = random.random() if priority is None else priority
+        self.left = None
+        self.right = None
+        self.size = 1
+
+
+def _size(node) -> int:
+    return node.size if node else 0
+
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+
+
+def _split(node, key, inclusive=False):
+    """Split into (keys < key, keys >= key), or (<=, >) when inclusive"""
+    if node is None:
+        return None, None
+    if node.key < key or (inclusive and node.key == key):
+        left, right = _split(node.right, key, inclusive)
+        node.right = left
+        _update(node)
+        return node, right
+    left, right = _split(node.left, key, inclusive)
+    node.left = right
+    _update(node)
+    return left, node
+
+
+def _merge(left, right):
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+class OrderStatisticTree:
+    """Treap with subtree sizes: insert, remove, rank and select in O(log n)"""
+
+    def __init__(self, keys: Iterable = ()):
+        self.root = None
+        self.build(keys)
+
+    def __len__(self):
+        return _size(self.root)
+
+    def build(self, keys: Iterable):
+        """Replace the contents with keys in O(n log n), balanced from the start"""
+        keys = sorted(keys)
+        if not keys:
+            self.root = None
+            return
+
+        def build_range(lo, hi):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            node = _Node(keys[mid], priority=0.0)
+            node.left = build_range(lo, mid)
+            node.right = build_range(mid + 1, hi)
+            _update(node)
+            return node
+
+        self.root = build_range(0, len(keys))
+        # Hand out random priorities in descending order level by level to keep the heap property
+        priorities = sorted((random.random() for _ in keys), reverse=True)
+        queue = deque([self.root])
+        for priority in priorities:
+            node = queue.popleft()
+            node.priority = priority
+            queue.extend(child for child in (node.left, node.right) if child)
+
+    def insert(self, key):
+        left, right = _split(self.root, key)
+        self.root = _merge(_merge(left, _Node(key)), right)
+
+    def remove(self, key):
+        left, right = _split(self.root, key)
+        _, right = _split(right, key, inclusive=True)
+        self.root = _merge(left, right)
+
+    def rank(self, key) -> int:
+        """Number of keys strictly smaller than key"""
+        node, rank = self.root, 0
+        while node:
+            if node.key < key:
+                rank += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return rank
+
+    def select(self, index: int):
+        """Key at a 0-based position"""
+        node = self.root
+        while node:
+            left_size = _size(node.left)
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                return node.key
+            else:
+                index -= left_size + 1
+                node = node.right
+        raise IndexError(index)
+
+    def slice(self, start: int, count: int) -> List:
+        return [self.select(i) for i in range(start, min(start + count, len(self)))]
+
+
+class InMemoryLeaderboard:
+    """Process-local ranked leaderboard; ties are ordered by member id
+
+    Each worker holds its own copy, so use RedisLeaderboard when running
+    several workers.
+    """
+
+    def __init__(self):
+        self.scores: Dict[str, int] = {}
+        self.tree = OrderStatisticTree()
+
+    async def incr(self, member: str, amount: int) -> int:
+        score = self.scores.get(member)
+        if score is not None:
+            self.tree.remove((-score, member))
+        score = (score or 0) + amount
+        self.scores[member] = score
+        self.tree.insert((-score, member))
+        return score
+
+    async def set(self, member: str, score: int):
+        if member in self.scores:
+            self.tree.remove((-self.scores[member], member))
+        self.scores[member] = score
+        self.tree.insert((-score, member))
+
+    async def rank(self, member: str) -> Optional[Tuple[int, int]]:
+        """(0-based rank, score) or None if the member is not ranked"""
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        return self.tree.rank((-score, member)), score
+
+    async def page(self, offset: int, limit: int) -> List[Tuple[str, int]]:
+        return [(member, -negative_score) for negative_score, member in self.tree.slice(offset, limit)]
+
+    async def size(self) -> int:
+        return len(self.scores)
+
+    async def rebuild(self, entries: AsyncIterable[Tuple[str, int]]):
+        self.scores = {member: score async for member, score in entries}
+        self.tree.build((-score, member) for member, score in self.scores.items())
+
+    async def close(self):
+        pass
+
+
+class RedisLeaderboard:
+    """Leaderboard kept in a Redis sorted set shared by every worker
+
+    Scores are stored negated and read in ascending order, so ties are ordered
+    by member id like InMemoryLeaderboard (ZREVRANGE would reverse them).
+    """
+
+    def __init__(self, redis_url: str, key: str = LEADERBOARD_KEY):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(redis_url)
+        self.key = key
+        self.lock = f"{key}:rebuild-lock"
+        self._incr = self.redis.register_script(_INCR_LUA)
+        self._set = self.redis.register_script(_SET_LUA)
+        self._swap = self.redis.register_script(_SWAP_LUA)
+        self._release = self.redis.register_script(_RELEASE_LOCK_LUA)
+
+    async def incr(self, member: str, amount: int) -> int:
+        return -int(float(await self._incr(keys=[self.key, self.lock], args=[-amount, member])))
+
+    async def set(self, member: str, score: int):
+        await self._set(keys=[self.key, self.lock], args=[-score, member])
+
+    async def rank(self, member: str) -> Optional[Tuple[int, int]]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            rank, score = await pipe.zrank(self.key, member).zscore(self.key, member).execute()
+        if rank is None:
+            return None
+        return rank, -int(score)
+
+    async def page(self, offset: int, limit: int) -> List[Tuple[str, int]]:
+        if limit <= 0:
+            return []
+        rows = await self.redis.zrange(self.key, offset, offset + limit - 1, withscores=True)
+        return [(member.decode(), -int(score)) for member, score in rows]
+
+    async def size(self) -> int:
+        return await self.redis.zcard(self.key)
+
+    async def rebuild(self, entries: AsyncIterable[Tuple[str, int]], chunk_size: int = 10000, lock_seconds: int = 300) -> bool:
+        """Load entries into a scratch set of this worker's and swap it in
+
+        Only one worker rebuilds at a time; the others return False straight
+        away, as does a rebuild that outlived its lock. Until the swap, incr
+        and set calls from every worker also reach members already loaded into
+        the scratch set, and set adds new ones, so the swapped-in scores drop
+        nothing written during the rebuild and keep lowered balances lowered.
+        An increment written to the database after an entry was read but
+        before its chunk was loaded is the one thing missed.
+        """
+        token = uuid.uuid4().hex
+        if not await self.redis.set(self.lock, token, nx=True, ex=lock_seconds):
+            return False
+        scratch = f"{self.key}:rebuild:{token}"
+        try:
+            chunk = {}
+            async for member, score in entries:
+                chunk[member] = -score
+                if len(chunk) >= chunk_size:
+                    # nx: a score set since the scan read it is newer
+                    await self.redis.zadd(scratch, chunk, nx=True)
+                    chunk = {}
+            if chunk:
+                await self.redis.zadd(scratch, chunk, nx=True)
+            return bool(await self._swap(keys=[self.key, scratch, self.lock], args=[token]))
+        finally:
+            # Released first, so nothing writes to the scratch set after it is deleted
+            await self._release(keys=[self.lock], args=[token])
+            await self.redis.delete(scratch)
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_leaderboard(redis_url: Optional[str] = None):
+    """Sorted set in Redis when redis_url is given, else a per-worker ranked tree"""
+    if redis_url:
+        return RedisLeaderboard(redis_url)
+    return InMemoryLeaderboard()
+
+
+async def warm_leaderboard(leaderboard, db, force: bool = False):
+    """Seed the leaderboard from user_profiles when it is empty
+
+    Profiles are streamed into the rebuild rather than read up front, so the
+    Redis rebuild holds its lock for the whole scan.
+    """
+    if not force and await leaderboard.size() > 0:
+        return
+
+    async def entries():
+        async for user in db.user_profiles.find({}, {"_id": 0, "id": 1, "zen_coins": 1}):
+            yield user["id"], user.get("zen_coins", 0)
+
+    await leaderboard.rebuild(entries())
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+_CLOSE = object()
+
+DUPLICATE_KEY = 11000
+
+
+class LedgerEntry:
+    __slots__ = ("user_id", "inc", "transactions", "future")
+
+    def __init__(self, user_id: str, inc: Optional[Dict[str, int]], transactions: List[Dict[str, Any]]):
+        self.user_id = user_id
+        self.inc = inc
+        self.transactions = transactions
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class LedgerWriter:
+    """Group-commit writer for Zen Coin balance increments and transaction records
+
+    Entries from concurrent requests are collected into batches bounded by
+    max_batch and max_delay, then written with one ordered bulk_write of
+    merged $inc updates on user_profiles and one insert_many on
+    zen_coin_transactions, optionally inside a multi-document transaction
+    (replica set only). Increments for users with no profile are dropped along
+    with their transaction records. submit() returns once its batch is durable;
+    close() flushes every pending entry before returning.
+
+    When a batch write is rejected (a BulkWriteError), the batch is retried one
+    user at a time, so only that user's requests fail. Increments the failed
+    batch already applied are not applied again. Transaction records are
+    inserted idempotently by their unique id. Without transactions, a user
+    whose records still fail keeps the increment that was already applied.
+    Any other error leaves the batch's state unknown and fails all of it.
+    """
+
+    def __init__(self, db, max_batch: int = 100, max_delay: float = 0.002, use_transactions: bool = False):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.use_transactions = use_transactions
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def start(self):
+        if self._task is None:
+            self._closing = False
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop accepting batches and flush everything already submitted"""
+        if self._task is None:
+            return
+        self._closing = True
+        await self._queue.put(_CLOSE)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def submit(self, user_id: str, inc: Optional[Dict[str, int]], transactions: List[Dict[str, Any]]) -> bool:
+        """Queue a balance increment and its transaction records
+
+        Resolves once written: True, or False when inc matched no profile and
+        nothing was written for this user.
+        """
+        entry = LedgerEntry(user_id, inc, transactions)
+        if self._task is None or self._closing:
+            # Not running (scripts, shutdown): write through immediately
+            await self._flush([entry])
+        else:
+            await self._queue.put(entry)
+        return await entry.future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            first = await self._queue.get()
+            if first is _CLOSE:
+                break
+            batch = [first]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    entry = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        entry = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if entry is _CLOSE:
+                    closing = True
+                    break
+                batch.append(entry)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[LedgerEntry]):
+        increments: Dict[str, Dict[str, int]] = {}
+        for entry in batch:
+            if entry.inc:
+                merged = increments.setdefault(entry.user_id, {})
+                for field, amount in entry.inc.items():
+                    merged[field] = merged.get(field, 0) + amount
+
+        applied: Set[str] = set()
+        try:
+            missing = await self._apply(batch, increments, applied)
+        except BulkWriteError as e:
+            logger.warning("Ledger flush of %d entries was rejected, retrying per user: %s", len(batch), e.details)
+            await self._flush_per_user(batch, increments, applied)
+            return
+        except Exception as e:
+            logger.error("Ledger flush of %d entries failed: %s", len(batch), e)
+            self._resolve(batch, error=e)
+            return
+        self._resolve(batch, missing=missing)
+
+    async def _flush_per_user(self, batch: List[LedgerEntry], increments: Dict[str, Dict[str, int]], applied: Set[str]):
+        """Write each user's entries on their own, so a rejected write only fails that user's requests"""
+        by_user: Dict[str, List[LedgerEntry]] = {}
+        for entry in batch:
+            by_user.setdefault(entry.user_id, []).append(entry)
+        for user_id, entries in by_user.items():
+            try:
+                if user_id in applied:
+                    # The increment landed with the rejected batch; only the records are left
+                    missing = await self._missing([user_id], None)
+                    if not missing:
+                        await self._apply(entries, {}, set())
+                else:
+                    pending = {user_id: increments[user_id]} if user_id in increments else {}
+                    missing = await self._apply(entries, pending, set())
+            except Exception as e:
+                logger.error("Ledger write for %s failed: %s", user_id, e)
+                self._resolve(entries, error=e)
+                continue
+            self._resolve(entries, missing=missing)
+
+    async def _apply(self, batch: List[LedgerEntry], increments: Dict[str, Dict[str, int]], applied: Set[str]) -> Set[str]:
+        """_write, in a multi-document transaction if configured; applied collects users whose $inc landed"""
+        if not self.use_transactions:
+            return await self._write(batch, increments, None, applied)
+        try:
+            async with await self.db.client.start_session() as session:
+                async with session.start_transaction():
+                    return await self._write(batch, increments, session, applied)
+        except Exception:
+            # Aborted: nothing was applied
+            applied.clear()
+            raise
+
+    @staticmethod
+    def _resolve(batch: List[LedgerEntry], missing: Set[str] = frozenset(), error: Optional[Exception] = None):
+        if missing:
+            logger.warning("Ledger dropped increments for unknown users: %s", sorted(missing))
+        for entry in batch:
+            if entry.future.done():
+                continue
+            if error is not None:
+                entry.future.set_exception(error)
+            else:
+                entry.future.set_result(entry.user_id not in missing)
+
+    async def _missing(self, user_ids: List[str], session) -> Set[str]:
+        found = {
+            doc["id"] async for doc in
+            self.db.user_profiles.find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1}, session=session)
+        }
+        return set(user_ids) - found
+
+    async def _write(self, batch: List[LedgerEntry], increments: Dict[str, Dict[str, int]], session,
+                     applied: Set[str]) -> Set[str]:
+        """Apply the batch; returns the ids of users whose increments matched no profile"""
+        missing: Set[str] = set()
+        if increments:
+            now = datetime.utcnow()
+            user_ids = list(increments)
+            updates = [
+                UpdateOne({"id": user_id}, {"$inc": increments[user_id], "$set": {"updated_at": now}})
+                for user_id in user_ids
+            ]
+            try:
+                result = await self.db.user_profiles.bulk_write(updates, ordered=True, session=session)
+            except BulkWriteError as e:
+                # Ordered: every update before the first write error was applied
+                errors = e.details.get("writeErrors")
+                applied.update(user_ids[:errors[0]["index"]] if errors else user_ids)
+                raise
+            applied.update(user_ids)
+            if result.matched_count < len(updates):
+                # Rare (a client naming an unknown user), so found with a second query
+                missing = await self._missing(user_ids, session)
+        transactions = [txn for entry in batch if entry.user_id not in missing for txn in entry.transactions]
+        if transactions:
+            try:
+                await self.db.zen_coin_transactions.insert_many(transactions, ordered=False, session=session)
+            except BulkWriteError as e:
+                # Records a rejected batch already inserted come back as duplicates of their id
+                if e.details.get("writeConcernErrors") or \
+                        any(error["code"] != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                    raise
+        return missing
@@ -0,0 +1,236 @@
+import os
+import time
+from typing import Callable, Dict, List
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+from starlette.routing import Match
+
+# Every metric the app exports lives in this registry; /metrics renders it
+REGISTRY = CollectorRegistry()
+
+# Set by launcher.py for gunicorn workers. prometheus_client then keeps each
+# process's samples in files in this directory, and /metrics merges every
+# worker's instead of answering with whichever worker took the scrape. Must be
+# in the environment before prometheus_client is first imported.
+MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# Component stats() collectors; not file-backed, see register_stats
+_STATS_COLLECTORS: List = []
+
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status",
+    ["method", "route", "status"], registry=REGISTRY,
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response is sent",
+    ["method", "route"], registry=REGISTRY,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being handled",
+    ["method", "route"], multiprocess_mode="livesum", registry=REGISTRY,
+)
+
+MONGO_COMMANDS = Counter(
+    "mongodb_commands_total", "MongoDB commands by collection, command and outcome",
+    ["collection", "command", "outcome"], registry=REGISTRY,
+)
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round-trip time",
+    ["collection", "command"], buckets=DB_BUCKETS, registry=REGISTRY,
+)
+MONGO_POOL_CONNECTIONS = Gauge(
+    "mongodb_pool_connections", "Open connections in the pool", ["address"],
+    multiprocess_mode="livesum", registry=REGISTRY,
+)
+MONGO_POOL_CHECKED_OUT = Gauge(
+    "mongodb_pool_checked_out", "Pool connections in use", ["address"],
+    multiprocess_mode="livesum", registry=REGISTRY,
+)
+MONGO_POOL_WAITING = Gauge(
+    "mongodb_pool_waiting", "Operations waiting to check out a connection", ["address"],
+    multiprocess_mode="livesum", registry=REGISTRY,
+)
+MONGO_POOL_MAX = Gauge(
+    "mongodb_pool_max_connections", "maxPoolSize of the pool, summed over workers", ["address"],
+    multiprocess_mode="livesum", registry=REGISTRY,
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongodb_pool_checkout_failures_total", "Failed connection check-outs",
+    ["address", "reason"], registry=REGISTRY,
+)
+
+ZEN_COINS_AWARDED = Counter(
+    "zen_coins_awarded_total", "Zen Coins awarded by transaction type", ["type"], registry=REGISTRY,
+)
+# Counters only go up, so negative awards (corrections, refunds) are counted here
+ZEN_COINS_DEDUCTED = Counter(
+    "zen_coins_deducted_total", "Zen Coins deducted by transaction type", ["type"], registry=REGISTRY,
+)
+ACHIEVEMENTS_UNLOCKED = Counter(
+    "achievements_unlocked_total", "Achievements unlocked", ["achievement"], registry=REGISTRY,
+)
+
+
+def render():
+    """(body, content type) of the current metrics in the text exposition format
+
+    In multiprocess mode counters and histograms are summed over every worker
+    that has run since the launcher started, and gauges over the live ones.
+    """
+    if not MULTIPROCESS_DIR:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, MULTIPROCESS_DIR)
+    for collector in _STATS_COLLECTORS:
+        registry.register(collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def _address(address) -> str:
+    return f"{address[0]}:{address[1]}"
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Counts and times every command the client sends, labelled by collection
+
+    Listeners run synchronously on the thread that issued the command, so
+    they only do dictionary and metric updates.
+    """
+
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+
+    def started(self, event):
+        command = event.command
+        collection = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else "-"
+
+    def succeeded(self, event):
+        self._observe(event, "success")
+
+    def failed(self, event):
+        self._observe(event, "failure")
+
+    def _observe(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "-")
+        MONGO_COMMANDS.labels(collection, event.command_name, outcome).inc()
+        MONGO_COMMAND_SECONDS.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool size, usage and check-out queue per server"""
+
+    def pool_created(self, event):
+        max_size = event.options.get("maxPoolSize")
+        if max_size is not None:
+            MONGO_POOL_MAX.labels(_address(event.address)).set(max_size)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event.address)).inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event.address)).dec()
+
+    def connection_check_out_started(self, event):
+        MONGO_POOL_WAITING.labels(_address(event.address)).inc()
+
+    def connection_check_out_failed(self, event):
+        address = _address(event.address)
+        MONGO_POOL_WAITING.labels(address).dec()
+        MONGO_POOL_CHECKOUT_FAILURES.labels(address, event.reason).inc()
+
+    def connection_checked_out(self, event):
+        address = _address(event.address)
+        MONGO_POOL_WAITING.labels(address).dec()
+        MONGO_POOL_CHECKED_OUT.labels(address).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.labels(_address(event.address)).dec()
+
+
+def mongo_listeners() -> List:
+    """event_listeners for the Motor client"""
+    return [CommandMetrics(), PoolMetrics()]
+
+
+class StatsCollector:
+    """Exports a component's stats() dict as gauges named <prefix>_<key>, read at scrape time"""
+
+    def __init__(self, prefix: str, description: str, stats: Callable[[], Dict]):
+        self.prefix = prefix
+        self.description = description
+        self.stats = stats
+
+    def collect(self):
+        for key, value in self.stats().items():
+            if isinstance(value, (int, float)):
+                yield GaugeMetricFamily(f"{self.prefix}_{key}", f"{self.description}: {key}", value=value)
+
+
+def register_stats(prefix: str, description: str, stats: Callable[[], Dict]):
+    """Export stats() at scrape time; with several workers only the one serving the scrape is read"""
+    collector = StatsCollector(prefix, description, stats)
+    REGISTRY.register(collector)
+    _STATS_COLLECTORS.append(collector)
+
+
+class HttpMetricsMiddleware:
+    """Per-route request counts, latency and in-flight gauges
+
+    Requests are labelled with the template of the route they match
+    ("/api/users/{user_id}"), so ids never become label values; anything
+    that matches no route is labelled "unmatched".
+    """
+
+    def __init__(self, app, routes: List):
+        self.app = app
+        # The application's live route list; routes added later are seen too
+        self.routes = routes
+
+    def _route(self, scope) -> str:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route(scope)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(method, route).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+            in_flight.dec()
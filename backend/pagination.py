@@ -0,0 +1,60 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Response header carrying the opaque token for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp: datetime, doc_id: str) -> str:
+    """Opaque token for the (timestamp, id) position of the last row on a page"""
+    raw = json.dumps([timestamp.isoformat(), doc_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor; raises ValueError for malformed tokens"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        timestamp, doc_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), str(doc_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {token!r}") from e
+
+
+def keyset_filter(base: Dict[str, Any], field: str, cursor: Optional[str]) -> Dict[str, Any]:
+    """Restrict a newest-first query to rows strictly after the cursor position"""
+    if not cursor:
+        return base
+    timestamp, doc_id = decode_cursor(cursor)
+    # The $lte range bounds the index scan; $or only trims ties on the boundary timestamp
+    return {
+        **base,
+        field: {"$lte": timestamp},
+        "$or": [
+            {field: {"$lt": timestamp}},
+            {"id": {"$lt": doc_id}},
+        ],
+    }
+
+
+def keyset_sort(field: str) -> List[Tuple[str, int]]:
+    """Sort matching the (user_id, field desc, id desc) history indexes"""
+    return [(field, -1), ("id", -1)]
+
+
+async def fetch_page(
+    collection, base: Dict[str, Any], field: str, cursor: Optional[str], limit: int, projection=None,
+    max_time_ms: Optional[int] = None, session=None,
+):
+    """Fetch one newest-first page; returns (rows, next_cursor or None)"""
+    rows = await collection.find(
+        keyset_filter(base, field, cursor), projection, max_time_ms=max_time_ms, session=session
+    ).sort(
+        keyset_sort(field)
+    ).limit(limit + 1).to_list(limit + 1)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1][field], rows[-1]["id"])
@@ -0,0 +1,146 @@
+import logging
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+SERVER_TIMING_HEADER = "Server-Timing"
+
+# Cursor bookkeeping, not queries a handler chose to issue
+IGNORED_COMMANDS = {"getMore", "killCursors", "endSessions"}
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+
+def _shape(value: Any) -> Any:
+    """value with every literal replaced by "?", keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return [_shape(item) for item in value]
+    return "?"
+
+
+def query_shape(command_name: str, command: Dict[str, Any]) -> str:
+    """"<command> <collection> <filter or pipeline shape>", equal for queries differing only in values"""
+    collection = command.get(command_name)
+    body = command.get("filter", command.get("query", command.get("pipeline")))
+    if body is None and command_name in ("update", "delete"):
+        statements = command.get(command_name + "s") or [{}]
+        body = statements[0].get("q")
+    shape = orjson.dumps(_shape(body)).decode() if body is not None else ""
+    return f"{command_name} {collection if isinstance(collection, str) else '-'} {shape}".rstrip()
+
+
+class RequestProfile:
+    """Mongo commands issued while handling one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.commands: List[Tuple[str, float]] = []  # (query shape, seconds)
+        self._pending: Dict[tuple, str] = {}
+
+    @property
+    def db_time(self) -> float:
+        return sum(seconds for _, seconds in self.commands)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Query shapes issued at least threshold times, most repeated first"""
+        counts = Counter(shape for shape, _ in self.commands)
+        return [(shape, count) for shape, count in counts.most_common() if count >= threshold]
+
+    def server_timing(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        db_time = self.db_time
+        return (
+            f'db;dur={db_time * 1000:.2f};desc="{len(self.commands)} queries", '
+            f"app;dur={max(elapsed - db_time, 0) * 1000:.2f}"
+        )
+
+
+class CommandProfiler(monitoring.CommandListener):
+    """Records commands into the profile of the request that issued them
+
+    Motor runs each operation on its executor with a copy of the caller's
+    context, so the request's profile is visible here. Commands issued outside
+    a profiled request (ledger batches, achievement workers) are ignored.
+    """
+
+    def started(self, event):
+        profile = _current.get()
+        if profile is not None and event.command_name not in IGNORED_COMMANDS:
+            profile._pending[(event.connection_id, event.request_id)] = query_shape(event.command_name, event.command)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        profile = _current.get()
+        if profile is None:
+            return
+        shape = profile._pending.pop((event.connection_id, event.request_id), None)
+        if shape is not None:
+            profile.commands.append((shape, event.duration_micros / 1e6))
+
+
+class ProfilerMiddleware:
+    """Profiles requests sent with "X-Profile: 1", plus a random sample of the rest
+
+    Profiled responses carry a Server-Timing header with the database
+    round-trips and time, and the remaining application time. A warning is
+    logged when a request issues more than max_queries commands or repeats one
+    query shape max_repeats times or more, the usual sign of a query in a loop.
+    """
+
+    def __init__(self, app, sample_rate: float = 0.0, max_queries: int = 20, max_repeats: int = 3):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+
+    def _enabled(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return value == b"1"
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._enabled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", profile.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            self._check(scope, profile)
+
+    def _check(self, scope, profile: RequestProfile):
+        request = f"{scope['method']} {scope['path']}"
+        if len(profile.commands) > self.max_queries:
+            logger.warning(
+                "%s issued %d queries (limit %d) in %.1f ms",
+                request, len(profile.commands), self.max_queries, profile.db_time * 1000
+            )
+        for shape, count in profile.repeated(self.max_repeats):
+            logger.warning("%s repeated one query %d times: %s", request, count, shape)
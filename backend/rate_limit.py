@@ -0,0 +1,222 @@
+import math
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+from request_body import buffer_body
+
+# Largest JSON body inspected for a user_id; bigger requests are keyed by client address
+MAX_INSPECTED_BODY = 64 * 1024
+
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local retry = 0
+if tokens >= 1 then tokens = tokens - 1 else retry = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(retry)
+"""
+
+
+class InMemoryRateLimiter:
+    """Process-local token buckets; each worker enforces its own copy of every limit"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic, max_keys: int = 100000):
+        self.clock = clock
+        self.max_keys = max_keys
+        self.buckets: Dict[str, Tuple[float, float, float]] = {}  # key -> (tokens, last refill, full after)
+
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        """Take one token; returns 0 if allowed, else seconds until a token is available"""
+        now = self.clock()
+        tokens, last, _ = self.buckets.get(key, (burst, now, 0))
+        tokens = min(burst, tokens + (now - last) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        self.buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+        if len(self.buckets) > self.max_keys:
+            self._prune(now)
+        return retry_after
+
+    def _prune(self, now: float):
+        """Drop buckets idle long enough to have refilled completely"""
+        self.buckets = {key: state for key, state in self.buckets.items() if state[2] > now}
+
+    async def close(self):
+        pass
+
+
+class RedisRateLimiter:
+    """Token buckets in Redis shared by every worker, updated atomically by a Lua script"""
+
+    def __init__(self, redis_url: str, prefix: str = "zen:ratelimit:"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(redis_url)
+        self.prefix = prefix
+        self._script = self.redis.register_script(_TOKEN_BUCKET_LUA)
+
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        retry_after = await self._script(keys=[self.prefix + key], args=[rate, burst, time.time()])
+        return float(retry_after)
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_rate_limiter(redis_url: Optional[str] = None):
+    """Token buckets in Redis, so a client's budget spans every worker
+
+    With no redis_url each worker refills its own buckets, and a client spread
+    over N workers gets up to N times the configured rate.
+    """
+    if redis_url:
+        return RedisRateLimiter(redis_url)
+    return InMemoryRateLimiter()
+
+
+class RouteLimit:
+    """Token bucket limit for one "METHOD /path/{param}" route"""
+
+    def __init__(self, route: str, per_minute: float, burst: int):
+        self.route = route
+        self.method, path = route.split(" ", 1)
+        segments = [
+            "[^/]+" if segment.startswith("{") and segment.endswith("}") else re.escape(segment)
+            for segment in path.split("/")
+        ]
+        self.pattern = re.compile("^" + "/".join(segments) + "$")
+        self.rate = per_minute / 60.0
+        self.burst = burst
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and self.pattern.match(path) is not None
+
+
+def parse_route_limits(limits: Dict[str, Tuple[float, int]]) -> List[RouteLimit]:
+    """{"POST /api/mood-diary": (per_minute, burst), ...} -> RouteLimits"""
+    return [RouteLimit(route, per_minute, burst) for route, (per_minute, burst) in limits.items()]
+
+
+def _response(status: int, detail: str, retry_after: float):
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+    ]
+    return status, headers, orjson.dumps({"detail": detail})
+
+
+class RateLimitMiddleware:
+    """Sheds load before any endpoint or database work runs
+
+    Requests beyond max_in_flight concurrent ones in this worker get an
+    immediate 503. Requests to a limited route take a token from the bucket of
+    their client address, and get 429 when it is empty. user_id (query string
+    or JSON body) is not authenticated, so it only narrows the limit: requests
+    naming one also take a token from that user's bucket, while their address
+    bucket allows address_factor times the route's limit for the several users
+    a shared address may carry. Both responses carry Retry-After.
+
+    The client address is the peer address, or with trust_forwarded the
+    rightmost X-Forwarded-For entry, the one appended by the trusted proxy in
+    front of the app; entries to its left are client-supplied.
+    """
+
+    def __init__(self, app, limiter, routes: List[RouteLimit], max_in_flight: int = 0,
+                 trust_forwarded: bool = False, exempt_paths: Tuple[str, ...] = (), address_factor: float = 5.0):
+        self.app = app
+        self.limiter = limiter
+        self.routes = routes
+        self.max_in_flight = max_in_flight
+        self.trust_forwarded = trust_forwarded
+        self.exempt_paths = exempt_paths
+        self.address_factor = address_factor
+        self.in_flight = 0
+        self.counters = {"shed": 0, "limited": 0}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            self.counters["shed"] += 1
+            await self._send(send, *_response(503, "Server is busy, retry shortly", 1))
+            return
+
+        self.in_flight += 1
+        try:
+            route = next((route for route in self.routes if route.matches(scope["method"], scope["path"])), None)
+            if route is not None:
+                user_id, receive = await self._user_id(scope, receive)
+                retry_after = await self._acquire(route, self._client_address(scope), user_id)
+                if retry_after > 0:
+                    self.counters["limited"] += 1
+                    await self._send(send, *_response(429, "Rate limit exceeded", retry_after))
+                    return
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+    async def _acquire(self, route: RouteLimit, address: str, user_id: Optional[str]) -> float:
+        """Seconds until the request may be retried, or 0 once every bucket it is charged to allowed it"""
+        if user_id is None:
+            return await self.limiter.acquire(f"{route.route}|ip:{address}", route.rate, route.burst)
+        retry_after = await self.limiter.acquire(
+            f"{route.route}|ip-users:{address}", route.rate * self.address_factor,
+            max(int(route.burst * self.address_factor), 1)
+        )
+        if retry_after > 0:
+            return retry_after
+        return await self.limiter.acquire(f"{route.route}|user:{user_id}", route.rate, route.burst)
+
+    def _client_address(self, scope) -> str:
+        if self.trust_forwarded:
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    hops = [hop.strip() for hop in value.decode("latin-1").split(",") if hop.strip()]
+                    if hops:
+                        return hops[-1]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def _user_id(self, scope, receive):
+        """(user_id the request names or None, receive to hand downstream)"""
+        query = scope.get("query_string", b"").decode("latin-1")
+        match = re.search(r"(?:^|&)user_id=([^&]+)", query)
+        if match:
+            return match.group(1), receive
+
+        headers = dict(scope["headers"])
+        length = headers.get(b"content-length")
+        if not headers.get(b"content-type", b"").startswith(b"application/json") or not length \
+                or not length.isdigit() or int(length) > MAX_INSPECTED_BODY:
+            return None, receive
+
+        body, receive = await buffer_body(receive)
+        if body is None:
+            return None, receive
+
+        try:
+            user_id = orjson.loads(body).get("user_id")
+        except (orjson.JSONDecodeError, AttributeError):
+            user_id = None
+        if isinstance(user_id, str) and user_id:
+            return user_id, receive
+        return None, receive
+
+    @staticmethod
+    async def _send(send, status, headers, body):
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,279 @@
+import secrets
+from datetime import date, datetime, time, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from data_access import QueryBudgets, causal_session
+from pagination import fetch_page
+
+# Named projections for user_profiles reads. Every handler asks for the
+# narrowest one it can use instead of pulling the whole document (including the
+# ever-growing achievements array) over the wire.
+PROFILE_FULL = {"_id": 0}
+# Covered by the id_unique index: answered from the index without a document fetch
+PROFILE_EXISTS = {"_id": 0, "id": 1}
+PROFILE_BALANCE = {"_id": 0, "id": 1, "zen_coins": 1}
+PROFILE_ACHIEVEMENTS = {"_id": 0, "id": 1, "achievements": 1}
+PROFILE_STREAK = {"_id": 0, "id": 1, "last_practice_date": 1, "consecutive_days": 1}
+PROFILE_COURSES = {"_id": 0, "id": 1, "course_bits": 1}
+PROFILE_REFERRER = {"_id": 0, "id": 1, "referral_code": 1}
+PROFILE_LEADERBOARD = {"_id": 0, "id": 1, "username": 1, "total_sessions": 1, "consecutive_days": 1}
+# Everything the achievement engine evaluates
+PROFILE_EVALUATION = {
+    "_id": 0, "id": 1, "achievements": 1, "achievement_marks": 1, "last_practice_date": 1,
+    "total_sessions": 1, "consecutive_days": 1, "courses_completed": 1, "mood_entries": 1, "referrals": 1,
+}
+
+# 48-bit referral codes; the rare collision is retried with a fresh code on insert
+REFERRAL_CODE_BYTES = 6
+REFERRAL_CODE_ATTEMPTS = 5
+
+# Covered by the (user_id, course_id) unique index
+COMPLETION_KEY = {"_id": 0, "user_id": 1, "course_id": 1}
+
+
+def new_referral_code() -> str:
+    return secrets.token_hex(REFERRAL_CODE_BYTES)
+
+
+def practice_pipeline(days: List[date], now: datetime, update: Optional[Dict[str, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Update pipeline recording one practice session per entry in days
+
+    Each distinct day, oldest first, is one $set stage advancing the streak:
+    practicing the day after the last practice date continues it, the same or
+    an earlier day keeps it, and a longer gap restarts it at 1. Every stage
+    reads the document as the previous one left it, so concurrent sessions
+    serialize on the document instead of racing on a read. $inc and $set
+    operators in update are folded into the final stage.
+    """
+    update = dict(update or {})
+    inc = dict(update.pop("$inc", {}))
+    assigned = update.pop("$set", {})
+    if update:
+        raise ValueError(f"Cannot fold {sorted(update)} into the practice pipeline")
+
+    last_day = {"$dateToString": {"format": "%Y-%m-%d", "date": "$last_practice_date"}}
+    streak = {"$ifNull": ["$consecutive_days", 0]}
+    stages = [{"$set": {
+        "consecutive_days": {"$switch": {
+            "branches": [
+                # First practice ever starts a streak
+                {"case": {"$eq": [{"$ifNull": ["$last_practice_date", None]}, None]}, "then": 1},
+                # Practicing again on the same day (or replaying an older session) keeps the streak
+                {"case": {"$gte": [last_day, day.isoformat()]}, "then": {"$max": [streak, 1]}},
+                # Practiced the day before: the streak continues
+                {"case": {"$eq": [last_day, (day - timedelta(days=1)).isoformat()]}, "then": {"$add": [streak, 1]}},
+            ],
+            # Gap of more than a day breaks the streak
+            "default": 1,
+        }},
+        # Stored as a datetime for MongoDB compatibility
+        "last_practice_date": {"$max": ["$last_practice_date", datetime.combine(day, time.min)]},
+    }} for day in sorted(set(days))]
+    stages.append({"$set": {
+        "total_sessions": {"$add": [{"$ifNull": ["$total_sessions", 0]}, len(days) + inc.pop("total_sessions", 0)]},
+        **{field: {"$add": [{"$ifNull": [f"${field}", 0]}, amount]} for field, amount in inc.items()},
+        **{field: {"$literal": value} for field, value in assigned.items()},
+        "updated_at": now,
+    }})
+    return stages
+
+
+class UserProfileRepository:
+    def __init__(self, collection, replica=None, budgets: Optional[QueryBudgets] = None):
+        self.collection = collection
+        self.replica = replica if replica is not None else collection
+        self.budgets = budgets or QueryBudgets()
+
+    async def get(self, user_id: str, projection: Dict[str, int] = PROFILE_FULL) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": user_id}, projection, max_time_ms=self.budgets.lookup)
+
+    async def exists(self, user_id: str) -> bool:
+        return await self.collection.find_one({"id": user_id}, PROFILE_EXISTS, max_time_ms=self.budgets.lookup) is not None
+
+    async def by_referral_code(self, referral_code: str, projection: Dict[str, int] = PROFILE_REFERRER):
+        return await self.collection.find_one({"referral_code": referral_code}, projection, max_time_ms=self.budgets.lookup)
+
+    async def many(self, user_ids: List[str], projection: Dict[str, int]) -> List[Dict[str, Any]]:
+        """Display fields for other users' rows (leaderboard), read from the replica"""
+        async with causal_session(self.replica) as session:
+            return await self.replica.find(
+                {"id": {"$in": user_ids}}, projection, max_time_ms=self.budgets.batch, session=session
+            ).to_list(len(user_ids))
+
+    async def insert(self, doc: Dict[str, Any]):
+        """insert_one, drawing a new referral_code (in doc) while it collides"""
+        for attempt in range(REFERRAL_CODE_ATTEMPTS):
+            try:
+                await self.collection.insert_one(doc)
+                return
+            except DuplicateKeyError as e:
+                # keyPattern is reported by MongoDB 4.2+; older servers only name the index
+                collided = "referral_code" in (e.details or {}).get("keyPattern", {}) or "referral_code_unique" in str(e)
+                if not collided or attempt == REFERRAL_CODE_ATTEMPTS - 1:
+                    raise
+                doc.pop("_id", None)
+                doc["referral_code"] = new_referral_code()
+
+    async def update(self, user_id: str, update, guard: Optional[Dict[str, Any]] = None):
+        """update_one by id; guard adds extra filter conditions"""
+        return await self.collection.update_one({"id": user_id, **(guard or {})}, update)
+
+    async def update_and_get(self, user_id: str, update, projection: Dict[str, int] = PROFILE_FULL):
+        """Apply an update and return the document after it, in one round-trip"""
+        return await self.collection.find_one_and_update(
+            {"id": user_id}, update, projection=projection, return_document=ReturnDocument.AFTER
+        )
+
+    async def record_practice(self, user_id: str, days: List[date], now: datetime, projection: Dict[str, int] = PROFILE_FULL, update=None):
+        """Advance streak and session counter over days atomically, plus any $inc/$set in update; returns the updated profile"""
+        return await self.update_and_get(user_id, practice_pipeline(days, now, update), projection)
+
+    def missing(self, field: str, projection: Dict[str, int] = PROFILE_FULL) -> AsyncIterator[Dict[str, Any]]:
+        """Profiles created before field existed"""
+        return self.collection.find({field: {"$exists": False}}, projection)
+
+    async def any_missing(self, field: str) -> bool:
+        return await self.collection.find_one({field: {"$exists": False}}, {"_id": 1}) is not None
+
+    async def set_where_missing(self, user_id: str, field: str, value):
+        await self.collection.update_one({"id": user_id, field: {"$exists": False}}, {"$set": {field: value}})
+
+    async def set_all_missing(self, field: str, value):
+        await self.collection.update_many({field: {"$exists": False}}, {"$set": {field: value}})
+
+    async def referral_counts(self) -> AsyncIterator[Dict[str, Any]]:
+        """{_id: referral code, n: profiles referred with it}"""
+        async for row in self.collection.aggregate([{"$group": {"_id": "$referred_by", "n": {"$sum": 1}}}]):
+            yield row
+
+
+class HistoryRepository:
+    """Append-mostly per-user history collection paged newest first by time_field
+
+    Pages are read from the replica; see data_access.causal_session for how a
+    user still sees their own latest writes there.
+    """
+
+    def __init__(self, collection, time_field: str, replica=None, budgets: Optional[QueryBudgets] = None):
+        self.collection = collection
+        self.time_field = time_field
+        self.replica = replica if replica is not None else collection
+        self.budgets = budgets or QueryBudgets()
+
+    async def insert(self, doc: Dict[str, Any]):
+        await self.collection.insert_one(doc)
+
+    async def insert_many(self, docs: List[Dict[str, Any]]):
+        await self.collection.insert_many(docs, ordered=False)
+
+    async def page(self, user_id: str, cursor: Optional[str], limit: int, projection: Dict[str, int]):
+        """(rows, next_cursor); raises ValueError for a malformed cursor"""
+        async with causal_session(self.replica) as session:
+            return await fetch_page(
+                self.replica, {"user_id": user_id}, self.time_field, cursor, limit, projection,
+                max_time_ms=self.budgets.history, session=session,
+            )
+
+    async def count_by_user(self) -> AsyncIterator[Dict[str, Any]]:
+        async for row in self.collection.aggregate([{"$group": {"_id": "$user_id", "n": {"$sum": 1}}}]):
+            yield row
+
+
+class TransactionRepository(HistoryRepository):
+    def __init__(self, collection, replica=None, budgets: Optional[QueryBudgets] = None):
+        super().__init__(collection, "timestamp", replica, budgets)
+
+    async def achievement_unlocks(self, user_id: str, since: datetime, limit: int) -> List[Dict[str, Any]]:
+        """Achievement reward transactions at or after since, oldest first"""
+        return await self.collection.find(
+            {"user_id": user_id, "timestamp": {"$gte": since}, "metadata.achievement_id": {"$exists": True}},
+            {"_id": 0, "timestamp": 1, "metadata.achievement_id": 1},
+            max_time_ms=self.budgets.batch,
+        ).sort([("timestamp", 1), ("id", 1)]).to_list(limit)
+
+
+class CourseCompletionRepository:
+    def __init__(self, collection, budgets: Optional[QueryBudgets] = None):
+        self.collection = collection
+        self.budgets = budgets or QueryBudgets()
+
+    async def course_ids_by_user(self) -> AsyncIterator[Dict[str, Any]]:
+        """{_id: user id, course_ids: [...]} for every user with a completion"""
+        async for row in self.collection.aggregate([{"$group": {"_id": "$user_id", "course_ids": {"$addToSet": "$course_id"}}}]):
+            yield row
+
+    async def exists(self, user_id: str, course_id: str) -> bool:
+        return await self.collection.find_one({"user_id": user_id, "course_id": course_id}, COMPLETION_KEY, max_time_ms=self.budgets.lookup) is not None
+
+    async def insert(self, doc: Dict[str, Any]):
+        await self.collection.insert_one(doc)
+
+    async def count_by_user(self) -> AsyncIterator[Dict[str, Any]]:
+        async for row in self.collection.aggregate([{"$group": {"_id": "$user_id", "n": {"$sum": 1}}}]):
+            yield row
+
+
+class PaymentRepository:
+    def __init__(self, collection, budgets: Optional[QueryBudgets] = None):
+        self.collection = collection
+        self.budgets = budgets or QueryBudgets()
+
+    async def insert(self, doc: Dict[str, Any]):
+        await self.collection.insert_one(doc)
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"session_id": session_id}, {"_id": 0}, max_time_ms=self.budgets.lookup)
+
+    async def update(self, session_id: str, fields: Dict[str, Any]):
+        return await self.collection.update_one({"session_id": session_id}, {"$set": fields})
+
+
+class CatalogSeedRepository:
+    """Writes to a catalog collection; reads are served by the catalog cache"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def is_empty(self) -> bool:
+        return await self.collection.find_one({}, {"_id": 1}) is None
+
+    async def insert_many(self, docs: List[Dict[str, Any]]):
+        await self.collection.insert_many(docs)
+
+
+class StatusCheckRepository:
+    def __init__(self, collection, budgets: Optional[QueryBudgets] = None):
+        self.collection = collection
+        self.budgets = budgets or QueryBudgets()
+
+    async def insert(self, doc: Dict[str, Any]):
+        await self.collection.insert_one(doc)
+
+    async def list(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        return await self.collection.find({}, {"_id": 0}, max_time_ms=self.budgets.batch).to_list(limit)
+
+
+class Repositories:
+    """Every collection server.py touches, behind named, projection-aware methods
+
+    replica is the same database with a staleness-tolerant read preference;
+    history pages and leaderboard rows read from it, everything else from db.
+    Without one, every read goes to db.
+    """
+
+    def __init__(self, db, replica=None, budgets: Optional[QueryBudgets] = None):
+        self.db = db
+        replica = replica if replica is not None else db
+        budgets = budgets or QueryBudgets()
+        self.profiles = UserProfileRepository(db.user_profiles, replica.user_profiles, budgets)
+        self.sessions = HistoryRepository(db.breathing_sessions, "completed_at", replica.breathing_sessions, budgets)
+        self.moods = HistoryRepository(db.mood_diary_entries, "created_at", replica.mood_diary_entries, budgets)
+        self.transactions = TransactionRepository(db.zen_coin_transactions, replica.zen_coin_transactions, budgets)
+        self.completions = CourseCompletionRepository(db.course_completions, budgets)
+        self.payments = PaymentRepository(db.payment_transactions, budgets)
+        self.achievements = CatalogSeedRepository(db.achievements)
+        self.courses = CatalogSeedRepository(db.courses)
+        self.status_checks = StatusCheckRepository(db.status_checks, budgets)
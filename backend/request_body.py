@@ -0,0 +1,33 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+def _replay(messages: List[Dict[str, Any]], receive: Receive) -> Receive:
+    pending = list(messages)
+
+    async def replay_receive():
+        if pending:
+            return pending.pop(0)
+        return await receive()
+
+    return replay_receive
+
+
+async def buffer_body(receive: Receive) -> Tuple[Optional[bytes], Receive]:
+    """Read a whole ASGI request body for a middleware to inspect
+
+    Returns (body, receive to hand downstream), which replays the body as a
+    single message and then defers to the original receive. body is None if
+    the client disconnected first; downstream is then told so.
+    """
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] != "http.request":
+            return None, _replay([message], receive)
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    body = b"".join(chunks)
+    return body, _replay([{"type": "http.request", "body": body, "more_body": False}], receive)
@@ -0,0 +1,198 @@
+"""Incrementally maintained global Oasis statistics.
+
+Write paths $inc a global document and a per-day bucket in oasis_stats, so
+GET /api/oasis/stats is a single indexed read. Rebuild from raw history with:
+
+    python rollups.py backfill
+"""
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+from pymongo import ReplaceOne, UpdateOne
+
+GLOBAL_ID = "global"
+# Per-day (day, user) markers that make active_users a distinct count; expired by TTL index
+ACTIVE_MARKER_TTL = timedelta(days=2)
+# Upserts per bulk_write while backfilling
+BACKFILL_CHUNK = 1000
+
+
+def day_id(day: date) -> str:
+    return f"day:{day.isoformat()}"
+
+
+async def _bump(db, day: date, inc: Dict[str, int]):
+    await db.oasis_stats.bulk_write([
+        UpdateOne({"_id": GLOBAL_ID}, {"$inc": inc}, upsert=True),
+        UpdateOne({"_id": day_id(day)}, {"$inc": inc, "$setOnInsert": {"day": day.isoformat()}}, upsert=True),
+    ], ordered=False)
+
+
+async def record_sessions(db, user_id: str, sessions: Iterable[Tuple[datetime, int, int]]):
+    """Roll up (completed_at, cycles_completed, duration_seconds) for one user's sessions"""
+    by_day: Dict[date, Dict[str, int]] = {}
+    for completed_at, cycles, seconds in sessions:
+        bucket = by_day.setdefault(completed_at.date(), {"total_sessions": 0, "total_cycles": 0, "total_breath_seconds": 0})
+        bucket["total_sessions"] += 1
+        bucket["total_cycles"] += cycles
+        bucket["total_breath_seconds"] += seconds
+    if not by_day:
+        return
+
+    # First session of the day for this user counts them as active that day
+    now = datetime.utcnow()
+    days = sorted(by_day)
+    markers = await db.oasis_active_users.bulk_write([
+        UpdateOne(
+            {"_id": f"{day.isoformat()}:{user_id}"},
+            {"$setOnInsert": {"day": day.isoformat(), "user_id": user_id, "created_at": now}},
+            upsert=True
+        )
+        for day in days
+    ], ordered=False)
+    for index in markers.upserted_ids:
+        by_day[days[index]]["active_users"] = 1
+
+    totals: Dict[str, int] = {}
+    updates = []
+    for day, inc in by_day.items():
+        for field in ("total_sessions", "total_cycles", "total_breath_seconds"):
+            totals[field] = totals.get(field, 0) + inc[field]
+        updates.append(UpdateOne({"_id": day_id(day)}, {"$inc": inc, "$setOnInsert": {"day": day.isoformat()}}, upsert=True))
+    updates.append(UpdateOne({"_id": GLOBAL_ID}, {"$inc": totals}, upsert=True))
+    await db.oasis_stats.bulk_write(updates, ordered=False)
+
+
+async def record_course_completion(db, when: datetime):
+    await _bump(db, when.date(), {"courses_completed": 1})
+
+
+async def record_mood_entry(db, when: datetime):
+    await _bump(db, when.date(), {"mood_entries": 1})
+
+
+async def record_new_user(db, when: datetime):
+    await _bump(db, when.date(), {"total_users": 1})
+
+
+async def read_stats(db, today: date) -> Dict[str, int]:
+    """Global totals plus today's bucket, in one round-trip"""
+    docs = await db.oasis_stats.find({"_id": {"$in": [GLOBAL_ID, day_id(today)]}}).to_list(2)
+    by_id = {doc["_id"]: doc for doc in docs}
+    totals = by_id.get(GLOBAL_ID, {})
+    today_bucket = by_id.get(day_id(today), {})
+
+    total_cycles = totals.get("total_cycles", 0)
+    active_today = today_bucket.get("active_users", 0)
+    return {
+        "total_sessions": totals.get("total_sessions", 0),
+        "total_cycles": total_cycles,
+        "total_breath_minutes": totals.get("total_breath_seconds", 0) // 60,
+        "total_users": totals.get("total_users", 0),
+        "courses_completed": totals.get("courses_completed", 0),
+        "mood_entries": totals.get("mood_entries", 0),
+        "active_users_today": active_today,
+        "sessions_today": today_bucket.get("total_sessions", 0),
+        # Original response keys
+        "total_elements_grown": total_cycles,
+        "active_gardens": active_today,
+        "collective_breath_cycles": total_cycles,
+    }
+
+
+async def _bulk(collection, requests):
+    for start in range(0, len(requests), BACKFILL_CHUNK):
+        await collection.bulk_write(requests[start:start + BACKFILL_CHUNK], ordered=False)
+
+
+async def backfill(db):
+    """Rebuild every rollup from raw history (run while writes are quiet)
+
+    Documents are replaced in place and stale days removed afterwards, so
+    /api/oasis/stats keeps serving the old totals, never zeros, until each
+    document is swapped for its rebuilt value.
+    """
+    days: Dict[str, Dict[str, int]] = {}
+
+    def bucket(day: str) -> Dict[str, int]:
+        return days.setdefault(day, {})
+
+    day_expr = {"$dateToString": {"format": "%Y-%m-%d", "date": "$completed_at"}}
+    async for row in db.breathing_sessions.aggregate([
+        {"$group": {
+            "_id": {"day": day_expr, "user_id": "$user_id"},
+            "sessions": {"$sum": 1},
+            "cycles": {"$sum": "$cycles_completed"},
+            "seconds": {"$sum": "$duration_seconds"},
+        }},
+        {"$group": {
+            "_id": "$_id.day",
+            "total_sessions": {"$sum": "$sessions"},
+            "total_cycles": {"$sum": "$cycles"},
+            "total_breath_seconds": {"$sum": "$seconds"},
+            "active_users": {"$sum": 1},
+        }},
+    ], allowDiskUse=True):
+        bucket(row.pop("_id")).update(row)
+
+    for collection, field, counter in (
+        (db.course_completions, "completed_at", "courses_completed"),
+        (db.mood_diary_entries, "created_at", "mood_entries"),
+        (db.user_profiles, "created_at", "total_users"),
+    ):
+        async for row in collection.aggregate([
+            {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": f"${field}"}}, "n": {"$sum": 1}}},
+        ], allowDiskUse=True):
+            bucket(row["_id"])[counter] = row["n"]
+
+    totals: Dict[str, int] = {}
+    for values in days.values():
+        for field, value in values.items():
+            if field != "active_users":
+                totals[field] = totals.get(field, 0) + value
+
+    docs = [{"_id": f"day:{day}", "day": day, **values} for day, values in days.items()]
+    docs.append({"_id": GLOBAL_ID, **totals})
+    await _bulk(db.oasis_stats, [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs])
+    await db.oasis_stats.delete_many({"_id": {"$nin": [doc["_id"] for doc in docs]}})
+
+    # Recreate the distinct-user markers still inside the TTL window; existing
+    # ones are kept so sessions recorded meanwhile are not counted twice
+    since = datetime.combine(datetime.utcnow().date() - ACTIVE_MARKER_TTL, datetime.min.time())
+    now = datetime.utcnow()
+    markers = [
+        UpdateOne(
+            {"_id": f"{row['_id']['day']}:{row['_id']['user_id']}"},
+            {"$setOnInsert": {"day": row["_id"]["day"], "user_id": row["_id"]["user_id"], "created_at": now}},
+            upsert=True,
+        )
+        async for row in db.breathing_sessions.aggregate([
+            {"$match": {"completed_at": {"$gte": since}}},
+            {"$group": {"_id": {"day": day_expr, "user_id": "$user_id"}}},
+        ])
+    ]
+    await _bulk(db.oasis_active_users, markers)
+    return len(days)
+
+
+def main():
+    import argparse
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Maintain Oasis statistics rollups")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    days = asyncio.run(backfill(client[os.environ['DB_NAME']]))
+    print(f"Rebuilt Oasis rollups across {days} days")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,98 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Response
 from dotenv import load_dotenv
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+import asyncio
+import json
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime, date
+from datetime import datetime, date, timezone
 from enum import Enum
 
+from achievement_engine import AchievementEngine
+from achievement_queue import AchievementQueue, create_pending
+from catalog import CatalogCache, bump_catalog_version
+from course_graph import CourseGraph, assign_course_keys, bit_update, bits_to_int, int_to_bits
+from data_access import (
+    CAUSAL_TOKEN_HEADER, CausalConsistencyMiddleware, MongoSettings, OperationTimeTracker, QueryBudgets,
+)
+from exports import gzip_stream, iter_user_export
+from idempotency import REPLAYED_HEADER, IdempotencyMiddleware, IdempotencyStore
+from indexes import ensure_indexes
+from leaderboard import create_leaderboard, warm_leaderboard
+from ledger import LedgerWriter
+from metrics import (
+    ACHIEVEMENTS_UNLOCKED,
+    ZEN_COINS_AWARDED,
+    ZEN_COINS_DEDUCTED,
+    HttpMetricsMiddleware,
+    mongo_listeners,
+    register_stats,
+    render as render_metrics,
+)
+from pagination import NEXT_CURSOR_HEADER
+from profiler import SERVER_TIMING_HEADER, CommandProfiler, ProfilerMiddleware
+from rate_limit import RateLimitMiddleware, create_rate_limiter, parse_route_limits
+from repository import (
+    PROFILE_ACHIEVEMENTS, PROFILE_BALANCE, PROFILE_COURSES, PROFILE_EVALUATION, PROFILE_LEADERBOARD,
+    Repositories, new_referral_code,
+)
+from unit_of_work import ProfileNotFound, UnitOfWork
+import rollups
+
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+mongo_settings = MongoSettings(
+    max_pool_size=int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+    min_pool_size=int(os.environ.get('MONGO_MIN_POOL_SIZE', '0')),
+    connect_timeout_ms=int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+    server_selection_timeout_ms=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    wait_queue_timeout_ms=int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000')),
+    secondary_reads=os.environ.get('MONGO_SECONDARY_READS', '1') == '1',
+    max_staleness_seconds=int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', '90')),
+    budgets=QueryBudgets(
+        lookup_ms=int(os.environ.get('MONGO_LOOKUP_MAX_TIME_MS', '1000')),
+        batch_ms=int(os.environ.get('MONGO_BATCH_MAX_TIME_MS', '2000')),
+        history_ms=int(os.environ.get('MONGO_HISTORY_MAX_TIME_MS', '3000')),
+    ),
+)
+# Write acknowledgements feed the X-Causal-Token header, signed with a key all workers share
+operation_times = OperationTimeTracker(os.environ.get('CAUSAL_TOKEN_SECRET', '').encode() or None)
+# Command and connection pool events feed the /metrics endpoint and the request profiler
+client = AsyncIOMotorClient(
+    mongo_url,
+    event_listeners=[*mongo_listeners(), CommandProfiler(), operation_times],
+    **mongo_settings.client_options()
+)
 db = client[os.environ['DB_NAME']]
+# Staleness-tolerant reads (history pages, leaderboard rows, catalog reloads) go to secondaries
+replica_db = client.get_database(os.environ['DB_NAME'], read_preference=mongo_settings.read_preference())
+# All collection access from this module goes through the repositories
+repos = Repositories(db, replica_db, mongo_settings.budgets)
+
+# Group-commit writer for Zen Coin balances and transaction records
+ledger = LedgerWriter(
+    db,
+    max_batch=int(os.environ.get('LEDGER_MAX_BATCH', '100')),
+    max_delay=float(os.environ.get('LEDGER_MAX_DELAY_MS', '2')) / 1000,
+    use_transactions=os.environ.get('LEDGER_TRANSACTIONS', 'false').lower() == 'true'
+)
 
-# Create the main app without a prefix
-app = FastAPI()
+# Ranked Zen Coin leaderboard (Redis sorted set when REDIS_URL is set)
+leaderboard = create_leaderboard(os.environ.get('REDIS_URL'))
+
+# Create the main app without a prefix; responses are encoded with orjson
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -72,7 +143,14 @@ class UserProfile(BaseModel):
     consecutive_days: int = 0
     last_practice_date: Optional[date] = None
     achievements: List[str] = Field(default_factory=list)
-    referral_code: str = Field(default_factory=lambda: str(uuid.uuid4())[:8])
+    # Counters the achievement engine evaluates against
+    courses_completed: int = 0
+    mood_entries: int = 0
+    referrals: int = 0
+    achievement_marks: Dict[str, int] = Field(default_factory=dict)
+    # Completed courses as a bitset of Course.completion_bit (see course_graph)
+    course_bits: Dict[str, int] = Field(default_factory=dict)
+    referral_code: str = Field(default_factory=new_referral_code)
     referred_by: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -109,8 +187,11 @@ class Course(BaseModel):
     zen_coin_reward: int
     duration_minutes: int
     breathing_pattern: str  # References BREATHING_PATTERNS from frontend
-    prerequisites: List[str] = Field(default_factory=list)
+    prerequisites: List[str] = Field(default_factory=list)  # Slugs of courses to complete first
     is_active: bool = True
+    # Frozen on first load so renames keep prerequisite links and profile bitsets valid
+    slug: Optional[str] = None
+    completion_bit: Optional[int] = None
 
 class CourseCompletion(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -159,6 +240,26 @@ class BreathingSessionCreate(BaseModel):
     cycles_completed: int
     duration_seconds: int
 
+class BreathingSessionBatchItem(BaseModel):
+    intention: str
+    pattern_name: str
+    cycles_completed: int
+    duration_seconds: int
+    completed_at: Optional[datetime] = None  # Client-side completion time of an offline session
+
+# Upper bound on sessions accepted by one offline-sync request
+MAX_SESSION_BATCH = 500
+
+class BreathingSessionBatchCreate(BaseModel):
+    user_id: str
+    sessions: List[BreathingSessionBatchItem] = Field(..., min_length=1, max_length=MAX_SESSION_BATCH)
+
+class BreathingSessionBatchResult(BaseModel):
+    sessions: List[BreathingSession]
+    zen_coins_earned: int
+    consecutive_days: int
+    achievements_unlocked: List[str]
+
 class CourseCreate(BaseModel):
     name: str
     description: str
@@ -340,50 +441,36 @@ DEFAULT_COURSES = [
     }
 ]
 
+# In-memory catalog of achievements, courses and donation packages
+catalog = CatalogCache(
+    db, Achievement, Course, DONATION_PACKAGES,
+    poll_interval=float(os.environ.get('CATALOG_POLL_SECONDS', '30')),
+    read_db=replica_db,
+    max_time_ms=mongo_settings.budgets.batch
+)
+
 # Utility functions for Zen Coin system
-async def calculate_consecutive_days(user_id: str) -> int:
-    """Calculate consecutive days of practice for a user"""
-    user = await db.user_profiles.find_one({"id": user_id})
-    if not user:
-        return 0
-    
-    if not user.get("last_practice_date"):
-        return 0
-    
-    # Get today's date
-    today = datetime.utcnow().date()
-    last_practice = user["last_practice_date"]
-    
-    # Convert MongoDB datetime to date if needed
-    if isinstance(last_practice, datetime):
-        last_practice = last_practice.date()
-    
-    # If last practice was today, return current consecutive days
-    if last_practice == today:
-        return user.get("consecutive_days", 0)
-    
-    # If last practice was yesterday, we can continue the streak
-    if (today - last_practice).days == 1:
-        return user.get("consecutive_days", 0) + 1
-    
-    # If gap is more than 1 day, streak is broken
-    return 1 if last_practice == today else 1
+def new_unit_of_work() -> UnitOfWork:
+    return UnitOfWork(repos.profiles, ledger, leaderboard)
+
+async def unit_of_work():
+    """Request-scoped unit of work, committed once the handler returns successfully"""
+    uow = new_unit_of_work()
+    yield uow
+    try:
+        await uow.commit()
+    except ProfileNotFound:
+        raise HTTPException(404, "User not found")
+
+def award_zen_coins(uow: UnitOfWork, user_id: str, amount: int, transaction_type: AchievementType, description: str, metadata: Dict = None, counters: Dict[str, int] = None):
+    """Award Zen Coins to a user and create transaction record
 
-async def award_zen_coins(user_id: str, amount: int, transaction_type: AchievementType, description: str, metadata: Dict = None):
-    """Award Zen Coins to a user and create transaction record"""
+    counters are extra profile counters to $inc in the same write. The balance
+    update and transaction record are staged in the unit of work.
+    """
     if metadata is None:
         metadata = {}
     
-    # Update user's zen coin balance
-    await db.user_profiles.update_one(
-        {"id": user_id},
-        {
-            "$inc": {"zen_coins": amount},
-            "$set": {"updated_at": datetime.utcnow()}
-        }
-    )
-    
-    # Create transaction record
     transaction = ZenCoinTransaction(
         user_id=user_id,
         amount=amount,
@@ -392,110 +479,204 @@ async def award_zen_coins(user_id: str, amount: int, transaction_type: Achieveme
         metadata=metadata
     )
     
-    await db.zen_coin_transactions.insert_one(transaction.dict())
+    uow.inc(user_id, {"zen_coins": amount, **(counters or {})})
+    uow.record(user_id, transaction.dict())
+    if amount >= 0:
+        ZEN_COINS_AWARDED.labels(transaction_type.value).inc(amount)
+    else:
+        ZEN_COINS_DEDUCTED.labels(transaction_type.value).inc(-amount)
     return transaction
 
-async def check_and_award_achievements(user_id: str):
-    """Check if user has earned any new achievements"""
-    user = await db.user_profiles.find_one({"id": user_id})
+# Achievement catalog compiled once; see load_achievement_engine
+achievement_engine: Optional[AchievementEngine] = None
+
+def compile_achievement_engine(cache: CatalogCache) -> AchievementEngine:
+    """Compile the cached achievement catalog into the in-memory rule engine"""
+    global achievement_engine
+    achievement_engine = AchievementEngine([achievement.dict() for achievement in cache.achievements])
+    return achievement_engine
+
+catalog.on_refresh(compile_achievement_engine)
+
+# Course prerequisite DAG, recompiled with the catalog
+course_graph = CourseGraph([])
+
+def compile_course_graph(cache: CatalogCache) -> CourseGraph:
+    global course_graph
+    course_graph = CourseGraph([course.dict() for course in cache.courses_by_id.values()])
+    return course_graph
+
+catalog.on_refresh(compile_course_graph)
+
+async def load_achievement_engine() -> AchievementEngine:
+    """Load the catalog if needed and return the compiled engine"""
+    await catalog.ensure_loaded()
+    return achievement_engine or compile_achievement_engine(catalog)
+
+async def check_and_award_achievements(uow: UnitOfWork, user_id: str):
+    """Check if user has earned any new achievements
+
+    Flushes the request's staged profile changes, evaluates the compiled rules
+    against the returned counters and applies all unlocks with one guarded
+    profile update. Their transaction records are staged in the unit of work.
+    """
+    user = await uow.flush(user_id)
     if not user:
         return []
     
-    awarded_achievements = []
+    engine = await load_achievement_engine()
+    unlocked = engine.evaluate(user)
+    if not unlocked:
+        return []
+    
+    guard, update = engine.unlock_update(unlocked, user)
+    result = await repos.profiles.update(user_id, update, guard)
+    if result.modified_count == 0:
+        # A concurrent evaluation already applied these unlocks
+        return []
+    await leaderboard.incr(user_id, update["$inc"]["zen_coins"])
+    for rule in unlocked:
+        ACHIEVEMENTS_UNLOCKED.labels(rule.achievement["name"]).inc()
+        ZEN_COINS_AWARDED.labels(AchievementType(rule.achievement["achievement_type"]).value).inc(rule.reward)
     
-    # Get all achievements
-    achievements = await db.achievements.find().to_list(1000)
+    transactions = [
+        ZenCoinTransaction(
+            user_id=user_id,
+            amount=rule.reward,
+            transaction_type=rule.achievement["achievement_type"],
+            description=f"Achievement unlocked: {rule.achievement['name']}",
+            metadata={"achievement_id": rule.id}
+        )
+        for rule in unlocked
+    ]
+    # Balance was applied by the guarded update; only the transaction records are left to write
+    for txn in transactions:
+        uow.record(user_id, txn.dict())
     
-    for achievement in achievements:
-        achievement_id = achievement["id"]
-        
-        # Skip if already earned and not repeatable
-        if achievement_id in user.get("achievements", []) and not achievement.get("is_repeatable", False):
-            continue
-        
-        # Check achievement requirements
-        requirements = achievement.get("requirements", {})
-        earned = False
-        
-        if achievement["achievement_type"] == AchievementType.DAILY_PRACTICE:
-            if requirements.get("sessions") and user.get("total_sessions", 0) >= requirements["sessions"]:
-                earned = True
-            elif requirements.get("daily") and user.get("last_practice_date") == date.today():
-                earned = True
-                
-        elif achievement["achievement_type"] == AchievementType.CONSECUTIVE_DAYS:
-            if user.get("consecutive_days", 0) >= requirements.get("consecutive_days", 0):
-                earned = True
-                
-        elif achievement["achievement_type"] == AchievementType.COURSE_COMPLETION:
-            # Count completed courses
-            completed_courses = await db.course_completions.count_documents({"user_id": user_id})
-            if completed_courses >= requirements.get("courses", 0):
-                earned = True
-                
-        elif achievement["achievement_type"] == AchievementType.MOOD_DIARY:
-            # Count mood diary entries
-            mood_entries = await db.mood_diary_entries.count_documents({"user_id": user_id})
-            if mood_entries >= requirements.get("mood_entries", 0):
-                earned = True
-                
-        elif achievement["achievement_type"] == AchievementType.FRIEND_REFERRAL:
-            # Count referrals
-            referrals = await db.user_profiles.count_documents({"referred_by": user.get("referral_code")})
-            if referrals >= requirements.get("referrals", 0):
-                earned = True
-        
-        if earned:
-            # Award achievement
-            await db.user_profiles.update_one(
-                {"id": user_id},
-                {"$addToSet": {"achievements": achievement_id}}
-            )
-            
-            # Award Zen Coins
-            await award_zen_coins(
-                user_id,
-                achievement["zen_coin_reward"],
-                achievement["achievement_type"],
-                f"Achievement unlocked: {achievement['name']}",
-                {"achievement_id": achievement_id}
-            )
-            
-            awarded_achievements.append(achievement)
+    return [rule.achievement for rule in unlocked]
+
+async def evaluate_achievements(user_id: str):
+    """Evaluate one user's achievements in a unit of work of its own"""
+    uow = new_unit_of_work()
+    await check_and_award_achievements(uow, user_id)
+    await uow.commit()
+
+# Achievement checks for write endpoints run here, after the response is sent
+achievement_queue = AchievementQueue(
+    evaluate_achievements,
+    workers=int(os.environ.get('ACHIEVEMENT_WORKERS', '4')),
+    maxsize=int(os.environ.get('ACHIEVEMENT_QUEUE_SIZE', '10000')),
+    # Shared through Redis when REDIS_URL is set, so any worker can answer unlock polls
+    pending=create_pending(os.environ.get('REDIS_URL'))
+)
+
+register_stats("achievement_queue", "Achievement queue", achievement_queue.stats)
+
+def queue_achievement_check(uow: UnitOfWork, user_id: str):
+    """Evaluate user_id's achievements once the request's writes are committed"""
+    uow.after_commit(lambda: achievement_queue.enqueue(user_id))
+
+async def backfill_achievement_counters():
+    """Populate engine counters on profiles created before they existed"""
+    if not await repos.profiles.any_missing("mood_entries"):
+        return
+    
+    engine = await load_achievement_engine()
+    # counter -> {user_id or referral code: count}
+    counts: Dict[str, Dict[str, int]] = {}
+    for rows, counter in (
+        (repos.completions.count_by_user(), "courses_completed"),
+        (repos.moods.count_by_user(), "mood_entries"),
+        (repos.profiles.referral_counts(), "referrals"),
+    ):
+        counts[counter] = {}
+        async for row in rows:
+            if row["_id"] is not None:
+                counts[counter][row["_id"]] = row["n"]
+    
+    async for user in repos.profiles.missing("mood_entries", PROFILE_EVALUATION | {"referral_code": 1}):
+        counters = {
+            "courses_completed": counts["courses_completed"].get(user["id"], 0),
+            "mood_entries": counts["mood_entries"].get(user["id"], 0),
+            "referrals": counts["referrals"].get(user.get("referral_code"), 0),
+        }
+        marks = engine.baseline_marks({**user, **counters})
+        await repos.profiles.update(
+            user["id"],
+            {"$set": {**counters, **{f"achievement_marks.{key}": value for key, value in marks.items()}}}
+        )
+
+async def backfill_course_bits():
+    """Build course_bits for profiles created before the bitset existed"""
+    if not await repos.profiles.any_missing("course_bits"):
+        return
     
-    return awarded_achievements
+    await catalog.ensure_loaded()
+    async for row in repos.completions.course_ids_by_user():
+        completed = course_graph.completed_bits(row["course_ids"])
+        await repos.profiles.set_where_missing(row["_id"], "course_bits", int_to_bits(completed))
+    await repos.profiles.set_all_missing("course_bits", {})
 
 async def initialize_default_data():
     """Initialize default achievements and courses if they don't exist"""
+    seeded = False
+    
     # Check if achievements exist
-    achievement_count = await db.achievements.count_documents({})
-    if achievement_count == 0:
-        for achievement_data in DEFAULT_ACHIEVEMENTS:
-            achievement = Achievement(**achievement_data)
-            await db.achievements.insert_one(achievement.dict())
+    if await repos.achievements.is_empty():
+        await repos.achievements.insert_many([Achievement(**data).dict() for data in DEFAULT_ACHIEVEMENTS])
+        seeded = True
     
     # Check if courses exist
-    course_count = await db.courses.count_documents({})
-    if course_count == 0:
-        for course_data in DEFAULT_COURSES:
-            course = Course(**course_data)
-            await db.courses.insert_one(course.dict())
+    if await repos.courses.is_empty():
+        await repos.courses.insert_many([Course(**data).dict() for data in DEFAULT_COURSES])
+        seeded = True
+    
+    if await assign_course_keys(db):
+        seeded = True
+    
+    if seeded:
+        await bump_catalog_version(db)
 
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
 async def root():
     return {"message": "Restorative Lands API - Breathe & Bloom"}
 
+# Set once this worker's startup has finished, cleared when it starts shutting down
+worker_ready = False
+
+async def mongo_reachable() -> bool:
+    try:
+        await asyncio.wait_for(db.command("ping"), float(os.environ.get('HEALTH_CHECK_TIMEOUT_SECONDS', '2')))
+        return True
+    except (asyncio.TimeoutError, PyMongoError):
+        return False
+
+@api_router.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the worker is serving requests and can reach MongoDB"""
+    if not await mongo_reachable():
+        return ORJSONResponse({"status": "unavailable", "mongo": False}, status_code=503)
+    return {"status": "ok", "mongo": True}
+
+@api_router.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: healthy, and startup (catalog load, background writers) has finished"""
+    mongo = await mongo_reachable()
+    if not (mongo and worker_ready):
+        return ORJSONResponse({"status": "starting" if mongo else "unavailable", "mongo": mongo}, status_code=503)
+    return {"status": "ready", "mongo": True}
+
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    await repos.status_checks.insert(status_obj.dict())
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
+    status_checks = await repos.status_checks.list(1000)
     return [StatusCheck(**status_check) for status_check in status_checks]
 
 # Donation endpoints
@@ -526,7 +707,7 @@ async def create_donation_session(request: DonationRequest):
         )
         
         # Store in database
-        await db.payment_transactions.insert_one(transaction.dict())
+        await repos.payments.insert(transaction.dict())
         
         # For demo, create a mock payment URL
         demo_checkout_url = f"{request.origin_url}/demo-payment?session_id={session_id}&amount={request.amount}"
@@ -543,7 +724,7 @@ async def create_donation_session(request: DonationRequest):
 async def get_donation_status(session_id: str):
     """Get the status of a donation session"""
     
-    transaction = await db.payment_transactions.find_one({"session_id": session_id})
+    transaction = await repos.payments.get(session_id)
     
     if not transaction:
         raise HTTPException(404, "Session not found")
@@ -559,7 +740,7 @@ async def get_donation_status(session_id: str):
 async def confirm_donation(session_id: str):
     """Confirm a donation (demo endpoint)"""
     
-    transaction = await db.payment_transactions.find_one({"session_id": session_id})
+    transaction = await repos.payments.get(session_id)
     
     if not transaction:
         raise HTTPException(404, "Session not found")
@@ -571,56 +752,54 @@ async def confirm_donation(session_id: str):
         "completed_at": datetime.utcnow()
     }
     
-    await db.payment_transactions.update_one(
-        {"session_id": session_id},
-        {"$set": update_data}
-    )
+    await repos.payments.update(session_id, update_data)
     
     return {"message": "Donation confirmed successfully", "session_id": session_id}
 
 @api_router.get("/donations/packages")
 async def get_donation_packages():
     """Get available donation packages"""
-    return DONATION_PACKAGES
+    return Response(content=catalog.donation_packages_json, media_type="application/json")
 
 @api_router.get("/oasis/stats")
 async def get_global_oasis_stats():
     """Get global oasis statistics"""
-    return {
-        "total_sessions": 1000,
-        "total_elements_grown": 25000,
-        "active_gardens": 150,
-        "collective_breath_cycles": 50000
-    }
+    return await rollups.read_stats(db, datetime.utcnow().date())
 
 # ========== ZEN COIN SYSTEM API ENDPOINTS ==========
 
 # User Profile endpoints
 @api_router.post("/users", response_model=UserProfile)
-async def create_user_profile(user_data: UserProfileCreate):
+async def create_user_profile(user_data: UserProfileCreate, uow: UnitOfWork = Depends(unit_of_work)):
     """Create a new user profile"""
     user = UserProfile(**user_data.dict())
-    await db.user_profiles.insert_one(user.dict())
+    profile = user.dict()
+    await repos.profiles.insert(profile)
+    user.referral_code = profile["referral_code"]
+    await leaderboard.set(user.id, user.zen_coins)
+    await rollups.record_new_user(db, user.created_at)
     
     # Award Zen Coins if referred by someone
     if user_data.referred_by:
-        referrer = await db.user_profiles.find_one({"referral_code": user_data.referred_by})
+        referrer = await repos.profiles.by_referral_code(user_data.referred_by)
         if referrer:
-            await award_zen_coins(
+            award_zen_coins(
+                uow,
                 referrer["id"],
                 50,
                 AchievementType.FRIEND_REFERRAL,
                 f"Friend referral: {user.username} joined",
-                {"referred_user_id": user.id}
+                {"referred_user_id": user.id},
+                counters={"referrals": 1}
             )
-            await check_and_award_achievements(referrer["id"])
+            queue_achievement_check(uow, referrer["id"])
     
     return user
 
 @api_router.get("/users/{user_id}", response_model=UserProfile)
 async def get_user_profile(user_id: str):
     """Get user profile by ID"""
-    user = await db.user_profiles.find_one({"id": user_id})
+    user = await repos.profiles.get(user_id)
     if not user:
         raise HTTPException(404, "User not found")
     return UserProfile(**user)
@@ -629,44 +808,70 @@ async def get_user_profile(user_id: str):
 async def update_user_profile(user_id: str, updates: dict):
     """Update user profile"""
     updates["updated_at"] = datetime.utcnow()
-    result = await db.user_profiles.update_one({"id": user_id}, {"$set": updates})
-    if result.matched_count == 0:
+    user = await repos.profiles.update_and_get(user_id, {"$set": updates})
+    if not user:
         raise HTTPException(404, "User not found")
     
-    user = await db.user_profiles.find_one({"id": user_id})
+    if "zen_coins" in updates:
+        await leaderboard.set(user_id, user.get("zen_coins", 0))
     return UserProfile(**user)
 
+@api_router.get("/users/{user_id}/export")
+async def export_user_data(user_id: str):
+    """Stream all of a user's data as gzip-compressed NDJSON"""
+    user = await repos.profiles.get(user_id)
+    if not user:
+        raise HTTPException(404, "User not found")
+    
+    return StreamingResponse(
+        gzip_stream(iter_user_export(db, user)),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="zen-export-{user_id}.ndjson.gz"'}
+    )
+
+def model_projection(model) -> Dict[str, int]:
+    """Projection returning exactly a model's fields (and never _id)"""
+    return {"_id": 0, **{field: 1 for field in model.model_fields}}
+
+async def history_response(repo, model, user_id: str, cursor: Optional[str], limit: int) -> ORJSONResponse:
+    """Keyset-paginated per-user history page with the next-page cursor header
+
+    Rows were validated when written, so they are projected to the model's
+    fields and encoded straight from the driver's dicts without rebuilding models.
+    """
+    try:
+        rows, next_cursor = await repo.page(user_id, cursor, limit, model_projection(model))
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return ORJSONResponse(rows, headers=headers)
+
+def naive_utc(value: datetime) -> datetime:
+    """value as a naive UTC datetime, the form every stored timestamp takes"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
 # Breathing Session endpoints
 @api_router.post("/breathing-sessions", response_model=BreathingSession)
-async def create_breathing_session(session_data: BreathingSessionCreate):
+async def create_breathing_session(session_data: BreathingSessionCreate, uow: UnitOfWork = Depends(unit_of_work)):
     """Record a completed breathing session and award Zen Coins"""
+    if not await repos.profiles.exists(session_data.user_id):
+        raise HTTPException(404, "User not found")
+    
     session = BreathingSession(
         **session_data.dict(),
         zen_coins_earned=10  # Base reward for daily practice
     )
-    await db.breathing_sessions.insert_one(session.dict())
-    
-    # Update user stats
-    today = datetime.utcnow().date()
-    consecutive_days = await calculate_consecutive_days(session.user_id)
-    
-    # Convert date to datetime for MongoDB compatibility
-    today_datetime = datetime.combine(today, datetime.min.time())
-    
-    await db.user_profiles.update_one(
-        {"id": session.user_id},
-        {
-            "$inc": {"total_sessions": 1},
-            "$set": {
-                "last_practice_date": today_datetime,
-                "consecutive_days": consecutive_days,
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
+    await repos.sessions.insert(session.dict())
+    
+    # Update user stats: streak, session count and practice date, applied atomically with the reward
+    now = datetime.utcnow()
+    uow.practice(session.user_id, now.date(), now)
     
     # Award Zen Coins for daily practice
-    await award_zen_coins(
+    award_zen_coins(
+        uow,
         session.user_id,
         10,
         AchievementType.DAILY_PRACTICE,
@@ -674,36 +879,98 @@ async def create_breathing_session(session_data: BreathingSessionCreate):
         {"session_id": session.id}
     )
     
+    await rollups.record_sessions(
+        db, session.user_id, [(session.completed_at, session.cycles_completed, session.duration_seconds)]
+    )
+    
     # Check for achievements
-    await check_and_award_achievements(session.user_id)
+    queue_achievement_check(uow, session.user_id)
     
     return session
 
+@api_router.post("/breathing-sessions/batch", response_model=BreathingSessionBatchResult)
+async def create_breathing_sessions_batch(batch: BreathingSessionBatchCreate, uow: UnitOfWork = Depends(unit_of_work)):
+    """Record sessions completed offline in one request
+
+    Sessions are stored in completion order with bulk writes, the streak is
+    advanced over their days in one profile update, and achievements are
+    evaluated once. Completion times are normalized to naive UTC.
+    """
+    if not await repos.profiles.exists(batch.user_id):
+        raise HTTPException(404, "User not found")
+    
+    now = datetime.utcnow()
+    # Offline clocks drift: a session cannot have completed after the request arrived
+    completed = [min(naive_utc(item.completed_at), now) if item.completed_at else now for item in batch.sessions]
+    items = sorted(zip(completed, batch.sessions), key=lambda pair: pair[0])
+    
+    sessions = []
+    for completed_at, item in items:
+        session = BreathingSession(
+            user_id=batch.user_id,
+            intention=item.intention,
+            pattern_name=item.pattern_name,
+            cycles_completed=item.cycles_completed,
+            duration_seconds=item.duration_seconds,
+            zen_coins_earned=10,  # Base reward for daily practice
+            completed_at=completed_at
+        )
+        sessions.append(session)
+        uow.practice(batch.user_id, completed_at.date(), now)
+        uow.record(batch.user_id, ZenCoinTransaction(
+            user_id=batch.user_id,
+            amount=session.zen_coins_earned,
+            transaction_type=AchievementType.DAILY_PRACTICE,
+            description=f"Daily practice: {session.pattern_name}",
+            metadata={"session_id": session.id},
+            timestamp=completed_at
+        ).dict())
+    
+    zen_coins_earned = sum(session.zen_coins_earned for session in sessions)
+    await repos.sessions.insert_many([session.dict() for session in sessions])
+    await rollups.record_sessions(
+        db, batch.user_id,
+        [(session.completed_at, session.cycles_completed, session.duration_seconds) for session in sessions]
+    )
+    
+    # The streak is folded over the session days by the practice pipeline, atomically with the reward
+    uow.inc(batch.user_id, {"zen_coins": zen_coins_earned})
+    user = await uow.flush(batch.user_id)
+    if not user:
+        raise HTTPException(404, "User not found")
+    unlocked = await check_and_award_achievements(uow, batch.user_id)
+    
+    return BreathingSessionBatchResult(
+        sessions=sessions,
+        zen_coins_earned=zen_coins_earned,
+        consecutive_days=user["consecutive_days"],
+        achievements_unlocked=[achievement["name"] for achievement in unlocked]
+    )
+
 @api_router.get("/breathing-sessions/{user_id}")
-async def get_user_sessions(user_id: str, limit: int = 50):
-    """Get user's breathing sessions"""
-    sessions = await db.breathing_sessions.find({"user_id": user_id}).sort("completed_at", -1).limit(limit).to_list(limit)
-    return [BreathingSession(**session) for session in sessions]
+async def get_user_sessions(user_id: str, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
+    """Get user's breathing sessions, newest first; pass X-Next-Cursor back as cursor for the next page"""
+    return await history_response(repos.sessions, BreathingSession, user_id, cursor, limit)
 
 # Zen Coin Transaction endpoints
 @api_router.get("/zen-coins/{user_id}/balance")
 async def get_zen_coin_balance(user_id: str):
     """Get user's current Zen Coin balance"""
-    user = await db.user_profiles.find_one({"id": user_id})
+    user = await repos.profiles.get(user_id, PROFILE_BALANCE)
     if not user:
         raise HTTPException(404, "User not found")
     return {"user_id": user_id, "zen_coins": user.get("zen_coins", 0)}
 
 @api_router.get("/zen-coins/{user_id}/transactions")
-async def get_zen_coin_transactions(user_id: str, limit: int = 100):
-    """Get user's Zen Coin transaction history"""
-    transactions = await db.zen_coin_transactions.find({"user_id": user_id}).sort("timestamp", -1).limit(limit).to_list(limit)
-    return [ZenCoinTransaction(**txn) for txn in transactions]
+async def get_zen_coin_transactions(user_id: str, limit: int = Query(100, ge=1, le=500), cursor: Optional[str] = None):
+    """Get user's Zen Coin transaction history, newest first"""
+    return await history_response(repos.transactions, ZenCoinTransaction, user_id, cursor, limit)
 
 @api_router.post("/zen-coins/award")
-async def award_zen_coins_endpoint(transaction: ZenCoinTransactionCreate):
+async def award_zen_coins_endpoint(transaction: ZenCoinTransactionCreate, uow: UnitOfWork = Depends(unit_of_work)):
     """Award Zen Coins to a user (admin function)"""
-    result = await award_zen_coins(
+    result = award_zen_coins(
+        uow,
         transaction.user_id,
         transaction.amount,
         transaction.transaction_type,
@@ -716,137 +983,277 @@ async def award_zen_coins_endpoint(transaction: ZenCoinTransactionCreate):
 @api_router.get("/achievements")
 async def get_all_achievements():
     """Get all available achievements"""
-    achievements = await db.achievements.find().to_list(1000)
-    return [Achievement(**achievement) for achievement in achievements]
+    await catalog.ensure_loaded()
+    return Response(content=catalog.achievements_json, media_type="application/json")
+
+def unlocked_achievements(user: Dict) -> List[Achievement]:
+    """Resolve a profile's achievement ids against the loaded catalog"""
+    achievement_ids = set(user.get("achievements", []))
+    return [achievement for achievement in catalog.achievements if achievement.id in achievement_ids]
+
+@api_router.get("/achievements/queue/stats")
+async def get_achievement_queue_stats():
+    """Depth, wait time and backpressure counters of the achievement queue"""
+    return achievement_queue.stats()
+
+@api_router.get("/achievements/{user_id}/unlocked-since")
+async def get_achievements_unlocked_since(user_id: str, since: datetime, limit: int = Query(20, ge=1, le=100)):
+    """Achievements unlocked at or after since, oldest first
+
+    pending is true while an evaluation for the user is still queued or
+    running; poll again to pick up its results.
+    """
+    await catalog.ensure_loaded()
+    unlocks = await repos.transactions.achievement_unlocks(user_id, since, limit)
+    unlocked = []
+    for unlock in unlocks:
+        achievement = catalog.achievements_by_id.get(unlock["metadata"]["achievement_id"])
+        if achievement:
+            unlocked.append({**achievement.dict(), "unlocked_at": unlock["timestamp"]})
+    return {"user_id": user_id, "unlocked": unlocked, "pending": await achievement_queue.is_pending(user_id)}
 
 @api_router.get("/achievements/{user_id}")
 async def get_user_achievements(user_id: str):
     """Get user's unlocked achievements"""
-    user = await db.user_profiles.find_one({"id": user_id})
+    user = await repos.profiles.get(user_id, PROFILE_ACHIEVEMENTS)
     if not user:
         raise HTTPException(404, "User not found")
     
-    achievement_ids = user.get("achievements", [])
-    achievements = await db.achievements.find({"id": {"$in": achievement_ids}}).to_list(1000)
-    return [Achievement(**achievement) for achievement in achievements]
+    await catalog.ensure_loaded()
+    return unlocked_achievements(user)
 
 # Course endpoints
 @api_router.get("/courses")
 async def get_all_courses():
     """Get all available courses"""
-    courses = await db.courses.find({"is_active": True}).to_list(1000)
-    return [Course(**course) for course in courses]
+    await catalog.ensure_loaded()
+    return Response(content=catalog.courses_json, media_type="application/json")
 
 @api_router.get("/courses/{user_id}/available")
 async def get_available_courses(user_id: str):
     """Get courses available to user based on prerequisites"""
-    user = await db.user_profiles.find_one({"id": user_id})
+    user = await repos.profiles.get(user_id, PROFILE_COURSES)
     if not user:
         raise HTTPException(404, "User not found")
     
-    # Get completed courses
-    completed_course_ids = await db.course_completions.find({"user_id": user_id}).distinct("course_id")
-    completed_courses = await db.courses.find({"id": {"$in": completed_course_ids}}).to_list(1000)
-    completed_course_names = [course["name"].lower().replace(" ", "-") for course in completed_courses]
-    
-    # Get all courses
-    all_courses = await db.courses.find({"is_active": True}).to_list(1000)
-    
-    available_courses = []
-    for course in all_courses:
-        # Check if prerequisites are met
-        prerequisites_met = all(prereq in completed_course_names for prereq in course.get("prerequisites", []))
-        if prerequisites_met:
-            available_courses.append(Course(**course))
-    
-    return available_courses
+    await catalog.ensure_loaded()
+    return available_courses_for(user)
+
+def available_courses_for(user: Dict) -> List[Course]:
+    """Active courses whose prerequisites the user has completed"""
+    completed = bits_to_int(user.get("course_bits"))
+    return [course for course in catalog.courses if course_graph.is_available(course.id, completed)]
 
 @api_router.post("/courses/{course_id}/complete")
-async def complete_course(course_id: str, user_id: str):
+async def complete_course(course_id: str, user_id: str, uow: UnitOfWork = Depends(unit_of_work)):
     """Mark a course as completed and award Zen Coins"""
-    course = await db.courses.find_one({"id": course_id})
+    await catalog.ensure_loaded()
+    course = catalog.courses_by_id.get(course_id)
     if not course:
         raise HTTPException(404, "Course not found")
+    if not await repos.profiles.exists(user_id):
+        raise HTTPException(404, "User not found")
     
     # Check if already completed
-    existing_completion = await db.course_completions.find_one({"user_id": user_id, "course_id": course_id})
-    if existing_completion:
+    if await repos.completions.exists(user_id, course_id):
         raise HTTPException(400, "Course already completed")
     
     # Create completion record
     completion = CourseCompletion(
         user_id=user_id,
         course_id=course_id,
-        zen_coins_earned=course["zen_coin_reward"]
+        zen_coins_earned=course.zen_coin_reward
     )
-    await db.course_completions.insert_one(completion.dict())
+    await repos.completions.insert(completion.dict())
     
     # Award Zen Coins
-    await award_zen_coins(
+    award_zen_coins(
+        uow,
         user_id,
-        course["zen_coin_reward"],
+        course.zen_coin_reward,
         AchievementType.COURSE_COMPLETION,
-        f"Course completed: {course['name']}",
-        {"course_id": course_id}
+        f"Course completed: {course.name}",
+        {"course_id": course_id},
+        counters={"courses_completed": 1}
     )
+    if course.completion_bit is not None:
+        uow.stage(user_id, {"$bit": bit_update(course.completion_bit)})
+    await rollups.record_course_completion(db, completion.completed_at)
     
     # Check for achievements
-    await check_and_award_achievements(user_id)
+    queue_achievement_check(uow, user_id)
     
     return completion
 
 # Mood Diary endpoints
 @api_router.post("/mood-diary", response_model=MoodDiaryEntry)
-async def create_mood_diary_entry(entry_data: MoodDiaryCreate):
+async def create_mood_diary_entry(entry_data: MoodDiaryCreate, uow: UnitOfWork = Depends(unit_of_work)):
     """Create a mood diary entry and award Zen Coins"""
+    if not await repos.profiles.exists(entry_data.user_id):
+        raise HTTPException(404, "User not found")
+    
     entry = MoodDiaryEntry(**entry_data.dict())
-    await db.mood_diary_entries.insert_one(entry.dict())
+    await repos.moods.insert(entry.dict())
     
     # Award Zen Coins
-    await award_zen_coins(
+    award_zen_coins(
+        uow,
         entry.user_id,
         5,
         AchievementType.MOOD_DIARY,
         f"Mood reflection: {entry.mood.value}",
-        {"mood_entry_id": entry.id}
+        {"mood_entry_id": entry.id},
+        counters={"mood_entries": 1}
     )
+    await rollups.record_mood_entry(db, entry.created_at)
     
     # Check for achievements
-    await check_and_award_achievements(entry.user_id)
+    queue_achievement_check(uow, entry.user_id)
     
     return entry
 
 @api_router.get("/mood-diary/{user_id}")
-async def get_user_mood_diary(user_id: str, limit: int = 50):
-    """Get user's mood diary entries"""
-    entries = await db.mood_diary_entries.find({"user_id": user_id}).sort("created_at", -1).limit(limit).to_list(limit)
-    return [MoodDiaryEntry(**entry) for entry in entries]
+async def get_user_mood_diary(user_id: str, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
+    """Get user's mood diary entries, newest first"""
+    return await history_response(repos.moods, MoodDiaryEntry, user_id, cursor, limit)
 
-# Leaderboard endpoint
+# Leaderboard endpoints
 @api_router.get("/leaderboard")
-async def get_zen_coin_leaderboard(limit: int = 10):
-    """Get Zen Coin leaderboard"""
-    users = await db.user_profiles.find().sort("zen_coins", -1).limit(limit).to_list(limit)
-    leaderboard = []
-    for i, user in enumerate(users, 1):
-        leaderboard.append({
+async def get_zen_coin_leaderboard(limit: int = Query(10, ge=1, le=100), offset: int = Query(0, ge=0)):
+    """Get a page of the Zen Coin leaderboard"""
+    return await leaderboard_page(offset, limit)
+
+async def leaderboard_page(offset: int, limit: int) -> List[Dict]:
+    """Ranked leaderboard rows joined with display fields from the profiles"""
+    entries = await leaderboard.page(offset, limit)
+    users = await repos.profiles.many([user_id for user_id, _ in entries], PROFILE_LEADERBOARD)
+    users_by_id = {user["id"]: user for user in users}
+    
+    ranked = []
+    for i, (user_id, zen_coins) in enumerate(entries, offset + 1):
+        user = users_by_id.get(user_id)
+        if not user:
+            continue
+        ranked.append({
             "rank": i,
             "username": user["username"],
-            "zen_coins": user["zen_coins"],
+            "zen_coins": zen_coins,
             "total_sessions": user.get("total_sessions", 0),
             "consecutive_days": user.get("consecutive_days", 0)
         })
-    return leaderboard
+    return ranked
+
+@api_router.get("/leaderboard/rank/{user_id}")
+async def get_user_rank(user_id: str):
+    """Get a user's position on the Zen Coin leaderboard"""
+    rank = await user_rank(user_id)
+    if rank is None:
+        raise HTTPException(404, "User not found")
+    return rank
+
+async def user_rank(user_id: str) -> Optional[Dict]:
+    position = await leaderboard.rank(user_id)
+    if position is None:
+        return None
+    rank, zen_coins = position
+    return {
+        "user_id": user_id,
+        "rank": rank + 1,
+        "zen_coins": zen_coins,
+        "total_users": await leaderboard.size()
+    }
+
+# Dashboard bootstrap endpoint
+@api_router.get("/bootstrap/{user_id}")
+async def get_dashboard_bootstrap(user_id: str, leaderboard_limit: int = Query(10, ge=1, le=100)):
+    """Everything the dashboard loads on startup, in one response
+
+    Reads the user document once and runs the remaining lookups concurrently.
+    """
+    user = await repos.profiles.get(user_id)
+    if not user:
+        raise HTTPException(404, "User not found")
+    
+    await catalog.ensure_loaded()
+    leaderboard_rows, rank = await asyncio.gather(
+        leaderboard_page(0, leaderboard_limit),
+        user_rank(user_id)
+    )
+    
+    return {
+        "user": UserProfile(**user),
+        "achievements": catalog.achievements,
+        "user_achievements": unlocked_achievements(user),
+        "courses": catalog.courses,
+        "available_courses": available_courses_for(user),
+        "leaderboard": leaderboard_rows,
+        "rank": rank
+    }
 
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics, merged over every worker when run by launcher.py"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+# Retried writes carrying an Idempotency-Key replay the first response
+idempotency_store = IdempotencyStore(db, lru_size=int(os.environ.get('IDEMPOTENCY_LRU_SIZE', '10000')))
+app.add_middleware(IdempotencyMiddleware, store=idempotency_store)
+
+# Server-Timing and query-count warnings for requests sent with X-Profile: 1 and
+# a PROFILE_SAMPLE_RATE fraction of the rest
+app.add_middleware(
+    ProfilerMiddleware,
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+    max_queries=int(os.environ.get('PROFILE_MAX_QUERIES', '20')),
+    max_repeats=int(os.environ.get('PROFILE_MAX_REPEATS', '3'))
+)
+
+# Per-route limits on write fan-out, as (requests per minute, burst) per user or
+# per client address; RATE_LIMITS (JSON of the same shape) overrides entries, and
+# RATE_LIMITS=off disables them (load tests)
+RATE_LIMITS = {
+    "POST /api/users": (10, 5),
+    "POST /api/breathing-sessions": (30, 10),
+    "POST /api/breathing-sessions/batch": (6, 3),
+    "POST /api/mood-diary": (30, 10),
+    "POST /api/courses/{course_id}/complete": (20, 5),
+    "POST /api/zen-coins/award": (10, 5),
+    "POST /api/donations/create-session": (10, 5),
+}
+if os.environ.get('RATE_LIMITS') == 'off':
+    RATE_LIMITS = {}
+else:
+    RATE_LIMITS.update({route: tuple(limit) for route, limit in json.loads(os.environ.get('RATE_LIMITS', '{}')).items()})
+
+rate_limiter = create_rate_limiter(os.environ.get('REDIS_URL'))
+app.add_middleware(
+    RateLimitMiddleware,
+    limiter=rate_limiter,
+    routes=parse_route_limits(RATE_LIMITS),
+    max_in_flight=int(os.environ.get('MAX_IN_FLIGHT_REQUESTS', '512')),
+    # Only behind a proxy that appends the peer address (nginx.conf does)
+    trust_forwarded=os.environ.get('TRUST_FORWARDED_FOR', '0') == '1',
+    address_factor=float(os.environ.get('RATE_LIMIT_ADDRESS_FACTOR', '5')),
+    exempt_paths=("/metrics", "/api/healthz", "/api/readyz")
+)
+
+# Read-your-writes for secondary reads: writes return X-Causal-Token, reads send it back
+app.add_middleware(CausalConsistencyMiddleware, tracker=operation_times)
+
+# Outside the limiter so shed and limited requests are counted too
+app.add_middleware(HttpMetricsMiddleware, routes=app.routes)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, REPLAYED_HEADER, SERVER_TIMING_HEADER, CAUSAL_TOKEN_HEADER],
 )
 
 # Configure logging
@@ -856,12 +1263,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize default data on startup"""
+async def prepare_database():
+    """One-time setup: indexes, default catalog and counter backfills
+
+    launcher.py runs this once before starting its workers and sets
+    DATABASE_PREPARED=1 for them; a bare `uvicorn server:app` runs it on startup.
+    """
+    await ensure_indexes(db)
     await initialize_default_data()
+    # Reload after the seed writes even when reading from a secondary
+    await catalog.refresh(after=operation_times.operation_time())
+    await backfill_achievement_counters()
+    await backfill_course_bits()
     logger.info("Default achievements and courses initialized")
 
+@app.on_event("startup")
+async def startup_event():
+    """Prepare the database unless the launcher already has, then start this worker's background tasks"""
+    global worker_ready
+    if os.environ.get('DATABASE_PREPARED') == '1':
+        await catalog.refresh()
+    else:
+        await prepare_database()
+    await warm_leaderboard(leaderboard, db)
+    ledger.start()
+    achievement_queue.start()
+    catalog.start()
+    worker_ready = True
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    global worker_ready
+    worker_ready = False
+    await catalog.stop()
+    await achievement_queue.close()
+    await achievement_queue.pending.close()
+    await ledger.close()
+    await leaderboard.close()
+    await rate_limiter.close()
     client.close()
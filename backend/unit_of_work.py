@@ -0,0 +1,132 @@
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from repository import PROFILE_EVALUATION
+
+
+def merge_update(target: Dict[str, Dict[str, Any]], update: Dict[str, Dict[str, Any]]):
+    """Fold one update document into another in place
+
+    $inc amounts add up, $bit "or" masks combine, $addToSet $each lists are
+    unioned, and every other operator ($set, $max, ...) keeps the later value.
+    """
+    for operator, fields in update.items():
+        merged = target.setdefault(operator, {})
+        for field, value in fields.items():
+            if operator == "$inc":
+                merged[field] = merged.get(field, 0) + value
+            elif operator == "$bit":
+                merged[field] = {"or": merged.get(field, {}).get("or", 0) | value["or"]}
+            elif operator == "$addToSet":
+                values = value["$each"] if isinstance(value, dict) else [value]
+                existing = merged.setdefault(field, {"$each": []})["$each"]
+                existing.extend(item for item in values if item not in existing)
+            else:
+                merged[field] = value
+
+
+class ProfileNotFound(LookupError):
+    """A staged profile change matched no stored profile"""
+
+    def __init__(self, user_id: str):
+        super().__init__(user_id)
+        self.user_id = user_id
+
+
+class UnitOfWork:
+    """Request-scoped identity map and write buffer for user profiles
+
+    Each profile is read at most once per request. Handlers stage $inc/$set/$bit
+    mutations and transaction records here instead of writing them one by one;
+    flush() applies a user's staged mutations as one find_one_and_update and
+    keeps the returned document, and commit() flushes every profile and hands
+    all transaction records to the ledger in one batch.
+    """
+
+    def __init__(self, profiles, ledger, leaderboard, projection: Dict[str, int] = PROFILE_EVALUATION):
+        self.profiles = profiles
+        self.ledger = ledger
+        self.leaderboard = leaderboard
+        self.projection = projection
+        self._identity: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._updates: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._practice: Dict[str, Tuple[List[date], datetime]] = {}
+        self._transactions: Dict[str, List[Dict[str, Any]]] = {}
+        self._after_commit: List[Callable[[], Awaitable]] = []
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """The profile as last read or flushed in this request (staged changes not applied)"""
+        if user_id not in self._identity:
+            self._identity[user_id] = await self.profiles.get(user_id, self.projection)
+        return self._identity[user_id]
+
+    def stage(self, user_id: str, update: Dict[str, Dict[str, Any]]):
+        merge_update(self._updates.setdefault(user_id, {}), update)
+
+    def inc(self, user_id: str, fields: Dict[str, int]):
+        self.stage(user_id, {"$inc": fields})
+
+    def practice(self, user_id: str, day: date, now: datetime):
+        """Stage one practice session on day: streak, session counter and practice date"""
+        days = self._practice[user_id][0] if user_id in self._practice else []
+        days.append(day)
+        self._practice[user_id] = (days, now)
+
+    def record(self, user_id: str, transaction: Dict[str, Any]):
+        self._transactions.setdefault(user_id, []).append(transaction)
+
+    def after_commit(self, callback: Callable[[], Awaitable]):
+        """Run callback once everything staged so far is written"""
+        self._after_commit.append(callback)
+
+    async def flush(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Write user_id's staged mutations in one round-trip and return the stored profile"""
+        update = self._updates.pop(user_id, None)
+        practice = self._practice.pop(user_id, None)
+        if not update and not practice:
+            return await self.get(user_id)
+
+        update = update or {}
+        if practice:
+            days, now = practice
+            doc = await self.profiles.record_practice(user_id, days, now, self.projection, update)
+        else:
+            merge_update(update, {"$set": {"updated_at": datetime.utcnow()}})
+            doc = await self.profiles.update_and_get(user_id, update, self.projection)
+        self._identity[user_id] = doc
+
+        coins = update.get("$inc", {}).get("zen_coins")
+        if doc and coins:
+            await self.leaderboard.incr(user_id, coins)
+        return doc
+
+    async def commit(self):
+        """Flush every staged profile and write all transaction records
+
+        Profiles nobody needs to read back whose only staged change is an $inc
+        go to the ledger together with their transaction records, so they are
+        group-committed with other requests' writes.
+
+        Raises ProfileNotFound once everything else is written if a staged
+        change matched no profile; nothing is recorded or ranked for that user.
+        """
+        transactions, self._transactions = self._transactions, {}
+        missing = []
+        for user_id in list(self._updates.keys() | self._practice.keys()):
+            update = self._updates.get(user_id)
+            if update is not None and user_id not in self._practice and update.keys() == {"$inc"}:
+                del self._updates[user_id]
+                if not await self.ledger.submit(user_id, update["$inc"], transactions.pop(user_id, [])):
+                    missing.append(user_id)
+                elif update["$inc"].get("zen_coins"):
+                    await self.leaderboard.incr(user_id, update["$inc"]["zen_coins"])
+            elif await self.flush(user_id) is None:
+                missing.append(user_id)
+                transactions.pop(user_id, None)
+        for user_id, records in transactions.items():
+            await self.ledger.submit(user_id, None, records)
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            await callback()
+        if missing:
+            raise ProfileNotFound(missing[0])
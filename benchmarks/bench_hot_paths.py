@@ -0,0 +1,86 @@
+"""How the hottest server.py paths scale with a user's history size.
+
+    pytest benchmarks/ [--history-sizes 10,1000,100000] [--benchmark-autosave]
+    pytest benchmarks/ --benchmark-compare        # against the last autosaved run
+
+Each benchmark is parametrized by data store (see conftest.py) and by the number
+of session, mood and transaction rows the user has. Counter-backed paths should
+stay flat as history grows; anything that scans history will not. Save a run per
+commit with --benchmark-autosave and diff them with --benchmark-compare, or
+`pytest-benchmark compare`.
+"""
+from datetime import datetime, timedelta
+
+from repository import PROFILE_EVALUATION
+
+# Fixed rounds keep the 100k-row runs on the in-memory store to a few seconds each
+ROUNDS = 10
+
+
+def test_check_and_award_achievements_no_new_unlocks(benchmark, app, user_id, run):
+    """The common case: an evaluation after a write that unlocks nothing"""
+    async def evaluate():
+        uow = app.new_unit_of_work()
+        unlocked = await app.check_and_award_achievements(uow, user_id)
+        await uow.commit()
+        return unlocked
+
+    assert benchmark.pedantic(lambda: run(evaluate()), rounds=ROUNDS) == []
+
+
+def test_check_and_award_achievements_unlocking(benchmark, app, user_id, run):
+    """An evaluation that unlocks every achievement the counters satisfy"""
+    def reset():
+        run(app.repos.profiles.update(user_id, {"$set": {"achievements": [], "achievement_marks": {}}}))
+
+    async def evaluate():
+        uow = app.new_unit_of_work()
+        unlocked = await app.check_and_award_achievements(uow, user_id)
+        await uow.commit()
+        return unlocked
+
+    unlocked = benchmark.pedantic(lambda: run(evaluate()), setup=reset, rounds=ROUNDS)
+    assert unlocked
+
+
+def test_award_zen_coins(benchmark, app, user_id, run):
+    """Stage an award and commit it (the ledger is not running, so it writes through)"""
+    async def award():
+        uow = app.new_unit_of_work()
+        app.award_zen_coins(uow, user_id, 5, app.AchievementType.MOOD_DIARY, "Mood diary entry")
+        await uow.commit()
+
+    benchmark.pedantic(lambda: run(award()), rounds=ROUNDS)
+
+
+def test_record_practice(benchmark, app, user_id, run):
+    """Streak, session count and practice date in one pipeline update (replaced calculate_consecutive_days)"""
+    now = datetime.utcnow()
+    days = iter(range(1, 10 ** 6))
+
+    def practice():
+        day = (now + timedelta(days=next(days))).date()
+        return run(app.repos.profiles.record_practice(user_id, [day], now, PROFILE_EVALUATION))
+
+    assert benchmark.pedantic(practice, rounds=ROUNDS)["id"] == user_id
+
+
+def test_get_available_courses(benchmark, app, user_id, run):
+    courses = benchmark.pedantic(lambda: run(app.get_available_courses(user_id)), rounds=ROUNDS)
+    assert courses
+
+
+def test_session_history_page(benchmark, app, user_id, history, run):
+    """First page of GET /api/breathing-sessions/{user_id}, projected and encoded"""
+    response = benchmark.pedantic(
+        lambda: run(app.history_response(app.repos.sessions, app.BreathingSession, user_id, None, 50)), rounds=ROUNDS
+    )
+    assert response.status_code == 200
+
+
+def test_transaction_history_page(benchmark, app, user_id, history, run):
+    """First page of GET /api/zen-coins/{user_id}/transactions, projected and encoded"""
+    response = benchmark.pedantic(
+        lambda: run(app.history_response(app.repos.transactions, app.ZenCoinTransaction, user_id, None, 100)), rounds=ROUNDS
+    )
+    assert response.status_code == 200
@@ -0,0 +1,95 @@
+"""Per-row cost of the list-endpoint serialization paths on a 1000-row response.
+
+    python benchmarks/bench_serialization.py [--rows 1000] [--repeat 20]
+
+Compares the original path (validate every DB row into a model, then let
+FastAPI's jsonable_encoder + json.dumps render it) with model_construct and
+with the projected-dict + orjson path the history endpoints now use.
+"""
+import argparse
+import json
+import sys
+import timeit
+import uuid
+import warnings
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import orjson  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from server import BreathingSession, ZenCoinTransaction, model_projection  # noqa: E402
+
+
+def session_rows(count):
+    start = datetime(2025, 6, 1)
+    user_id = str(uuid.uuid4())
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "intention": "calm",
+            "pattern_name": "just-breathe",
+            "cycles_completed": 12,
+            "duration_seconds": 300,
+            "zen_coins_earned": 10,
+            "completed_at": start + timedelta(minutes=i),
+        }
+        for i in range(count)
+    ]
+
+
+def transaction_rows(count):
+    start = datetime(2025, 6, 1)
+    user_id = str(uuid.uuid4())
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "amount": 10,
+            "transaction_type": "daily_practice",
+            "description": "Daily practice: just-breathe",
+            "metadata": {"session_id": str(uuid.uuid4())},
+            "timestamp": start + timedelta(minutes=i),
+        }
+        for i in range(count)
+    ]
+
+
+def starlette_render(content):
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def paths(model, rows):
+    fields = set(model_projection(model)) - {"_id"}
+    projected = [{key: value for key, value in row.items() if key in fields} for row in rows]
+    return {
+        "validated models + jsonable_encoder + json": lambda: starlette_render(jsonable_encoder([model(**row) for row in rows])),
+        "model_construct + jsonable_encoder + json": lambda: starlette_render(jsonable_encoder([model.model_construct(**row) for row in rows])),
+        "validated models + orjson": lambda: orjson.dumps([model(**row).model_dump() for row in rows]),
+        "projected dicts + orjson": lambda: orjson.dumps(projected),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    # model_construct skips coercion, so pydantic warns when dumping raw enum strings
+    warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
+
+    for model, rows in ((BreathingSession, session_rows(args.rows)), (ZenCoinTransaction, transaction_rows(args.rows))):
+        print(f"\n{model.__name__}: {args.rows} rows, best of {args.repeat}")
+        baseline = None
+        for name, fn in paths(model, rows).items():
+            best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+            per_row_us = best / args.rows * 1e6
+            baseline = baseline or per_row_us
+            print(f"  {name:<45} {per_row_us:8.2f} us/row  {baseline / per_row_us:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Fixtures for the server hot-path benchmarks (bench_hot_paths.py).
+
+Every benchmark runs once per data store: mongomock-motor in memory, and a
+local mongod (BENCH_MONGO_URL, default mongodb://localhost:27017) when one is
+reachable; the mongod runs are skipped otherwise. Each store gets a scratch
+database with the default catalog (and the app's indexes on mongod), and one
+user per history size whose sessions, mood entries and transactions number
+that many rows.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+MONGO_URL = os.environ.get("BENCH_MONGO_URL", "mongodb://localhost:27017")
+STORES = ["mongomock", "mongod"]
+SEED_CHUNK = 10000
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--history-sizes", default="10,1000,100000",
+        help="comma-separated history rows per benchmarked user",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "store" in metafunc.fixturenames:
+        metafunc.parametrize("store", STORES, indirect=True, scope="session")
+    if "history" in metafunc.fixturenames:
+        sizes = [int(size) for size in metafunc.config.getoption("history_sizes").split(",")]
+        metafunc.parametrize("history", sizes, scope="session")
+
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    # Motor clients bind to the current loop when created
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def run(loop):
+    """Run a coroutine to completion on the benchmark loop"""
+    return loop.run_until_complete
+
+
+@pytest.fixture(scope="session")
+def store(request, run):
+    """(database, per-size user cache) for one data store"""
+    from indexes import ensure_indexes
+
+    if request.param == "mongomock":
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+        client = mongomock_motor.AsyncMongoMockClient()
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        from pymongo.errors import PyMongoError
+
+        client = AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=1000)
+        try:
+            run(client.admin.command("ping"))
+        except PyMongoError:
+            pytest.skip(f"no mongod at {MONGO_URL}")
+
+    db = client[f"zen_bench_{uuid.uuid4().hex[:8]}"]
+    if request.param == "mongod":
+        # mongomock scans regardless, and checks unique indexes by scanning on every insert
+        run(ensure_indexes(db))
+    yield db, {}
+    if request.param == "mongod":
+        run(client.drop_database(db.name))
+    client.close()
+
+
+@pytest.fixture
+def app(store, run, monkeypatch):
+    """server.py wired to the store's database, with its catalog loaded"""
+    import server
+    from repository import Repositories
+
+    db, _ = store
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "repos", Repositories(db))
+    monkeypatch.setattr(server.catalog, "db", db)
+    monkeypatch.setattr(server.catalog, "read_db", db)
+    monkeypatch.setattr(server.ledger, "db", db)
+    run(server.initialize_default_data())
+    run(server.catalog.refresh())
+    return server
+
+
+async def seed_user(server, history):
+    """A user with history rows each of sessions, mood entries and transactions"""
+    from course_graph import int_to_bits
+
+    user_id = str(uuid.uuid4())
+    start = datetime.utcnow() - timedelta(minutes=history)
+    first_course = server.catalog.courses[0]
+    profile = server.UserProfile(
+        id=user_id,
+        username=f"bench_{history}",
+        zen_coins=10 * history,
+        total_sessions=history,
+        consecutive_days=min(history, 30),
+        mood_entries=history,
+        courses_completed=1,
+        course_bits=int_to_bits(1 << server.course_graph.bit_by_id[first_course.id]),
+    ).dict()
+    # Stored as a datetime, like the practice pipeline writes it
+    profile["last_practice_date"] = datetime.combine(start.date(), datetime.min.time())
+    await server.repos.profiles.insert(profile)
+
+    def rows(make):
+        return [make(start + timedelta(minutes=i)) for i in range(history)]
+
+    history_rows = [
+        (server.repos.sessions, rows(lambda at: server.BreathingSession(
+            user_id=user_id, intention="calm", pattern_name="just-breathe",
+            cycles_completed=6, duration_seconds=120, zen_coins_earned=10, completed_at=at,
+        ).dict())),
+        (server.repos.moods, rows(lambda at: server.MoodDiaryEntry(
+            user_id=user_id, mood="calm", created_at=at,
+        ).dict())),
+        (server.repos.transactions, rows(lambda at: server.ZenCoinTransaction(
+            user_id=user_id, amount=10, transaction_type="daily_practice",
+            description="Daily practice: just-breathe", timestamp=at,
+        ).dict())),
+    ]
+    for repo, docs in history_rows:
+        for i in range(0, len(docs), SEED_CHUNK):
+            await repo.insert_many(docs[i:i + SEED_CHUNK])
+
+    # Evaluate once so benchmarks start from a user whose unlocks are applied
+    uow = server.new_unit_of_work()
+    await server.check_and_award_achievements(uow, user_id)
+    await uow.commit()
+    return user_id
+
+
+@pytest.fixture
+def user_id(app, store, history, run):
+    """Id of the store's user with history rows of each kind, seeded on first use"""
+    _, users = store
+    if history not in users:
+        users[history] = run(seed_user(app, history))
+    return users[history]
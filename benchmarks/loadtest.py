@@ -0,0 +1,325 @@
+"""Closed-loop load test replaying the frontend's request flows against a local stack.
+
+    python benchmarks/loadtest.py [--users 50] [--duration 30] [--url http://localhost:8001]
+                                  [--baseline benchmarks/loadtest_baseline.json] [--save-baseline PATH]
+
+Each virtual user onboards (creates a profile and loads the bootstrap payload),
+then loops over weighted scenarios taken from frontend/src/App.js: recording a
+breathing session, a mood entry, completing a course, and the dashboard fan-out
+of catalog, leaderboard and profile GETs. Every write is followed by the profile
+refresh and unlocked-since poll the frontend issues after it.
+
+Without --url the app runs in-process over httpx's ASGI transport against
+MONGO_URL, in the --db-name database (default zen_loadtest). Per-route rate
+limits are switched off (RATE_LIMITS=off) unless --keep-rate-limits is given.
+Start a uvicorn target with RATE_LIMITS=off as well, or the 429s dominate.
+
+The report gives requests per second and p50/p95/p99 latency per route, and the
+MongoDB commands the run issued per collection and command, read from the
+target's /metrics (so one worker's share when several are running). With
+--baseline, a route whose p95 or the overall throughput is worse than the
+baseline by more than --tolerance is flagged and the exit status is 1.
+
+No baseline is committed: latencies depend on the machine and on the MongoDB
+behind MONGO_URL, so compare only against one recorded on the same setup with
+the same --users and --duration. Record it from the commit to compare against:
+
+    python benchmarks/loadtest.py --seed 1 --save-baseline benchmarks/loadtest_baseline.json
+    python benchmarks/loadtest.py --seed 1 --baseline benchmarks/loadtest_baseline.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import urlparse
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+SCENARIO_WEIGHTS = {
+    "session": 4,
+    "mood": 2,
+    "course": 1,
+    "dashboard": 3,
+}
+
+INTENTIONS = ["calm", "focus", "sleep", "energy"]
+MOODS = ["very_happy", "happy", "neutral", "sad", "anxious", "stressed", "calm", "peaceful"]
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "0.0.0.0"}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class Recorder:
+    """Latencies and statuses per route template"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    async def request(self, client, method, route, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, "error"
+        self.latencies[f"{method} {route}"].append(time.perf_counter() - start)
+        self.statuses[f"{method} {route}"][status] += 1
+        return response if response is not None and response.status_code < 400 else None
+
+    def report(self, elapsed):
+        routes = {}
+        for route, values in sorted(self.latencies.items()):
+            values.sort()
+            statuses = self.statuses[route]
+            routes[route] = {
+                "requests": len(values),
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "errors": sum(count for status, count in statuses.items() if status == "error" or status >= 400),
+                "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+            }
+        total = sum(route["requests"] for route in routes.values())
+        return {"elapsed_s": round(elapsed, 2), "requests": total, "rps": round(total / elapsed, 2), "routes": routes}
+
+
+class VirtualUser:
+    def __init__(self, client, recorder):
+        self.client = client
+        self.recorder = recorder
+        self.user_id = None
+        self.completed_courses = set()
+
+    async def call(self, method, route, url, **kwargs):
+        return await self.recorder.request(self.client, method, route, url, **kwargs)
+
+    async def onboard(self, referral_code=None):
+        body = {"username": f"load_{uuid.uuid4().hex[:12]}"}
+        if referral_code:
+            body["referred_by"] = referral_code
+        response = await self.call("POST", "/api/users", "/api/users", json=body)
+        if response is None:
+            return None
+        profile = response.json()
+        self.user_id = profile["id"]
+        await self.call("GET", "/api/bootstrap/{user_id}", f"/api/bootstrap/{self.user_id}")
+        return profile
+
+    async def after_write(self, since):
+        """The profile refresh and achievement poll the frontend runs after every write"""
+        await self.call("GET", "/api/users/{user_id}", f"/api/users/{self.user_id}")
+        if since:
+            await self.call(
+                "GET", "/api/achievements/{user_id}/unlocked-since",
+                f"/api/achievements/{self.user_id}/unlocked-since", params={"since": since}
+            )
+
+    async def session(self):
+        response = await self.call("POST", "/api/breathing-sessions", "/api/breathing-sessions", json={
+            "user_id": self.user_id,
+            "intention": random.choice(INTENTIONS),
+            "pattern_name": "just-breathe",
+            "cycles_completed": random.randint(3, 12),
+            "duration_seconds": random.randint(60, 600),
+        })
+        await self.after_write(response.json()["completed_at"] if response else None)
+
+    async def mood(self):
+        response = await self.call("POST", "/api/mood-diary", "/api/mood-diary", json={
+            "user_id": self.user_id, "mood": random.choice(MOODS), "notes": "load test",
+        })
+        await self.after_write(response.json()["created_at"] if response else None)
+
+    async def course(self):
+        response = await self.call("GET", "/api/courses/{user_id}/available", f"/api/courses/{self.user_id}/available")
+        if response is None:
+            return
+        candidates = [course["id"] for course in response.json() if course["id"] not in self.completed_courses]
+        if not candidates:
+            await self.dashboard()
+            return
+        course_id = random.choice(candidates)
+        self.completed_courses.add(course_id)
+        response = await self.call(
+            "POST", "/api/courses/{course_id}/complete", f"/api/courses/{course_id}/complete",
+            params={"user_id": self.user_id}
+        )
+        await self.after_write(response.json()["completed_at"] if response else None)
+
+    async def dashboard(self):
+        await asyncio.gather(
+            self.call("GET", "/api/achievements", "/api/achievements"),
+            self.call("GET", "/api/courses", "/api/courses"),
+            self.call("GET", "/api/leaderboard", "/api/leaderboard"),
+            self.call("GET", "/api/achievements/{user_id}", f"/api/achievements/{self.user_id}"),
+            self.call("GET", "/api/users/{user_id}", f"/api/users/{self.user_id}"),
+        )
+
+    async def run(self, deadline, think_time, referral_code):
+        if await self.onboard(referral_code) is None:
+            return
+        scenarios = list(SCENARIO_WEIGHTS)
+        weights = list(SCENARIO_WEIGHTS.values())
+        while time.monotonic() < deadline:
+            await getattr(self, random.choices(scenarios, weights)[0])()
+            if think_time:
+                await asyncio.sleep(random.expovariate(1 / think_time))
+
+
+async def mongo_commands(client):
+    """{(collection, command): count} from the target's /metrics, or None if unavailable"""
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    counts = defaultdict(float)
+    for family in text_string_to_metric_families(response.text):
+        if family.name == "mongodb_commands":
+            for sample in family.samples:
+                if sample.name == "mongodb_commands_total":
+                    counts[(sample.labels["collection"], sample.labels["command"])] += sample.value
+    return counts
+
+
+def command_delta(before, after):
+    if before is None or after is None:
+        return None
+    delta = {
+        f"{collection}.{command}": int(count - before.get((collection, command), 0))
+        for (collection, command), count in after.items()
+    }
+    return dict(sorted(((key, count) for key, count in delta.items() if count), key=lambda item: -item[1]))
+
+
+def compare(result, baseline, tolerance):
+    """Regressions of result against baseline, as human-readable lines"""
+    regressions = []
+    if result["rps"] < baseline["rps"] * (1 - tolerance):
+        regressions.append(f"throughput {result['rps']} rps < baseline {baseline['rps']} rps")
+    for route, stats in result["routes"].items():
+        previous = baseline["routes"].get(route)
+        if previous and stats["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {stats['p95_ms']} ms > baseline {previous['p95_ms']} ms")
+    if result.get("mongo_commands_per_request") and baseline.get("mongo_commands_per_request"):
+        if result["mongo_commands_per_request"] > baseline["mongo_commands_per_request"] * (1 + tolerance):
+            regressions.append(
+                f"{result['mongo_commands_per_request']} Mongo commands per request > "
+                f"baseline {baseline['mongo_commands_per_request']}"
+            )
+    return regressions
+
+
+def print_report(result):
+    print(f"\n{result['requests']} requests in {result['elapsed_s']} s: {result['rps']} rps\n")
+    print(f"{'route':<52} {'reqs':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for route, stats in result["routes"].items():
+        print(
+            f"{route:<52} {stats['requests']:>7} {stats['rps']:>8} {stats['p50_ms']:>8} "
+            f"{stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats['errors']:>7}"
+        )
+    if result.get("mongo_commands"):
+        print(f"\nMongoDB commands ({result['mongo_commands_per_request']} per request)")
+        for key, count in result["mongo_commands"].items():
+            print(f"  {key:<50} {count:>8}")
+
+
+async def run(args):
+    if args.url:
+        host = urlparse(args.url).hostname
+        if host not in LOCAL_HOSTS and not args.allow_remote:
+            sys.exit(f"Refusing to load {host}; pass --allow-remote to target a non-local stack")
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=httpx.Limits(max_connections=args.users * 5))
+        server = None
+    else:
+        os.environ["DB_NAME"] = args.db_name
+        if not args.keep_rate_limits:
+            os.environ["RATE_LIMITS"] = "off"
+        sys.path.insert(0, str(BACKEND_DIR))
+        import server
+
+        await server.startup_event()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://loadtest", timeout=args.timeout)
+
+    try:
+        before = await mongo_commands(client)
+        recorder = Recorder()
+        referrer = await VirtualUser(client, recorder).onboard()
+        referral_code = referrer["referral_code"] if referrer else None
+
+        start = time.monotonic()
+        deadline = start + args.duration
+        await asyncio.gather(*(
+            VirtualUser(client, recorder).run(deadline, args.think_ms / 1000, referral_code if i % 10 == 0 else None)
+            for i in range(args.users)
+        ))
+        result = recorder.report(time.monotonic() - start)
+        result["users"] = args.users
+
+        commands = command_delta(before, await mongo_commands(client))
+        if commands is not None:
+            result["mongo_commands"] = commands
+            result["mongo_commands_per_request"] = round(sum(commands.values()) / max(result["requests"], 1), 2)
+    finally:
+        await client.aclose()
+        if server is not None:
+            await server.shutdown_db_client()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load after onboarding starts")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a user's scenarios")
+    parser.add_argument("--url", help="base URL of a local uvicorn; omit to run the app in-process")
+    parser.add_argument("--allow-remote", action="store_true", help="allow a --url that is not localhost")
+    parser.add_argument("--db-name", default="zen_loadtest", help="database for the in-process app")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="leave per-route rate limits on in-process")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", help="also write the result to this file")
+    parser.add_argument("--baseline", help="result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--save-baseline", help="write the result as the new baseline")
+    args = parser.parse_args()
+    if args.baseline and not Path(args.baseline).is_file():
+        parser.error(f"no baseline at {args.baseline}; record one on this machine with --save-baseline {args.baseline}")
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    for path in (args.json, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(result, indent=2) + "\n")
+
+    if args.baseline:
+        regressions = compare(result, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print(f"\nRegressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,17 @@
 #!/bin/sh
 set -e
 
-# Start the FastAPI backend
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
-echo "Starting FastAPI backend"
-# Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
-BACKEND_PID=$!
+# Prepares the database once, starts one uvicorn worker per core (WEB_CONCURRENCY
+# overrides) and starts nginx as soon as /api/readyz passes. SIGHUP reloads both
+# gracefully; if either dies, both stop.
 
-echo "Waiting for backend to start..."
-sleep 30
-
-if ! kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Backend failed to start at initialization, exiting"
-    exit 1
-fi
-
-# Start Nginx
-nginx -g 'daemon off;' &
-NGINX_PID=$!
-
-# Handle termination signals
-trap 'kill $BACKEND_PID $NGINX_PID; exit 0' SIGTERM SIGINT
-
-# Check if processes are still running
-while kill -0 $BACKEND_PID 2>/dev/null && kill -0 $NGINX_PID 2>/dev/null; do
-    sleep 1
-done
-
-# If we get here, one of the processes died
-if kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Nginx died, shutting down backend..."
-    kill $BACKEND_PID
-else
-    echo "Backend died, shutting down nginx..."
-    kill $NGINX_PID
+# More than one worker shares state through Redis; without REDIS_URL it is one
+if [ -z "$REDIS_URL" ]; then
+    echo "REDIS_URL is not set: running a single API worker" >&2
 fi
 
-exit 1
+# nginx appends the peer address to X-Forwarded-For, so the rate limiter can trust it
+export TRUST_FORWARDED_FOR="${TRUST_FORWARDED_FOR:-1}"
+exec python3 launcher.py -- nginx -g 'daemon off;'
@@ -324,6 +324,19 @@ const OasisCanvas = ({ oasisState, breathProgress, onElementGrown, selectedInten
   );
 };
 
+// Successful writes return an X-Causal-Token. Sending the newest one with later requests makes
+// reads served by a database secondary wait until they include this browser's own writes.
+let causalToken = null;
+
+const backendFetch = async (path, options = {}) => {
+  const headers = { ...(options.headers || {}) };
+  if (causalToken) headers['X-Causal-Token'] = causalToken;
+  const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}${path}`, { ...options, headers });
+  const token = response.headers.get('X-Causal-Token');
+  if (token) causalToken = token;
+  return response;
+};
+
 function App() {
   const [currentScreen, setCurrentScreen] = useState('welcome');
   const [selectedIntention, setSelectedIntention] = useState(null);
@@ -625,10 +638,23 @@ function App() {
   // Load Zen Coin system data
   const loadZenCoinData = async () => {
     try {
+      if (userProfile) {
+        // One round-trip for catalog, leaderboard and the user's achievements
+        const bootstrapRes = await backendFetch(`/api/bootstrap/${userProfile.id}`);
+        if (bootstrapRes.ok) {
+          const data = await bootstrapRes.json();
+          setAchievements(data.achievements);
+          setCourses(data.courses);
+          setLeaderboard(data.leaderboard);
+          setUserAchievements(data.user_achievements);
+          return;
+        }
+      }
+
       const [achievementsRes, coursesRes, leaderboardRes] = await Promise.all([
-        fetch(`${process.env.REACT_APP_BACKEND_URL}/api/achievements`),
-        fetch(`${process.env.REACT_APP_BACKEND_URL}/api/courses`),
-        fetch(`${process.env.REACT_APP_BACKEND_URL}/api/leaderboard`)
+        backendFetch(`/api/achievements`),
+        backendFetch(`/api/courses`),
+        backendFetch(`/api/leaderboard`)
       ]);
 
       if (achievementsRes.ok) setAchievements(await achievementsRes.json());
@@ -636,7 +662,7 @@ function App() {
       if (leaderboardRes.ok) setLeaderboard(await leaderboardRes.json());
 
       if (userProfile) {
-        const userAchievementsRes = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/achievements/${userProfile.id}`);
+        const userAchievementsRes = await backendFetch(`/api/achievements/${userProfile.id}`);
         if (userAchievementsRes.ok) setUserAchievements(await userAchievementsRes.json());
       }
     } catch (error) {
@@ -647,16 +673,18 @@ function App() {
   // Submit mood diary entry
   const submitMoodDiary = async (moodData) => {
     try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/mood-diary`, {
+      const response = await backendFetch(`/api/mood-diary`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(moodData)
       });
       
       if (response.ok) {
+        const entry = await response.json();
         // Refresh user profile to get updated Zen Coins
         await refreshUserProfile();
         setShowMoodDiary(false);
+        pollUnlockedAchievements(entry.created_at);
       }
     } catch (error) {
       console.error('Failed to submit mood diary:', error);
@@ -666,24 +694,57 @@ function App() {
   // Complete course
   const completeCourse = async (courseId, userId) => {
     try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/courses/${courseId}/complete?user_id=${userId}`, {
+      const response = await backendFetch(`/api/courses/${courseId}/complete?user_id=${userId}`, {
         method: 'POST'
       });
       
       if (response.ok) {
+        const completion = await response.json();
         await refreshUserProfile();
         setShowCourses(false);
+        pollUnlockedAchievements(completion.completed_at);
       }
     } catch (error) {
       console.error('Failed to complete course:', error);
     }
   };
 
+  // Achievements are evaluated in the background after a write; poll for the unlocks it produced.
+  // since is a server timestamp from the write's response, so client clock skew cannot hide unlocks.
+  // Each poll resumes from the newest unlock seen (since is inclusive), and unlocks already shown are skipped.
+  const pollUnlockedAchievements = async (since, attempts = 5) => {
+    if (!userProfile || !since) return;
+    const shown = new Set();
+    let cursor = since;
+    try {
+      for (let attempt = 0; attempt < attempts; attempt++) {
+        const response = await backendFetch(
+          `/api/achievements/${userProfile.id}/unlocked-since?since=${encodeURIComponent(cursor)}`
+        );
+        if (!response.ok) return;
+        const data = await response.json();
+        const fresh = data.unlocked.filter(unlock => !shown.has(`${unlock.id}@${unlock.unlocked_at}`));
+        fresh.forEach(unlock => shown.add(`${unlock.id}@${unlock.unlocked_at}`));
+        if (data.unlocked.length > 0) {
+          cursor = data.unlocked[data.unlocked.length - 1].unlocked_at;
+        }
+        if (fresh.length > 0) {
+          setAchievementNotification(fresh[fresh.length - 1]);
+          await refreshUserProfile();
+        }
+        if (!data.pending) return;
+        await new Promise(resolve => setTimeout(resolve, 500));
+      }
+    } catch (error) {
+      console.error('Failed to check unlocked achievements:', error);
+    }
+  };
+
   // Refresh user profile
   const refreshUserProfile = async () => {
     if (userProfile) {
       try {
-        const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/users/${userProfile.id}`);
+        const response = await backendFetch(`/api/users/${userProfile.id}`);
         if (response.ok) {
           const updatedProfile = await response.json();
           setUserProfile(updatedProfile);
@@ -699,7 +760,7 @@ function App() {
     if (!userProfile) return;
     
     try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/breathing-sessions`, {
+      const response = await backendFetch(`/api/breathing-sessions`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -709,7 +770,9 @@ function App() {
       });
       
       if (response.ok) {
+        const session = await response.json();
         await refreshUserProfile();
+        pollUnlockedAchievements(session.completed_at);
       }
     } catch (error) {
       console.error('Failed to record breathing session:', error);
@@ -739,7 +802,7 @@ function App() {
     const savedUserId = localStorage.getItem('zenUserId');
     if (savedUserId) {
       try {
-        const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/users/${savedUserId}`);
+        const response = await backendFetch(`/api/users/${savedUserId}`);
         if (response.ok) {
           const profile = await response.json();
           setUserProfile(profile);
@@ -753,7 +816,7 @@ function App() {
     // Create new user profile
     const username = `ZenUser${Date.now()}`;
     try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/users`, {
+      const response = await backendFetch(`/api/users`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ username })
@@ -0,0 +1,363 @@
+"""Bulk-generate a deterministic, production-sized dataset into a local mongod.
+
+    python scripts/generate_dataset.py --users 2000000 --seed 7 [--db-name zen_synthetic] [--drop]
+
+Writes user_profiles with referral chains, and for each user a heavy-tailed
+number of breathing_sessions, mood_diary_entries, course_completions and the
+zen_coin_transactions those writes produce, shaped like the documents server.py
+stores. Profiles are consistent with their history: counters, streak, course
+bitset, unlocked achievements (with their reward transactions) and a Zen Coin
+balance equal to the sum of the user's transactions. The Oasis rollups are
+rebuilt and the app's indexes created once the data is loaded.
+
+Users are generated in chunks by --workers processes, each inserting with
+insert_many. Every user's documents come from a generator seeded by --seed and
+the user's index, and timestamps are relative to --end, so the same arguments
+produce the same data regardless of worker count.
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from urllib.parse import urlparse
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from achievement_engine import AchievementEngine  # noqa: E402
+from course_graph import CourseGraph, int_to_bits  # noqa: E402
+
+# Collections this script fills; the achievement and course catalogs are left in place
+GENERATED = ["user_profiles", "breathing_sessions", "mood_diary_entries", "zen_coin_transactions", "course_completions"]
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+INTENTIONS = ["calm", "focus", "sleep", "energy", "gratitude", "release"]
+PATTERNS = ["Just Breathe", "Box Breathing", "4-7-8 Relaxation", "Coherent Breathing", "Energizing Breath"]
+# Mood values with how often they are logged
+MOODS = {"calm": 5, "peaceful": 4, "happy": 4, "neutral": 3, "very_happy": 2, "stressed": 2, "anxious": 2, "sad": 1}
+SESSION_REWARD = 10
+MOOD_REWARD = 5
+REFERRAL_REWARD = 50
+
+
+def user_id(seed: int, index: int) -> str:
+    return str(uuid.UUID(bytes=hashlib.blake2b(f"{seed}:user:{index}".encode(), digest_size=16).digest(), version=4))
+
+
+def referral_code(seed: int, index: int) -> str:
+    """12 hex digits like the app's codes, unique per index (an odd multiplier and xor are bijective mod 2**48)"""
+    key = int.from_bytes(hashlib.blake2b(f"{seed}:codes".encode(), digest_size=6).digest(), "big")
+    return f"{((index * 0x9E3779B97F4B) ^ key) & 0xFFFFFFFFFFFF:012x}"
+
+
+def pick_referrers(seed: int, users: int, rate: float) -> array:
+    """Referrer index per user, or -1; early users are picked far more often, which builds chains"""
+    rng = random.Random(f"{seed}:referrals")
+    referrers = array("l", [-1]) * users
+    for index in range(1, users):
+        if rng.random() < rate:
+            referrers[index] = int(index * rng.random() ** 3)
+    return referrers
+
+
+def heavy_tail(rng: random.Random, scale: float, cap: int) -> int:
+    """Most users have a few rows, a small minority thousands"""
+    return min(cap, int(scale * (rng.paretovariate(1.2) - 1)))
+
+
+def _doc_id(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _transaction(rng, user, amount, kind, description, metadata, at):
+    return {
+        "id": _doc_id(rng), "user_id": user, "amount": amount, "transaction_type": kind,
+        "description": description, "metadata": metadata, "timestamp": at,
+    }
+
+
+def streak(days) -> int:
+    """Consecutive practice days ending on the last one (days ascending, unique)"""
+    count = 1
+    for previous, current in zip(reversed(days[:-1]), reversed(days)):
+        if (current - previous).days != 1:
+            break
+        count += 1
+    return count
+
+
+class Generator:
+    """Builds every document for one user from (seed, index)"""
+
+    def __init__(self, seed, users, end, days, session_scale, mood_scale, max_history, courses, achievements):
+        self.seed = seed
+        self.users = users
+        self.end = end
+        self.start = end - timedelta(days=days)
+        self.span = (end - self.start).total_seconds()
+        self.session_scale = session_scale
+        self.mood_scale = mood_scale
+        self.max_history = max_history
+        self.graph = CourseGraph(courses)
+        self.engine = AchievementEngine(achievements)
+        self.moods = list(MOODS)
+        self.mood_weights = list(MOODS.values())
+
+    def _times(self, rng, since, count):
+        window = max((self.end - since).total_seconds(), 1)
+        return sorted(since + timedelta(seconds=rng.random() * window) for _ in range(count))
+
+    def user(self, index: int, referrer: int, referrals: int):
+        rng = random.Random(f"{self.seed}:{index}")
+        uid = user_id(self.seed, index)
+        username = f"zen_{index:08d}"
+        # Later indexes sign up later, so every referrer joined before the users they referred
+        created_at = self.start + timedelta(seconds=self.span * 0.9 * (index + rng.random()) / self.users)
+        docs = {name: [] for name in GENERATED}
+        transactions = docs["zen_coin_transactions"]
+        coins = REFERRAL_REWARD * referrals
+
+        sessions = []
+        for at in self._times(rng, created_at, heavy_tail(rng, self.session_scale, self.max_history)):
+            pattern = rng.choice(PATTERNS)
+            cycles = rng.randint(3, 20)
+            session = {
+                "id": _doc_id(rng), "user_id": uid, "intention": rng.choice(INTENTIONS), "pattern_name": pattern,
+                "cycles_completed": cycles, "duration_seconds": cycles * rng.randint(8, 19),
+                "zen_coins_earned": SESSION_REWARD, "completed_at": at,
+            }
+            sessions.append(session)
+            transactions.append(_transaction(
+                rng, uid, SESSION_REWARD, "daily_practice", f"Daily practice: {pattern}", {"session_id": session["id"]}, at
+            ))
+        docs["breathing_sessions"] = sessions
+        coins += SESSION_REWARD * len(sessions)
+
+        for at in self._times(rng, created_at, heavy_tail(rng, self.mood_scale, self.max_history)):
+            mood = rng.choices(self.moods, self.mood_weights)[0]
+            entry = {
+                "id": _doc_id(rng), "user_id": uid, "mood": mood,
+                "notes": rng.choice([None, None, "Feeling lighter after practice", "Busy day"]),
+                "breathing_session_id": rng.choice(sessions)["id"] if sessions and rng.random() < 0.3 else None,
+                "zen_coins_earned": MOOD_REWARD, "created_at": at,
+            }
+            docs["mood_diary_entries"].append(entry)
+            transactions.append(_transaction(
+                rng, uid, MOOD_REWARD, "mood_diary", f"Mood reflection: {mood}", {"mood_entry_id": entry["id"]}, at
+            ))
+        coins += MOOD_REWARD * len(docs["mood_diary_entries"])
+
+        # Courses in prerequisite order, more of them for users who practice more
+        wanted = int(rng.random() * (1 + math.log2(1 + len(sessions))))
+        completed_bits = 0
+        completed_times = self._times(rng, created_at, wanted)
+        for slug in self.graph.order:
+            if not completed_times:
+                break
+            course = self.graph.by_slug[slug]
+            if course["id"] not in self.graph.bit_by_id or not self.graph.is_available(course["id"], completed_bits):
+                continue
+            at = completed_times.pop(0)
+            completed_bits |= 1 << self.graph.bit_by_id[course["id"]]
+            docs["course_completions"].append({
+                "id": _doc_id(rng), "user_id": uid, "course_id": course["id"], "completed_at": at,
+                "zen_coins_earned": course["zen_coin_reward"],
+            })
+            transactions.append(_transaction(
+                rng, uid, course["zen_coin_reward"], "course_completion", f"Course completed: {course['name']}",
+                {"course_id": course["id"]}, at
+            ))
+            coins += course["zen_coin_reward"]
+
+        if referrer >= 0:
+            transactions.append(_transaction(
+                rng, user_id(self.seed, referrer), REFERRAL_REWARD, "friend_referral",
+                f"Friend referral: {username} joined", {"referred_user_id": uid}, created_at
+            ))
+
+        practice_days = sorted({session["completed_at"].date() for session in sessions})
+        last_activity = max([created_at] + [txn["timestamp"] for txn in transactions if txn["user_id"] == uid])
+        profile = {
+            "id": uid,
+            "username": username,
+            "email": f"{username}@example.com" if rng.random() < 0.6 else None,
+            "zen_coins": coins,
+            "total_sessions": len(sessions),
+            "consecutive_days": streak(practice_days) if practice_days else 0,
+            "last_practice_date": datetime.combine(practice_days[-1], datetime.min.time()) if practice_days else None,
+            "achievements": [],
+            "courses_completed": len(docs["course_completions"]),
+            "mood_entries": len(docs["mood_diary_entries"]),
+            "referrals": referrals,
+            "achievement_marks": {},
+            "course_bits": int_to_bits(completed_bits),
+            "referral_code": referral_code(self.seed, index),
+            "referred_by": referral_code(self.seed, referrer) if referrer >= 0 else None,
+            "created_at": created_at,
+            "updated_at": last_activity,
+        }
+
+        # Unlock what the counters earn, as the achievement engine would have
+        today = self.end.date()
+        for rule in self.engine.evaluate(profile, today):
+            if rule.id not in profile["achievements"]:
+                profile["achievements"].append(rule.id)
+            if rule.repeatable:
+                profile["achievement_marks"][rule.id] = rule.progress(profile, today)
+            profile["zen_coins"] += rule.reward
+            transactions.append(_transaction(
+                rng, uid, rule.reward, rule.achievement["achievement_type"],
+                f"Achievement unlocked: {rule.achievement['name']}", {"achievement_id": rule.id}, last_activity
+            ))
+        docs["user_profiles"].append(profile)
+        return docs
+
+
+_worker = {}
+
+
+def _init_worker(mongo_url, db_name, options):
+    from pymongo import MongoClient
+
+    _worker["db"] = MongoClient(mongo_url)[db_name]
+    _worker["generator"] = Generator(**options)
+
+
+def generate_chunk(first: int, referrers, referrals):
+    """Generate and insert users first..first+len(referrers); returns documents written per collection"""
+    generator = _worker["generator"]
+    chunk = {name: [] for name in GENERATED}
+    for offset, (referrer, count) in enumerate(zip(referrers, referrals)):
+        for name, docs in generator.user(first + offset, referrer, count).items():
+            chunk[name].extend(docs)
+    for name, docs in chunk.items():
+        if docs:
+            _worker["db"][name].insert_many(docs, ordered=False)
+    return {name: len(docs) for name, docs in chunk.items()}
+
+
+def check_models(generator: Generator):
+    """Validate a sample user's documents against the server.py models"""
+    import server
+
+    models = {
+        "user_profiles": server.UserProfile,
+        "breathing_sessions": server.BreathingSession,
+        "mood_diary_entries": server.MoodDiaryEntry,
+        "zen_coin_transactions": server.ZenCoinTransaction,
+        "course_completions": server.CourseCompletion,
+    }
+    for index in range(min(generator.users, 50)):
+        for name, docs in generator.user(index, index - 1, 1).items():
+            for doc in docs:
+                models[name](**doc)
+
+
+async def prepare(args):
+    """Seed the catalog through server.py, optionally drop old data; returns (courses, achievements)"""
+    import server
+
+    db = server.db
+    existing = await db.user_profiles.estimated_document_count()
+    if existing and not args.drop:
+        sys.exit(f"{args.db_name}.user_profiles already holds {existing} documents; pass --drop to replace them")
+    for name in GENERATED + ["oasis_stats", "oasis_active_users"]:
+        await db.drop_collection(name)
+    await server.initialize_default_data()
+    courses = await db.courses.find({"is_active": True}, {"_id": 0}).to_list(None)
+    achievements = await db.achievements.find({}, {"_id": 0}).to_list(None)
+    server.client.close()
+    return courses, achievements
+
+
+async def finish(args):
+    """Create the app's indexes and rebuild the Oasis rollups over the new data"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    import rollups
+    from indexes import ensure_indexes
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[args.db_name]
+    await ensure_indexes(db)
+    await rollups.backfill(db)
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="zen_synthetic")
+    parser.add_argument("--drop", action="store_true", help="replace data generated earlier in this database")
+    parser.add_argument("--allow-remote", action="store_true", help="allow a --mongo-url that is not localhost")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--chunk", type=int, default=2000, help="users per insert batch")
+    parser.add_argument("--end", type=date.fromisoformat, default=date(2025, 6, 1), help="latest activity date")
+    parser.add_argument("--days", type=int, default=365, help="days of history before --end")
+    parser.add_argument("--referral-rate", type=float, default=0.3, help="share of users who joined by referral")
+    parser.add_argument("--session-scale", type=float, default=4, help="sessions per user scale (mean is 5x)")
+    parser.add_argument("--mood-scale", type=float, default=1.5, help="mood entries per user scale (mean is 5x)")
+    parser.add_argument("--max-history", type=int, default=20000, help="cap on sessions or mood entries per user")
+    args = parser.parse_args()
+
+    host = urlparse(args.mongo_url).hostname
+    if host not in LOCAL_HOSTS and not args.allow_remote:
+        sys.exit(f"Refusing to write to {host}; pass --allow-remote to target a non-local mongod")
+
+    # server.py connects with these when imported
+    os.environ["MONGO_URL"] = args.mongo_url
+    os.environ["DB_NAME"] = args.db_name
+    courses, achievements = asyncio.run(prepare(args))
+
+    options = dict(
+        seed=args.seed, users=args.users, end=datetime.combine(args.end, datetime.min.time()), days=args.days,
+        session_scale=args.session_scale, mood_scale=args.mood_scale, max_history=args.max_history,
+        courses=courses, achievements=achievements,
+    )
+    check_models(Generator(**options))
+
+    referrers = pick_referrers(args.seed, args.users, args.referral_rate)
+    referrals = array("l", [0]) * args.users
+    for referrer in referrers:
+        if referrer >= 0:
+            referrals[referrer] += 1
+
+    started = time.monotonic()
+    totals = {name: 0 for name in GENERATED}
+    # Spawned rather than forked: the parent has already run Motor's executor threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        args.workers, mp_context=context, initializer=_init_worker, initargs=(args.mongo_url, args.db_name, options)
+    ) as pool:
+        futures = [
+            pool.submit(generate_chunk, first, referrers[first:first + args.chunk], referrals[first:first + args.chunk])
+            for first in range(0, args.users, args.chunk)
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            for name, count in future.result().items():
+                totals[name] += count
+            if done % 10 == 0 or done == len(futures):
+                print(f"{min(done * args.chunk, args.users)}/{args.users} users, {sum(totals.values())} documents, "
+                      f"{time.monotonic() - started:.0f} s", flush=True)
+
+    print("Creating indexes and rebuilding Oasis rollups")
+    asyncio.run(finish(args))
+    for name, count in totals.items():
+        print(f"  {name:<24} {count:>12}")
+    print(f"Done in {time.monotonic() - started:.0f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+# server.py and its sibling modules are imported as top-level modules (uvicorn runs from backend/)
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """server.py on a fresh mongomock database with the default catalog loaded
+
+    Rate limits are off, and the ledger and achievement queue are not started,
+    so ledger writes and achievement evaluation happen inline in the request.
+    """
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    # Read when server.py is imported
+    os.environ.setdefault("RATE_LIMITS", "off")
+    import server
+    from leaderboard import InMemoryLeaderboard
+    from repository import Repositories
+
+    db = mongomock_motor.AsyncMongoMockClient()[f"zen_test_{uuid.uuid4().hex[:8]}"]
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "repos", Repositories(db))
+    monkeypatch.setattr(server, "leaderboard", InMemoryLeaderboard())
+    monkeypatch.setattr(server.catalog, "db", db)
+    monkeypatch.setattr(server.catalog, "read_db", db)
+    monkeypatch.setattr(server.ledger, "db", db)
+    monkeypatch.setattr(server.idempotency_store, "db", db)
+
+    async def prepare():
+        await server.initialize_default_data()
+        await server.catalog.refresh()
+
+    asyncio.run(prepare())
+    return server
+
+
+@pytest.fixture
+def client(server):
+    """Factory of httpx clients calling the server fixture's app in-process"""
+    httpx = pytest.importorskip("httpx")
+
+    def make():
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test")
+
+    return make
@@ -0,0 +1,87 @@
+from datetime import date, datetime
+
+from achievement_engine import AchievementEngine
+
+TODAY = date(2025, 6, 5)
+
+CATALOG = [
+    {"id": "first", "name": "First Steps", "achievement_type": "daily_practice", "zen_coin_reward": 10,
+     "requirements": {"sessions": 1}, "is_repeatable": False},
+    {"id": "daily", "name": "Daily Zen", "achievement_type": "daily_practice", "zen_coin_reward": 10,
+     "requirements": {"daily": True}, "is_repeatable": True},
+    {"id": "week", "name": "Week Warrior", "achievement_type": "consecutive_days", "zen_coin_reward": 50,
+     "requirements": {"consecutive_days": 7}, "is_repeatable": False},
+    {"id": "invite", "name": "Community Builder", "achievement_type": "friend_referral", "zen_coin_reward": 50,
+     "requirements": {"referrals": 1}, "is_repeatable": True},
+    {"id": "support", "name": "Zen Supporter", "achievement_type": "paid_subscription", "zen_coin_reward": 200,
+     "requirements": {"subscription": True}, "is_repeatable": False},
+]
+
+
+def unlocked_ids(profile):
+    return [rule.id for rule in AchievementEngine(CATALOG).evaluate(profile, TODAY)]
+
+
+def test_unevaluable_requirements_are_not_compiled():
+    assert [rule.id for rule in AchievementEngine(CATALOG).rules] == ["first", "daily", "week", "invite"]
+
+
+def test_thresholds_are_checked_against_counters():
+    profile = {"total_sessions": 1, "consecutive_days": 6,
+               "last_practice_date": datetime(2025, 6, 5)}
+    assert unlocked_ids(profile) == ["first", "daily"]
+    assert unlocked_ids({**profile, "consecutive_days": 7}) == ["first", "daily", "week"]
+
+
+def test_non_repeatable_achievement_is_awarded_once():
+    assert unlocked_ids({"total_sessions": 5, "achievements": ["first"]}) == []
+
+
+def test_repeatable_achievement_fires_once_per_counter_increase():
+    engine = AchievementEngine(CATALOG)
+    profile = {"referrals": 1}
+    rules = engine.evaluate(profile, TODAY)
+    assert [rule.id for rule in rules] == ["invite"]
+
+    guard, update = engine.unlock_update(rules, profile, TODAY)
+    assert update["$set"]["achievement_marks.invite"] == 1
+    assert guard == {"achievement_marks.invite": {"$not": {"$gte": 1}}}
+
+    awarded = {**profile, "achievements": ["invite"], "achievement_marks": {"invite": 1}}
+    assert engine.evaluate(awarded, TODAY) == []
+    assert [rule.id for rule in engine.evaluate({**awarded, "referrals": 2}, TODAY)] == ["invite"]
+
+
+def test_repeatable_achievement_pays_every_increase_since_its_mark():
+    engine = AchievementEngine(CATALOG)
+    # Three referrals landed before one coalesced evaluation
+    profile = {"referrals": 4, "achievements": ["invite"], "achievement_marks": {"invite": 1}}
+    rules = engine.evaluate(profile, TODAY)
+    assert [rule.id for rule in rules] == ["invite"] * 3
+
+    guard, update = engine.unlock_update(rules, profile, TODAY)
+    assert guard == {"achievement_marks.invite": {"$not": {"$gte": 4}}}
+    assert update["$set"]["achievement_marks.invite"] == 4
+    assert update["$addToSet"] == {"achievements": {"$each": ["invite"]}}
+    assert update["$inc"] == {"zen_coins": 150}
+
+
+def test_daily_achievement_fires_once_per_practice_day():
+    profile = {"last_practice_date": datetime(2025, 6, 5), "achievement_marks": {"daily": TODAY.toordinal()}}
+    assert unlocked_ids(profile) == []
+    assert unlocked_ids({**profile, "last_practice_date": datetime(2025, 6, 4)}) == []
+
+
+def test_unlock_update_is_a_single_guarded_write():
+    engine = AchievementEngine(CATALOG)
+    profile = {"total_sessions": 1, "consecutive_days": 7}
+    guard, update = engine.unlock_update(engine.evaluate(profile, TODAY), profile, TODAY)
+    assert guard == {"achievements": {"$nin": ["first", "week"]}}
+    assert update["$addToSet"] == {"achievements": {"$each": ["first", "week"]}}
+    assert update["$inc"] == {"zen_coins": 60}
+
+
+def test_baseline_marks_cover_held_repeatables():
+    engine = AchievementEngine(CATALOG)
+    profile = {"achievements": ["invite", "first"], "referrals": 3}
+    assert engine.baseline_marks(profile, TODAY) == {"invite": 3}
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from achievement_queue import AchievementQueue, RedisPending
+
+
+def test_burst_for_one_user_is_coalesced():
+    async def scenario():
+        calls = []
+        gate = asyncio.Event()
+
+        async def evaluate(user_id):
+            await gate.wait()
+            calls.append(user_id)
+
+        queue = AchievementQueue(evaluate, workers=1)
+        queue.start()
+        await queue.enqueue("u1")
+        await asyncio.sleep(0)  # the worker picks u1 up and blocks on the gate
+        for _ in range(5):
+            await queue.enqueue("u1")
+        await queue.enqueue("u2")
+        assert await queue.is_pending("u1") and await queue.is_pending("u2")
+        gate.set()
+        await queue.close()
+
+        # One running evaluation plus one follow-up covering the whole burst
+        assert calls == ["u1", "u1", "u2"]
+        assert queue.stats()["coalesced"] == 4
+        assert not await queue.is_pending("u1")
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_evaluates_inline():
+    async def scenario():
+        calls = []
+
+        async def evaluate(user_id):
+            calls.append(user_id)
+
+        queue = AchievementQueue(evaluate, workers=1, maxsize=1)
+        queue.start()
+        await queue.enqueue("u1")
+        await queue.enqueue("u2")  # queue full: evaluated by the caller
+        assert calls == ["u2"]
+        await queue.close()
+        assert calls == ["u2", "u1"]
+        assert queue.stats()["overflowed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_failures_are_counted_and_do_not_stop_the_workers():
+    async def scenario():
+        async def evaluate(user_id):
+            if user_id == "bad":
+                raise RuntimeError("boom")
+
+        queue = AchievementQueue(evaluate, workers=2)
+        queue.start()
+        for user_id in ("bad", "u1", "u2"):
+            await queue.enqueue(user_id)
+        await queue.close()
+        stats = queue.stats()
+        assert (stats["failed"], stats["processed"]) == (1, 2)
+
+    asyncio.run(scenario())
+
+
+def test_not_started_runs_inline():
+    async def scenario():
+        calls = []
+
+        async def evaluate(user_id):
+            calls.append(user_id)
+
+        await AchievementQueue(evaluate).enqueue("u1")
+        assert calls == ["u1"]
+
+    asyncio.run(scenario())
+
+
+def test_pending_is_shared_between_workers_through_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr("redis.asyncio.from_url", lambda url: fakeredis.FakeAsyncRedis(server=server))
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def evaluate(user_id):
+            await gate.wait()
+
+        # Two processes' queues: one evaluates, the other answers the poll
+        worker = AchievementQueue(evaluate, workers=1, pending=RedisPending("redis://fake"))
+        other = AchievementQueue(evaluate, pending=RedisPending("redis://fake"))
+        worker.start()
+        await worker.enqueue("u1")
+        await asyncio.sleep(0)
+        await worker.enqueue("u1")  # queued again behind the running evaluation
+        assert await other.is_pending("u1")
+        assert int(await other.pending.redis.get("zen:achievements:pending:u1")) == 2
+
+        gate.set()
+        await worker.close()
+        assert not await other.is_pending("u1")
+
+        # A count that expired mid-evaluation is not left behind at -1
+        await other.pending.done("u1")
+        assert await other.pending.redis.keys("*") == []
+
+    asyncio.run(scenario())
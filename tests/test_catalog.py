@@ -0,0 +1,129 @@
+import asyncio
+
+from pymongo.errors import OperationFailure
+
+from catalog import CatalogCache
+
+
+class Model:
+    def __init__(self, id, is_active=True, valid=True):
+        if not valid:
+            raise ValueError("rejected by the model")
+        self.id = id
+        self.is_active = is_active
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return [dict(doc) for doc in self.docs]
+
+
+class Collection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection, session, max_time_ms):
+        return Cursor(self.docs)
+
+
+class Meta:
+    def __init__(self):
+        self.version = 1
+
+    async def find_one(self, query, session, max_time_ms):
+        return {"_id": "catalog", "version": self.version}
+
+
+class Stream:
+    def __init__(self, changes):
+        self.changes = changes
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for change in self.changes:
+            yield await change()
+
+
+class FakeDb:
+    def __init__(self, changes=None):
+        self.achievements = Collection([{"id": "a1"}])
+        self.courses = Collection([])
+        self.catalog_meta = Meta()
+        self.changes = changes
+
+    def watch(self, pipeline):
+        if self.changes is None:
+            raise OperationFailure("The $changeStream stage is only supported on replica sets")
+        return Stream(self.changes)
+
+
+def cache_for(db):
+    return CatalogCache(db, Model, Model, {}, poll_interval=0.01)
+
+
+def test_failed_reload_from_change_stream_keeps_following_it():
+    async def scenario():
+        seen = asyncio.Event()
+
+        async def bad_document():
+            db.achievements.docs = [{"id": "a2", "valid": False}]
+            return {}
+
+        async def fixed():
+            db.achievements.docs = [{"id": "a3"}]
+            return {}
+
+        async def idle():
+            seen.set()
+            await asyncio.Event().wait()
+
+        db = FakeDb([bad_document, fixed, idle])
+        cache = cache_for(db)
+        await cache.refresh()
+        cache.start()
+        await asyncio.wait_for(seen.wait(), 1)
+        assert [achievement.id for achievement in cache.achievements] == ["a3"]
+        assert not cache._task.done()
+        await cache.stop()
+
+    asyncio.run(scenario())
+
+
+def test_polling_survives_failed_reloads_and_listeners():
+    async def scenario():
+        db = FakeDb()
+        cache = cache_for(db)
+        calls = []
+
+        def listener(cache):
+            calls.append(cache.version)
+            if len(calls) == 2:
+                raise RuntimeError("listener failed")
+
+        cache.on_refresh(listener)
+        await cache.refresh()
+        cache.start()
+
+        db.achievements.docs = [{"id": "bad", "valid": False}]
+        db.catalog_meta.version = 2
+        await asyncio.sleep(0.05)
+        assert cache.version == 1 and not cache._task.done()
+
+        db.achievements.docs = [{"id": "a2"}]
+        await asyncio.sleep(0.05)
+        # The listener failed on version 2, and the next poll did not reload it again
+        assert calls == [1, 2] and cache.version == 2
+        db.catalog_meta.version = 3
+        await asyncio.sleep(0.05)
+        assert calls == [1, 2, 3] and not cache._task.done()
+        await cache.stop()
+
+    asyncio.run(scenario())
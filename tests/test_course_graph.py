@@ -0,0 +1,60 @@
+from course_graph import CourseGraph, bit_update, bits_to_int, course_slug, int_to_bits
+
+CATALOG = [
+    {"id": "c1", "name": "Mindful Beginnings", "prerequisites": [], "completion_bit": 0},
+    {"id": "c2", "name": "Focus Foundation", "prerequisites": [], "completion_bit": 1},
+    {"id": "c3", "name": "Calm Mastery", "prerequisites": ["mindful-beginnings"], "completion_bit": 2},
+    {"id": "c5", "name": "Anxiety Transformation", "prerequisites": ["calm-mastery", "focus-foundation"],
+     "completion_bit": 4},
+]
+
+
+def available(graph, course_ids):
+    completed = graph.completed_bits(course_ids)
+    return [course_id for course_id in graph.required if graph.is_available(course_id, completed)]
+
+
+def test_prerequisites_are_ordered_before_dependents():
+    graph = CourseGraph(CATALOG)
+    order = graph.order
+    assert graph.cycle == []
+    assert order.index("mindful-beginnings") < order.index("calm-mastery") < order.index("anxiety-transformation")
+    assert order.index("focus-foundation") < order.index("anxiety-transformation")
+
+
+def test_availability_is_a_mask_test():
+    graph = CourseGraph(CATALOG)
+    assert sorted(available(graph, [])) == ["c1", "c2"]
+    assert sorted(available(graph, ["c1"])) == ["c1", "c2", "c3"]
+    assert sorted(available(graph, ["c1", "c2", "c3"])) == ["c1", "c2", "c3", "c5"]
+
+
+def test_frozen_slug_survives_a_rename():
+    renamed = [{**CATALOG[0], "name": "Mindful Starts", "slug": "mindful-beginnings"}] + CATALOG[1:]
+    assert "c3" in available(CourseGraph(renamed), ["c1"])
+
+
+def test_cycles_and_unknown_prerequisites_are_never_available():
+    courses = CATALOG + [
+        {"id": "x", "name": "X", "prerequisites": ["y"], "completion_bit": 5},
+        {"id": "y", "name": "Y", "prerequisites": ["x"], "completion_bit": 6},
+        {"id": "z", "name": "Z", "prerequisites": ["x"], "completion_bit": 7},
+        {"id": "ghost", "name": "Ghost", "prerequisites": ["missing-course"], "completion_bit": 8},
+    ]
+    graph = CourseGraph(courses)
+    assert sorted(graph.cycle) == ["x", "y", "z"]
+    everything = graph.completed_bits(course["id"] for course in courses)
+    assert not any(graph.is_available(course_id, everything) for course_id in ("x", "y", "z", "ghost"))
+
+
+def test_bitset_words_round_trip():
+    value = (1 << 0) | (1 << 62) | (1 << 63) | (1 << 200)
+    words = int_to_bits(value)
+    assert all(0 <= word < 1 << 63 for word in words.values())
+    assert bits_to_int(words) == value
+    assert bits_to_int(None) == 0
+    assert bit_update(64) == {"course_bits.1": {"or": 2}}
+
+
+def test_course_slug():
+    assert course_slug("Deep Sleep Wisdom") == "deep-sleep-wisdom"
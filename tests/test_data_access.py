@@ -0,0 +1,191 @@
+"""Data-access settings and causal tokens; the read-your-writes test needs a local
+replica set (TEST_REPLICA_SET_URL) and is skipped when none is reachable."""
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson import Timestamp
+from pymongo.errors import PyMongoError
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+from data_access import (
+    CausalConsistencyMiddleware, MongoSettings, OperationTimeTracker, QueryBudgets, causal_session,
+    _read_after, decode_causal_token, encode_causal_token,
+)
+
+REPLICA_SET_URL = os.environ.get("TEST_REPLICA_SET_URL", "mongodb://localhost:27017/?replicaSet=rs0")
+
+CLUSTER_TIME = {"clusterTime": Timestamp(1700000000, 7), "signature": {"hash": b"\0" * 20, "keyId": 0}}
+KEY = b"test-key"
+
+
+def reply(command_name, operation_time):
+    return SimpleNamespace(
+        command_name=command_name,
+        reply={"ok": 1, "operationTime": operation_time, "$clusterTime": CLUSTER_TIME},
+    )
+
+
+async def call(app, method, token=None):
+    headers = [(b"x-causal-token", token.encode())] if token else []
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await app({"type": "http", "method": method, "path": "/api/mood-diary", "headers": headers}, None, send)
+    return dict(sent[0]["headers"])
+
+
+def ok_app(handler=None):
+    async def app(scope, receive, send):
+        if handler is not None:
+            await handler()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    return app
+
+
+def test_settings_build_client_options_and_read_preference():
+    settings = MongoSettings(max_pool_size=50, wait_queue_timeout_ms=0, max_staleness_seconds=120)
+    options = settings.client_options()
+    assert options["maxPoolSize"] == 50
+    assert options["waitQueueTimeoutMS"] is None
+    assert settings.read_preference() == SecondaryPreferred(max_staleness=120)
+    assert MongoSettings(secondary_reads=False).read_preference() == Primary()
+
+    with pytest.raises(ValueError):
+        MongoSettings(max_staleness_seconds=30)
+
+
+def test_zero_budget_is_unbounded():
+    budgets = QueryBudgets(lookup_ms=0, batch_ms=500)
+    assert budgets.lookup is None
+    assert budgets.batch == 500
+
+
+def test_causal_token_round_trip():
+    token = encode_causal_token(Timestamp(1700000000, 3), CLUSTER_TIME, KEY)
+    assert decode_causal_token(token, KEY) == {"operationTime": Timestamp(1700000000, 3), "$clusterTime": CLUSTER_TIME}
+    payload, signature = token.split(".")
+    forged = encode_causal_token(Timestamp(1800000000, 1), {**CLUSTER_TIME, "clusterTime": Timestamp(1800000000, 1)}, b"other")
+    for bad in [
+        "", "not-a-token", payload,
+        encode_causal_token(Timestamp(1, 1), {"clusterTime": 5}, KEY),
+        # Operation time past the cluster time it came with
+        encode_causal_token(Timestamp(1700000000, 8), CLUSTER_TIME, KEY),
+        encode_causal_token(Timestamp(1, 1), {**CLUSTER_TIME, "signature": "x"}, KEY),
+        # Not signed with the server's key, or altered after signing
+        forged, f"{forged.split('.')[0]}.{signature}",
+    ]:
+        with pytest.raises(ValueError):
+            decode_causal_token(bad, KEY)
+
+
+def test_tracker_keeps_latest_write():
+    tracker = OperationTimeTracker(KEY)
+    tracker.succeeded(reply("find", Timestamp(1700000000, 9)))
+    tracker.succeeded(SimpleNamespace(command_name="insert", reply={"ok": 1, "n": 1}))  # standalone
+    assert tracker.token() is None
+
+    tracker.succeeded(reply("insert", Timestamp(1700000000, 5)))
+    tracker.succeeded(reply("update", Timestamp(1700000000, 2)))
+    assert decode_causal_token(tracker.token(), KEY)["operationTime"] == Timestamp(1700000000, 5)
+
+
+def test_writes_return_a_token_and_reads_use_it():
+    tracker = OperationTimeTracker()
+    tracker.succeeded(reply("insert", Timestamp(1700000000, 5)))
+    token = tracker.token()
+
+    async def scenario():
+        assert (await call(CausalConsistencyMiddleware(ok_app(), tracker), "POST"))[b"x-causal-token"] == token.encode()
+        assert b"x-causal-token" not in await call(CausalConsistencyMiddleware(ok_app(), tracker), "GET")
+
+        started = []
+
+        class Session:
+            def advance_cluster_time(self, cluster_time):
+                started.append(cluster_time)
+
+            def advance_operation_time(self, operation_time):
+                started.append(operation_time)
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+        async def start_session(causal_consistency):
+            assert causal_consistency
+            return Session()
+
+        collection = SimpleNamespace(database=SimpleNamespace(client=SimpleNamespace(start_session=start_session)))
+
+        async def read():
+            async with causal_session(collection) as session:
+                assert (session is None) == (not started)
+
+        await call(CausalConsistencyMiddleware(ok_app(read), tracker), "GET", "garbage")
+        # Issued with another deployment's key
+        other = OperationTimeTracker(b"other")
+        other.succeeded(reply("insert", Timestamp(1700000000, 5)))
+        await call(CausalConsistencyMiddleware(ok_app(read), tracker), "GET", other.token())
+        assert started == []
+
+        # A malformed $clusterTime never reaches the driver, however it was set
+        reset = _read_after.set({"operationTime": Timestamp(1, 1), "$clusterTime": {"clusterTime": "soon"}})
+        try:
+            await read()
+        finally:
+            _read_after.reset(reset)
+        assert started == []
+
+        await call(CausalConsistencyMiddleware(ok_app(read), tracker), "GET", token)
+        assert started == [CLUSTER_TIME, Timestamp(1700000000, 5)]
+
+    asyncio.run(scenario())
+
+
+def test_history_page_reads_own_write_from_secondary():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from repository import Repositories
+
+    async def scenario():
+        tracker = OperationTimeTracker()
+        client = AsyncIOMotorClient(REPLICA_SET_URL, serverSelectionTimeoutMS=500, event_listeners=[tracker])
+        try:
+            hello = await client.admin.command("hello")
+        except PyMongoError:
+            hello = {}
+        if "setName" not in hello:
+            client.close()
+            pytest.skip(f"no replica set reachable at {REPLICA_SET_URL}")
+
+        db_name = f"zen_data_access_{uuid.uuid4().hex[:8]}"
+        settings = MongoSettings()
+        replica = client.get_database(db_name, read_preference=settings.read_preference())
+        repos = Repositories(client[db_name], replica, settings.budgets)
+        user_id = str(uuid.uuid4())
+        rows = {}
+
+        async def write():
+            await repos.moods.insert({"id": str(uuid.uuid4()), "user_id": user_id, "mood": "calm", "created_at": datetime.utcnow()})
+
+        async def read():
+            rows["page"], _ = await repos.moods.page(user_id, None, 10, {"_id": 0})
+
+        try:
+            token = (await call(CausalConsistencyMiddleware(ok_app(write), tracker), "POST"))[b"x-causal-token"]
+            await call(CausalConsistencyMiddleware(ok_app(read), tracker), "GET", token.decode())
+            assert [row["user_id"] for row in rows["page"]] == [user_id]
+        finally:
+            await client.drop_database(db_name)
+            client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,73 @@
+import asyncio
+import gzip
+import random
+
+import orjson
+
+from exports import gzip_stream
+
+
+def test_gzip_stream_output_decompresses_to_the_input():
+    rng = random.Random(7)
+    lines = [f"{rng.getrandbits(128):032x}\n".encode() for _ in range(2000)]
+
+    async def chunks():
+        for line in lines:
+            yield line
+
+    async def scenario():
+        return [piece async for piece in gzip_stream(chunks(), flush_size=256)]
+
+    pieces = asyncio.run(scenario())
+    assert len(pieces) > 1
+    assert gzip.decompress(b"".join(pieces)) == b"".join(lines)
+
+
+def test_export_holds_the_profile_and_every_history_record(server, client):
+    async def scenario():
+        async with client() as api:
+            user = (await api.post("/api/users", json={"username": "alice"})).json()
+            other = (await api.post("/api/users", json={"username": "bob"})).json()
+            for user_id in (user["id"], other["id"]):
+                await api.post("/api/breathing-sessions", json={
+                    "user_id": user_id, "intention": "calm", "pattern_name": "just-breathe",
+                    "cycles_completed": 6, "duration_seconds": 120,
+                })
+            await api.post("/api/mood-diary", json={"user_id": user["id"], "mood": "calm", "notes": "slept well"})
+            course = server.catalog.courses[0]
+            await server.repos.completions.insert(server.CourseCompletion(
+                user_id=user["id"], course_id=course.id, zen_coins_earned=course.zen_coin_reward,
+            ).dict())
+
+            response = await api.get(f"/api/users/{user['id']}/export")
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/gzip"
+            return user, response.content
+
+    user, body = asyncio.run(scenario())
+    records = [orjson.loads(line) for line in gzip.decompress(body).splitlines()]
+    by_type = {}
+    for record in records:
+        by_type.setdefault(record["type"], []).append(record["data"])
+
+    assert records[0]["type"] == "user_profile"
+    assert set(by_type) == {"user_profile", "breathing_session", "mood_diary_entry", "zen_coin_transaction", "course_completion"}
+    for record_type, model in (
+        ("user_profile", server.UserProfile),
+        ("breathing_session", server.BreathingSession),
+        ("mood_diary_entry", server.MoodDiaryEntry),
+        ("zen_coin_transaction", server.ZenCoinTransaction),
+        ("course_completion", server.CourseCompletion),
+    ):
+        for data in by_type[record_type]:
+            assert set(model.model_fields) <= set(data), record_type
+            assert "_id" not in data
+
+    (profile,) = by_type["user_profile"]
+    assert profile["id"] == user["id"]
+    assert all(data["user_id"] == user["id"] for record_type, rows in by_type.items() if record_type != "user_profile" for data in rows)
+    assert len(by_type["breathing_session"]) == 1
+    assert by_type["mood_diary_entry"][0]["notes"] == "slept well"
+    # Session and mood rewards, plus any achievements they unlocked
+    assert {txn["metadata"].get("session_id") for txn in by_type["zen_coin_transaction"]} >= {by_type["breathing_session"][0]["id"]}
+    assert sum(txn["amount"] for txn in by_type["zen_coin_transaction"]) == profile["zen_coins"] - user["zen_coins"]
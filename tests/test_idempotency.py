@@ -0,0 +1,113 @@
+import asyncio
+
+from idempotency import DONE, IN_PROGRESS, IdempotencyMiddleware, request_fingerprint
+
+
+class DictStore:
+    """IdempotencyStore contract over a dict"""
+
+    def __init__(self):
+        self.records = {}
+
+    async def begin(self, record_id, fingerprint):
+        record = self.records.get(record_id)
+        if record is None:
+            self.records[record_id] = {"state": IN_PROGRESS, "fingerprint": fingerprint, "response": None}
+        return record
+
+    async def complete(self, record_id, fingerprint, response):
+        self.records[record_id] = {"state": DONE, "fingerprint": fingerprint, "response": response}
+
+    async def abandon(self, record_id):
+        self.records.pop(record_id, None)
+
+
+def make_app(status=200):
+    calls = []
+
+    async def app(scope, receive, send):
+        message = await receive()
+        calls.append(message["body"])
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b'{"n": %d}' % len(calls)})
+
+    return app, calls
+
+
+async def call(app, body=b"{}", key="k1", method="POST", path="/api/mood-diary", query=b""):
+    headers = [(b"content-type", b"application/json")]
+    if key is not None:
+        headers.append((b"idempotency-key", key.encode()))
+    scope = {"type": "http", "method": method, "path": path, "query_string": query, "headers": headers}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def test_repeated_key_replays_without_reaching_the_endpoint():
+    async def scenario():
+        inner, calls = make_app()
+        app = IdempotencyMiddleware(inner, DictStore())
+        first = await call(app)
+        second = await call(app)
+        assert calls == [b"{}"]
+        assert first[2] == second[2] == b'{"n": 1}'
+        assert second[1][b"idempotent-replayed"] == b"true"
+        # Same key on another endpoint is a different request
+        await call(app, path="/api/breathing-sessions")
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_requests_without_a_key_or_reads_pass_through():
+    async def scenario():
+        inner, calls = make_app()
+        app = IdempotencyMiddleware(inner, DictStore())
+        await call(app, key=None)
+        await call(app, key=None)
+        await call(app, method="GET")
+        await call(app, method="GET")
+        assert len(calls) == 4
+
+    asyncio.run(scenario())
+
+
+def test_key_reused_with_another_body_or_in_flight_is_rejected():
+    async def scenario():
+        store = DictStore()
+        inner, calls = make_app()
+        app = IdempotencyMiddleware(inner, store)
+        await call(app, body=b'{"mood": "calm"}')
+        assert (await call(app, body=b'{"mood": "sad"}'))[0] == 422
+        assert (await call(app, body=b'{"mood": "calm"}', query=b"user_id=other"))[0] == 422
+
+        await store.begin("POST /api/mood-diary k2", "fingerprint")
+        assert (await call(app, key="k2", body=b"fingerprint"))[0] == 422
+        store.records["POST /api/mood-diary k2"]["fingerprint"] = request_fingerprint(
+            {"method": "POST", "path": "/api/mood-diary", "query_string": b""}, b"x")
+        assert (await call(app, key="k2", body=b"x"))[0] == 409
+        assert calls == [b'{"mood": "calm"}']
+
+    asyncio.run(scenario())
+
+
+def test_server_errors_release_the_key():
+    async def scenario():
+        store = DictStore()
+        inner, calls = make_app(status=503)
+        app = IdempotencyMiddleware(inner, store)
+        await call(app)
+        await call(app)
+        assert len(calls) == 2
+        assert store.records == {}
+
+    asyncio.run(scenario())
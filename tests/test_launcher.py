@@ -0,0 +1,65 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+
+from launcher import gunicorn_command, prepare_metrics_dir, readiness_url, wait_until_ready, worker_count
+
+
+def test_worker_count():
+    assert worker_count({"REDIS_URL": "redis://r"}, 8) == 8
+    assert worker_count({"REDIS_URL": "redis://r", "WEB_CONCURRENCY": "3"}, 8) == 3
+    assert worker_count({"REDIS_URL": "redis://r"}, None) == 1
+    # Process-local leaderboard and limits would diverge between workers
+    assert worker_count({}, 8) == 1
+    assert worker_count({"WEB_CONCURRENCY": "4"}, 8) == 1
+
+
+def test_gunicorn_command_and_readiness_url():
+    command = gunicorn_command(4, "0.0.0.0:8001", 30)
+    assert command[1:4] == ["-m", "gunicorn", "server:app"]
+    assert command[command.index("--workers") + 1] == "4"
+    assert command[command.index("--worker-class") + 1] == "uvicorn.workers.UvicornWorker"
+    assert readiness_url("0.0.0.0:8001") == "http://127.0.0.1:8001/api/readyz"
+    assert readiness_url("10.0.0.5:9000") == "http://10.0.0.5:9000/api/readyz"
+
+
+def test_metrics_dir_is_fresh(tmp_path):
+    path, created = prepare_metrics_dir({})
+    try:
+        assert created and os.listdir(path) == []
+    finally:
+        os.rmdir(path)
+
+    given = tmp_path / "metrics"
+    given.mkdir()
+    (given / "counter_123.db").write_bytes(b"stale")
+    (given / "README").write_text("kept")
+    assert prepare_metrics_dir({"PROMETHEUS_MULTIPROC_DIR": str(given)}) == (str(given), False)
+    assert os.listdir(given) == ["README"]
+
+
+def test_wait_until_ready_polls_until_200():
+    statuses = iter([503, 503, 200])
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(next(statuses, 200))
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_port}/api/readyz"
+    try:
+        running = SimpleNamespace(poll=lambda: None)
+        assert wait_until_ready(url, running, timeout=5, interval=0.01)
+        assert next(statuses, None) is None
+
+        exited = SimpleNamespace(poll=lambda: 1)
+        assert not wait_until_ready(url, exited, timeout=5, interval=0.01)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
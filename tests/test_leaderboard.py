@@ -0,0 +1,114 @@
+import asyncio
+import random
+
+import pytest
+
+from leaderboard import InMemoryLeaderboard, OrderStatisticTree, RedisLeaderboard
+
+
+def test_tree_matches_sorted_list_under_random_operations():
+    rng = random.Random(7)
+    tree = OrderStatisticTree(rng.sample(range(10000), 500))
+    reference = sorted(tree.slice(0, 500))
+    for _ in range(2000):
+        key = rng.randrange(10000)
+        if key in reference:
+            tree.remove(key)
+            reference.remove(key)
+        else:
+            tree.insert(key)
+            reference.append(key)
+            reference.sort()
+    assert len(tree) == len(reference)
+    assert tree.slice(0, len(reference)) == reference
+    for index in rng.sample(range(len(reference)), 50):
+        assert tree.select(index) == reference[index]
+        assert tree.rank(reference[index]) == index
+
+
+async def stream(entries):
+    for entry in entries:
+        yield entry
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Shared fakeredis server behind every RedisLeaderboard created in the test"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr("redis.asyncio.from_url", lambda url: fakeredis.FakeAsyncRedis(server=server))
+    return server
+
+
+@pytest.fixture(params=["memory", "redis"])
+def board(request):
+    if request.param == "memory":
+        return InMemoryLeaderboard()
+    request.getfixturevalue("fake_redis")
+    return RedisLeaderboard("redis://fake")
+
+
+def test_leaderboard_ranks_by_score_then_member(board):
+    async def scenario():
+        await board.rebuild(stream([("carol", 30), ("bob", 10), ("alice", 30)]))
+        await board.incr("bob", 25)
+        await board.incr("dave", 0)
+        await board.set("erin", 30)
+        return await board.page(0, 10), await board.rank("carol"), await board.rank("nobody"), await board.page(3, 5)
+
+    page, carol, nobody, tail = asyncio.run(scenario())
+    assert page == [("bob", 35), ("alice", 30), ("carol", 30), ("erin", 30), ("dave", 0)]
+    assert carol == (2, 30)
+    assert nobody is None
+    assert tail == [("erin", 30), ("dave", 0)]
+
+
+def test_redis_rebuild_keeps_writes_made_during_the_scan(fake_redis):
+    async def scenario():
+        board, other = RedisLeaderboard("redis://fake"), RedisLeaderboard("redis://fake")
+        # Stale scores: alice's balance was lowered since, and gone was deleted
+        await board.set("alice", 50)
+        await board.set("gone", 7)
+
+        async def profiles():
+            yield "alice", 10
+            # alice is loaded; another worker applies writes while the scan goes on
+            await other.incr("alice", 5)
+            await other.incr("carol", 3)
+            await other.set("dave", 1)
+            # Read after the increment above, so the scanned balance includes it
+            yield "carol", 4
+            yield "bob", 2
+
+        assert await board.rebuild(profiles(), chunk_size=1)
+        assert await board.page(0, 10) == [("alice", 15), ("carol", 4), ("bob", 2), ("dave", 1)]
+        assert await board.redis.keys("*") == [b"zen:leaderboard"]
+
+        # Increments after the swap land on the rebuilt set, including for an empty one
+        await board.rebuild(stream([]))
+        assert await board.incr("late", 5) == 5
+        assert await board.page(0, 10) == [("late", 5)]
+
+    asyncio.run(scenario())
+
+
+def test_redis_rebuild_runs_on_one_worker_and_only_while_locked(fake_redis):
+    async def scenario():
+        board, other = RedisLeaderboard("redis://fake"), RedisLeaderboard("redis://fake")
+        await board.set("alice", 10)
+
+        # Another worker is already rebuilding
+        await board.redis.set("zen:leaderboard:rebuild-lock", "held")
+        assert not await other.rebuild(stream([("alice", 1)]))
+        await board.redis.delete("zen:leaderboard:rebuild-lock")
+
+        async def outlives_its_lock():
+            yield "alice", 1
+            await board.redis.delete("zen:leaderboard:rebuild-lock")
+
+        assert not await other.rebuild(outlives_its_lock(), chunk_size=1)
+        assert await board.rank("alice") == (0, 10)
+        assert await board.redis.keys("*") == [b"zen:leaderboard"]
+
+    asyncio.run(scenario())
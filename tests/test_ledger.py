@@ -0,0 +1,152 @@
+import asyncio
+
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from ledger import LedgerWriter
+
+
+class FakeProfiles:
+    """user_profiles stand-in applying ordered $inc bulk writes; rejects updates for users in reject"""
+
+    def __init__(self, balances, reject=()):
+        self.balances = dict(balances)
+        self.reject = set(reject)
+        self.bulk_writes = []
+        self.fail_with = None
+
+    async def bulk_write(self, updates, ordered, session):
+        self.bulk_writes.append([update._filter["id"] for update in updates])
+        if self.fail_with is not None:
+            raise self.fail_with
+        matched = 0
+        for index, update in enumerate(updates):
+            user_id = update._filter["id"]
+            if user_id in self.reject:
+                raise BulkWriteError({"writeErrors": [{"index": index, "code": 121, "errmsg": "validation failed"}]})
+            if user_id in self.balances:
+                self.balances[user_id] += update._doc["$inc"]["zen_coins"]
+                matched += 1
+        return type("Result", (), {"matched_count": matched})()
+
+    def find(self, query, projection, session):
+        async def rows():
+            for user_id in query["id"]["$in"]:
+                if user_id in self.balances:
+                    yield {"id": user_id}
+        return rows()
+
+
+class FakeTransactions:
+    def __init__(self):
+        self.docs = {}
+
+    async def insert_many(self, docs, ordered, session):
+        errors = []
+        for index, doc in enumerate(docs):
+            if doc["id"] in self.docs:
+                errors.append({"index": index, "code": 11000, "errmsg": "duplicate key"})
+            else:
+                self.docs[doc["id"]] = doc
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+class FakeDb:
+    def __init__(self, balances, reject=()):
+        self.user_profiles = FakeProfiles(balances, reject)
+        self.zen_coin_transactions = FakeTransactions()
+
+
+def txn(txn_id, user_id):
+    return {"id": txn_id, "user_id": user_id, "amount": 10}
+
+
+def test_concurrent_submits_are_batched():
+    async def scenario():
+        db = FakeDb({"u1": 0, "u2": 0, "u3": 0})
+        writer = LedgerWriter(db, max_batch=3, max_delay=0.05)
+        writer.start()
+        results = await asyncio.gather(*[
+            writer.submit(user_id, {"zen_coins": 10}, [txn(f"t{i}", user_id)])
+            for i, user_id in enumerate(["u1", "u2", "u1", "u3", "ghost"])
+        ])
+        await writer.close()
+
+        assert results == [True, True, True, True, False]
+        # Increments for one user are merged within a batch
+        assert db.user_profiles.bulk_writes == [["u1", "u2"], ["u3", "ghost"]]
+        assert db.user_profiles.balances == {"u1": 20, "u2": 10, "u3": 10}
+        assert sorted(db.zen_coin_transactions.docs) == ["t0", "t1", "t2", "t3"]
+
+    asyncio.run(scenario())
+
+
+def test_rejected_write_fails_only_its_user():
+    async def scenario():
+        db = FakeDb({"u1": 0, "bad": 0, "u2": 0}, reject={"bad"})
+        writer = LedgerWriter(db, max_batch=10, max_delay=0.05)
+        writer.start()
+        results = await asyncio.gather(
+            writer.submit("u1", {"zen_coins": 10}, [txn("t1", "u1")]),
+            writer.submit("bad", {"zen_coins": 10}, [txn("t2", "bad")]),
+            writer.submit("u2", {"zen_coins": 10}, [txn("t3", "u2")]),
+            writer.submit("u1", None, [txn("t4", "u1")]),
+            return_exceptions=True,
+        )
+        await writer.close()
+
+        assert results[0] is True and results[2] is True and results[3] is True
+        assert isinstance(results[1], BulkWriteError)
+        # u1's increment landed with the rejected batch and is not applied twice
+        assert db.user_profiles.balances == {"u1": 10, "bad": 0, "u2": 10}
+        assert db.user_profiles.bulk_writes == [["u1", "bad", "u2"], ["bad"], ["u2"]]
+        assert sorted(db.zen_coin_transactions.docs) == ["t1", "t3", "t4"]
+
+    asyncio.run(scenario())
+
+
+def test_unknown_outcome_fails_the_whole_batch():
+    async def scenario():
+        db = FakeDb({"u1": 0, "u2": 0})
+        db.user_profiles.fail_with = AutoReconnect("connection reset")
+        writer = LedgerWriter(db, max_batch=10, max_delay=0.05)
+        writer.start()
+        results = await asyncio.gather(
+            writer.submit("u1", {"zen_coins": 10}, []),
+            writer.submit("u2", {"zen_coins": 10}, []),
+            return_exceptions=True,
+        )
+        await writer.close()
+        assert all(isinstance(result, AutoReconnect) for result in results)
+        assert db.user_profiles.bulk_writes == [["u1", "u2"]]
+
+    asyncio.run(scenario())
+
+
+def test_close_flushes_pending_entries_then_writes_through():
+    async def scenario():
+        db = FakeDb({"u1": 0})
+        writer = LedgerWriter(db, max_batch=100, max_delay=10)
+        writer.start()
+        pending = [asyncio.create_task(writer.submit("u1", {"zen_coins": 5}, [txn(f"t{i}", "u1")])) for i in range(3)]
+        await asyncio.sleep(0)
+        await writer.close()
+        assert all(task.done() for task in pending)
+        assert db.user_profiles.balances == {"u1": 15}
+
+        # Stopped: written immediately, one entry per write
+        assert await writer.submit("u1", {"zen_coins": 5}, [txn("t9", "u1")])
+        assert db.user_profiles.bulk_writes == [["u1"], ["u1"]]
+        assert len(db.zen_coin_transactions.docs) == 4
+
+    asyncio.run(scenario())
+
+
+def test_submit_without_increment_skips_the_profile_update():
+    async def scenario():
+        db = FakeDb({"u1": 0})
+        assert await LedgerWriter(db).submit("u1", None, [txn("t1", "u1")])
+        assert db.user_profiles.bulk_writes == []
+        assert list(db.zen_coin_transactions.docs) == ["t1"]
+
+    asyncio.run(scenario())
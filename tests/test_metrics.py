@@ -0,0 +1,113 @@
+import asyncio
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+from starlette.routing import Route
+
+import metrics
+from metrics import REGISTRY, CommandMetrics, HttpMetricsMiddleware, PoolMetrics, register_stats
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+async def endpoint(request):
+    pass
+
+
+def test_requests_are_labelled_by_route_template():
+    async def scenario():
+        async def app(scope, receive, send):
+            status = 404 if scope["path"].endswith("missing") else 200
+            await send({"type": "http.response.start", "status": status, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        routes = [Route("/api/test-users/{user_id}", endpoint), Route("/api/test-users", endpoint, methods=["POST"])]
+        middleware = HttpMetricsMiddleware(app, routes)
+        before = sample("http_requests_total", method="GET", route="/api/test-users/{user_id}", status="200")
+        for path in ("/api/test-users/u1", "/api/test-users/u2", "/api/test-missing"):
+            await middleware({"type": "http", "method": "GET", "path": path, "headers": []}, None, lambda m: asyncio.sleep(0))
+
+        assert sample("http_requests_total", method="GET", route="/api/test-users/{user_id}", status="200") == before + 2
+        assert sample("http_request_duration_seconds_count", method="GET", route="/api/test-users/{user_id}") >= 2
+        assert sample("http_requests_total", method="GET", route="unmatched", status="404") >= 1
+        assert sample("http_requests_in_flight", method="GET", route="/api/test-users/{user_id}") == 0
+
+    asyncio.run(scenario())
+
+
+def test_commands_are_labelled_by_collection():
+    listener = CommandMetrics()
+
+    def run(name, command, request_id, failed=False):
+        listener.started(SimpleNamespace(command_name=name, command=command, connection_id=("h", 1), request_id=request_id))
+        finished = SimpleNamespace(command_name=name, connection_id=("h", 1), request_id=request_id, duration_micros=1500)
+        (listener.failed if failed else listener.succeeded)(finished)
+
+    before = sample("mongodb_commands_total", collection="test_profiles", command="find", outcome="success")
+    run("find", {"find": "test_profiles", "filter": {}}, 1)
+    run("getMore", {"getMore": 99, "collection": "test_profiles"}, 2)
+    run("insert", {"insert": "test_profiles"}, 3, failed=True)
+    run("ping", {"ping": 1}, 4)
+
+    assert sample("mongodb_commands_total", collection="test_profiles", command="find", outcome="success") == before + 1
+    assert sample("mongodb_commands_total", collection="test_profiles", command="getMore", outcome="success") >= 1
+    assert sample("mongodb_commands_total", collection="test_profiles", command="insert", outcome="failure") >= 1
+    assert sample("mongodb_commands_total", collection="-", command="ping", outcome="success") >= 1
+    assert sample("mongodb_command_duration_seconds_sum", collection="test_profiles", command="find") >= 0.0015
+    assert listener._collections == {}
+
+
+def test_pool_gauges_track_check_outs():
+    listener = PoolMetrics()
+    event = SimpleNamespace(address=("test-pool", 27017), reason="timeout")
+    address = "test-pool:27017"
+    listener.pool_created(SimpleNamespace(address=("test-pool", 27017), options={"maxPoolSize": 50}))
+    listener.connection_created(event)
+    listener.connection_check_out_started(event)
+    assert sample("mongodb_pool_waiting", address=address) == 1
+    listener.connection_checked_out(event)
+    assert sample("mongodb_pool_waiting", address=address) == 0
+    assert sample("mongodb_pool_checked_out", address=address) == 1
+    listener.connection_checked_in(event)
+    listener.connection_check_out_started(event)
+    listener.connection_check_out_failed(event)
+    assert sample("mongodb_pool_checked_out", address=address) == 0
+    assert sample("mongodb_pool_checkout_failures_total", address=address, reason="timeout") == 1
+    assert sample("mongodb_pool_connections", address=address) == 1
+    assert sample("mongodb_pool_max_connections", address=address) == 50
+
+
+def test_stats_are_read_at_scrape_time():
+    stats = {"depth": 3, "last_wait_seconds": 0.5, "name": "ignored"}
+    register_stats("test_component", "Test component", lambda: stats)
+    assert sample("test_component_depth") == 3
+    stats["depth"] = 7
+    assert sample("test_component_depth") == 7
+    assert sample("test_component_last_wait_seconds") == 0.5
+    assert REGISTRY.get_sample_value("test_component_name") is None
+
+
+def test_multiprocess_render_merges_workers(tmp_path):
+    # The value class is picked when prometheus_client is imported, so each "worker" is its own interpreter
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path), "PYTHONPATH": os.path.dirname(metrics.__file__)}
+    worker = (
+        "from metrics import HTTP_REQUESTS, HTTP_IN_FLIGHT, register_stats\n"
+        "HTTP_REQUESTS.labels('GET', '/api/test', '200').inc(2)\n"
+        "HTTP_IN_FLIGHT.labels('GET', '/api/test').inc()\n"
+    )
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", worker], env=env, check=True)
+    scrape = (
+        "from metrics import register_stats, render\n"
+        "register_stats('test_component', 'Test component', lambda: {'depth': 3})\n"
+        "print(render()[0].decode())\n"
+    )
+    body = subprocess.run([sys.executable, "-c", scrape], env=env, check=True, capture_output=True, text=True).stdout
+
+    assert 'http_requests_total{method="GET",route="/api/test",status="200"} 4.0' in body
+    assert 'http_requests_in_flight{method="GET",route="/api/test"} 2.0' in body
+    assert "test_component_depth 3.0" in body
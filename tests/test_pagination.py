@@ -0,0 +1,28 @@
+from datetime import datetime
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor, keyset_filter
+
+STAMP = datetime(2025, 6, 5, 8, 30, 15, 123000)
+
+
+def test_cursor_round_trip():
+    token = encode_cursor(STAMP, "row-9")
+    assert "=" not in token
+    assert decode_cursor(token) == (STAMP, "row-9")
+
+
+@pytest.mark.parametrize("token", ["", "not-base64!", encode_cursor(STAMP, "x")[:-3]])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+def test_keyset_filter_seeks_past_cursor():
+    assert keyset_filter({"user_id": "u"}, "timestamp", None) == {"user_id": "u"}
+    assert keyset_filter({"user_id": "u"}, "timestamp", encode_cursor(STAMP, "row-9")) == {
+        "user_id": "u",
+        "timestamp": {"$lte": STAMP},
+        "$or": [{"timestamp": {"$lt": STAMP}}, {"id": {"$lt": "row-9"}}],
+    }
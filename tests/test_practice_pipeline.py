@@ -0,0 +1,67 @@
+"""Runs the streak update pipeline against a local mongod (TEST_MONGO_URL); skipped when none is reachable."""
+import os
+import uuid
+from datetime import date, datetime
+
+import pytest
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import PyMongoError
+
+from repository import practice_pipeline
+
+MONGO_URL = os.environ.get("TEST_MONGO_URL", "mongodb://localhost:27017")
+
+TODAY = date(2025, 6, 5)
+NOW = datetime(2025, 6, 5, 9, 30)
+
+
+@pytest.fixture(scope="module")
+def profiles():
+    client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"no mongod reachable at {MONGO_URL}")
+    db_name = f"zen_practice_{uuid.uuid4().hex[:8]}"
+    yield client[db_name].user_profiles
+    client.drop_database(db_name)
+    client.close()
+
+
+@pytest.mark.parametrize("last_practice,streak,expected", [
+    (None, 0, 1),
+    (datetime(2025, 6, 5), 3, 3),
+    (datetime(2025, 6, 5), 0, 1),
+    (datetime(2025, 6, 4), 3, 4),
+    (datetime(2025, 6, 4, 18, 45), 3, 4),
+    (datetime(2025, 6, 2), 3, 1),
+])
+def test_streak_follows_the_last_practice_date(profiles, last_practice, streak, expected):
+    user_id = str(uuid.uuid4())
+    profiles.insert_one({"id": user_id, "last_practice_date": last_practice, "consecutive_days": streak, "total_sessions": 2})
+    user = profiles.find_one_and_update(
+        {"id": user_id}, practice_pipeline([TODAY], NOW), return_document=ReturnDocument.AFTER
+    )
+    assert user["consecutive_days"] == expected
+    assert user["total_sessions"] == 3
+    assert user["last_practice_date"] == max(last_practice or datetime(2025, 6, 5), datetime(2025, 6, 5))
+
+
+def test_missing_fields_start_from_zero(profiles):
+    user_id = str(uuid.uuid4())
+    profiles.insert_one({"id": user_id})
+    user = profiles.find_one_and_update(
+        {"id": user_id}, practice_pipeline([TODAY], NOW), return_document=ReturnDocument.AFTER
+    )
+    assert (user["consecutive_days"], user["total_sessions"]) == (1, 1)
+
+
+def test_days_are_folded_oldest_first(profiles):
+    user_id = str(uuid.uuid4())
+    profiles.insert_one({"id": user_id, "last_practice_date": datetime(2025, 6, 2), "consecutive_days": 3, "total_sessions": 2})
+    days = [date(2025, 6, 5), date(2025, 6, 3), date(2025, 6, 4), date(2025, 6, 4), date(2025, 6, 1)]
+    user = profiles.find_one_and_update(
+        {"id": user_id}, practice_pipeline(days, NOW, {"$inc": {"zen_coins": 50}}), return_document=ReturnDocument.AFTER
+    )
+    assert (user["consecutive_days"], user["total_sessions"], user["zen_coins"]) == (6, 7, 50)
+    assert user["last_practice_date"] == datetime(2025, 6, 5)
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+from profiler import CommandProfiler, ProfilerMiddleware, query_shape
+
+listener = CommandProfiler()
+
+
+def issue(name, command, request_id):
+    listener.started(SimpleNamespace(command_name=name, command=command, connection_id=("h", 1), request_id=request_id))
+    listener.succeeded(SimpleNamespace(command_name=name, connection_id=("h", 1), request_id=request_id, duration_micros=2000))
+
+
+def make_app(commands):
+    async def app(scope, receive, send):
+        for request_id, (name, command) in enumerate(commands):
+            issue(name, command, request_id)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    return app
+
+
+async def call(app, profile=True):
+    headers = [(b"x-profile", b"1")] if profile else []
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await app({"type": "http", "method": "POST", "path": "/api/breathing-sessions", "headers": headers}, None, send)
+    return dict(sent[0]["headers"])
+
+
+def test_query_shape_ignores_values():
+    assert query_shape("find", {"find": "user_profiles", "filter": {"id": "u1"}}) == \
+        query_shape("find", {"find": "user_profiles", "filter": {"id": "u2"}})
+    assert query_shape("find", {"find": "user_profiles", "filter": {"id": "u1"}}) != \
+        query_shape("find", {"find": "user_profiles", "filter": {"referral_code": "u1"}})
+    assert query_shape("update", {"update": "user_profiles", "updates": [{"q": {"id": "u1"}, "u": {}}]}) == \
+        'update user_profiles {"id":"?"}'
+    assert query_shape("aggregate", {"aggregate": "courses", "pipeline": [{"$match": {"is_active": True}}]}) == \
+        'aggregate courses [{"$match":{"is_active":"?"}}]'
+    assert query_shape("insert", {"insert": "mood_entries", "documents": [{}]}) == "insert mood_entries"
+
+
+def test_profiled_response_carries_server_timing():
+    async def scenario():
+        app = ProfilerMiddleware(make_app([
+            ("find", {"find": "user_profiles", "filter": {"id": "u1"}}),
+            ("insert", {"insert": "breathing_sessions"}),
+            ("getMore", {"getMore": 1, "collection": "user_profiles"}),
+        ]))
+        timing = (await call(app))[b"server-timing"].decode()
+        assert timing.startswith('db;dur=4.00;desc="2 queries", app;dur=')
+        assert b"server-timing" not in await call(app, profile=False)
+
+    asyncio.run(scenario())
+
+
+def test_commands_outside_a_profiled_request_are_ignored():
+    issue("find", {"find": "user_profiles", "filter": {}}, 1)
+
+
+def test_query_loops_and_query_counts_are_logged(caplog):
+    async def scenario():
+        loop = [("count", {"count": "zen_coin_transactions", "query": {"user_id": "u1", "kind": k}}) for k in range(4)]
+        app = ProfilerMiddleware(make_app(loop), max_queries=3, max_repeats=3)
+        with caplog.at_level(logging.WARNING, logger="profiler"):
+            await call(app)
+        messages = [record.getMessage() for record in caplog.records]
+        assert any("issued 4 queries (limit 3)" in message for message in messages)
+        assert any('repeated one query 4 times: count zen_coin_transactions {"user_id":"?","kind":"?"}' in message
+                   for message in messages)
+
+        caplog.clear()
+        with caplog.at_level(logging.WARNING, logger="profiler"):
+            await call(ProfilerMiddleware(make_app(loop[:2]), max_queries=3, max_repeats=3))
+        assert caplog.records == []
+
+    asyncio.run(scenario())
+
+
+def test_sampling_profiles_requests_without_the_header():
+    async def scenario():
+        app = ProfilerMiddleware(make_app([]), sample_rate=1.0)
+        assert b"server-timing" in await call(app, profile=False)
+
+    asyncio.run(scenario())
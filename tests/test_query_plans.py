@@ -0,0 +1,163 @@
+"""Query-plan regression suite: every query server.py issues must be index-backed.
+
+Runs explain() against a local mongod (TEST_MONGO_URL, default mongodb://localhost:27017)
+and is skipped when none is reachable.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from indexes import ensure_indexes
+from pagination import encode_cursor, keyset_filter
+from repository import COMPLETION_KEY, PROFILE_EXISTS
+
+MONGO_URL = os.environ.get("TEST_MONGO_URL", "mongodb://localhost:27017")
+
+USER_ID = "user-1"
+COURSE_ID = "course-1"
+CURSOR = encode_cursor(datetime(2025, 6, 5, 12, 0), "row-1")
+
+# (name, collection, explain command body) for every filtered query in server.py.
+# Unfiltered catalog/status reads (the catalog cache reload, status_checks.find()) are
+# full reads by design and are not listed.
+QUERIES = [
+    ("profile by id", "user_profiles", {"find": "user_profiles", "filter": {"id": USER_ID}}),
+    ("profile by referral code", "user_profiles", {"find": "user_profiles", "filter": {"referral_code": "abcd1234"}}),
+    ("leaderboard page profiles", "user_profiles", {"find": "user_profiles", "filter": {"id": {"$in": [USER_ID, "user-2"]}}}),
+    ("session history", "breathing_sessions", {
+        "find": "breathing_sessions", "filter": {"user_id": USER_ID},
+        "sort": {"completed_at": -1, "id": -1}, "limit": 51,
+    }),
+    ("session history page", "breathing_sessions", {
+        "find": "breathing_sessions", "filter": keyset_filter({"user_id": USER_ID}, "completed_at", CURSOR),
+        "sort": {"completed_at": -1, "id": -1}, "limit": 51,
+    }),
+    ("transaction history", "zen_coin_transactions", {
+        "find": "zen_coin_transactions", "filter": keyset_filter({"user_id": USER_ID}, "timestamp", CURSOR),
+        "sort": {"timestamp": -1, "id": -1}, "limit": 101,
+    }),
+    ("achievement unlocks since", "zen_coin_transactions", {
+        "find": "zen_coin_transactions",
+        "filter": {"user_id": USER_ID, "timestamp": {"$gte": datetime(2025, 6, 5)}, "metadata.achievement_id": {"$exists": True}},
+        "sort": {"timestamp": 1, "id": 1}, "limit": 20,
+    }),
+    ("mood diary history", "mood_diary_entries", {
+        "find": "mood_diary_entries", "filter": keyset_filter({"user_id": USER_ID}, "created_at", CURSOR),
+        "sort": {"created_at": -1, "id": -1}, "limit": 51,
+    }),
+    ("export sessions", "breathing_sessions", {
+        "find": "breathing_sessions", "filter": {"user_id": USER_ID}, "sort": {"completed_at": 1, "id": 1},
+    }),
+    ("export mood diary", "mood_diary_entries", {
+        "find": "mood_diary_entries", "filter": {"user_id": USER_ID}, "sort": {"created_at": 1, "id": 1},
+    }),
+    ("export transactions", "zen_coin_transactions", {
+        "find": "zen_coin_transactions", "filter": {"user_id": USER_ID}, "sort": {"timestamp": 1, "id": 1},
+    }),
+    ("export course completions", "course_completions", {"find": "course_completions", "filter": {"user_id": USER_ID}}),
+    ("existing completion", "course_completions", {
+        "find": "course_completions", "filter": {"user_id": USER_ID, "course_id": COURSE_ID},
+    }),
+    ("payment by session id", "payment_transactions", {
+        "find": "payment_transactions", "filter": {"session_id": "cs_demo_1"},
+    }),
+]
+
+# Existence checks that must be answered from the index alone (no FETCH stage)
+COVERED_QUERIES = [
+    ("profile exists", "user_profiles", {
+        "find": "user_profiles", "filter": {"id": USER_ID}, "projection": PROFILE_EXISTS, "limit": 1,
+    }),
+    ("completion exists", "course_completions", {
+        "find": "course_completions", "filter": {"user_id": USER_ID, "course_id": COURSE_ID},
+        "projection": COMPLETION_KEY, "limit": 1,
+    }),
+]
+
+FORBIDDEN_STAGES = {"COLLSCAN", "SORT", "SORT_KEY_GENERATOR"}
+
+
+def _stages(plan):
+    """Yield every stage name in an explain plan tree (classic and SBE layouts)"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+
+@pytest.fixture(scope="module")
+def mongo_db():
+    sync_client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=500)
+    try:
+        sync_client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"no mongod reachable at {MONGO_URL}")
+
+    db_name = f"zen_query_plans_{uuid.uuid4().hex[:8]}"
+
+    async def bootstrap():
+        motor_client = AsyncIOMotorClient(MONGO_URL)
+        try:
+            await ensure_indexes(motor_client[db_name])
+            # Applying the registry twice must be a no-op
+            await ensure_indexes(motor_client[db_name])
+        finally:
+            motor_client.close()
+
+    asyncio.run(bootstrap())
+    yield sync_client[db_name]
+    sync_client.drop_database(db_name)
+    sync_client.close()
+
+
+@pytest.mark.parametrize("name,collection,command", QUERIES, ids=[q[0] for q in QUERIES])
+def test_query_is_index_backed(mongo_db, name, collection, command):
+    explain = mongo_db.command({"explain": command, "verbosity": "queryPlanner"})
+    stages = set(_stages(explain["queryPlanner"]["winningPlan"]))
+    assert not stages & FORBIDDEN_STAGES, f"{name} on {collection} uses {sorted(stages)}"
+
+
+@pytest.mark.parametrize("name,collection,command", COVERED_QUERIES, ids=[q[0] for q in COVERED_QUERIES])
+def test_query_is_covered(mongo_db, name, collection, command):
+    explain = mongo_db.command({"explain": command, "verbosity": "queryPlanner"})
+    stages = set(_stages(explain["queryPlanner"]["winningPlan"]))
+    assert "FETCH" not in stages and not stages & FORBIDDEN_STAGES, f"{name} on {collection} uses {sorted(stages)}"
+
+
+def test_registry_covers_every_queried_collection(mongo_db):
+    indexed = set(mongo_db.list_collection_names())
+    assert {collection for _, collection, _ in QUERIES} <= indexed
+
+
+def test_unique_index_waits_for_duplicates_to_be_resolved(mongo_db):
+    db_name = f"zen_duplicates_{uuid.uuid4().hex[:8]}"
+    profiles = mongo_db.client[db_name].user_profiles
+    profiles.insert_many([{"id": "a", "referral_code": "c0de"}, {"id": "b", "referral_code": "c0de"}])
+
+    async def ensure():
+        motor_client = AsyncIOMotorClient(MONGO_URL)
+        try:
+            await ensure_indexes(motor_client[db_name])
+        finally:
+            motor_client.close()
+
+    try:
+        asyncio.run(ensure())
+        assert "referral_code_unique" not in profiles.index_information()
+        assert "id_unique" in profiles.index_information()
+
+        profiles.update_one({"id": "b"}, {"$set": {"referral_code": "f00d"}})
+        asyncio.run(ensure())
+        assert "referral_code_unique" in profiles.index_information()
+    finally:
+        mongo_db.client.drop_database(db_name)
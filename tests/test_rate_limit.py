@@ -0,0 +1,156 @@
+import asyncio
+
+from rate_limit import InMemoryRateLimiter, RateLimitMiddleware, RouteLimit, parse_route_limits
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_app():
+    calls = []
+
+    async def app(scope, receive, send):
+        message = await receive()
+        calls.append(message["body"])
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    return app, calls
+
+
+async def call(app, body=b"{}", path="/api/mood-diary", query=b"", client="10.0.0.1", headers=()):
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers]
+    scope = {
+        "type": "http", "method": "POST", "path": path, "query_string": query,
+        "headers": headers, "client": (client, 50000),
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]["status"], dict(sent[0]["headers"])
+
+
+def test_bucket_allows_burst_then_refills_at_rate():
+    async def scenario():
+        clock = Clock()
+        limiter = InMemoryRateLimiter(clock)
+        assert [await limiter.acquire("k", 1.0, 3) for _ in range(3)] == [0, 0, 0]
+        assert await limiter.acquire("k", 1.0, 3) == 1.0
+        clock.now += 0.5
+        assert await limiter.acquire("k", 1.0, 3) == 0.5
+        clock.now += 1
+        assert await limiter.acquire("k", 1.0, 3) == 0
+        # Other keys have their own bucket
+        assert await limiter.acquire("other", 1.0, 3) == 0
+
+    asyncio.run(scenario())
+
+
+def test_pruning_drops_only_refilled_buckets():
+    async def scenario():
+        clock = Clock()
+        limiter = InMemoryRateLimiter(clock, max_keys=1)
+        await limiter.acquire("idle", 1.0, 2)
+        clock.now += 5
+        await limiter.acquire("busy", 1.0, 2)
+        assert set(limiter.buckets) == {"busy"}
+
+    asyncio.run(scenario())
+
+
+def test_route_templates_match_one_path_segment():
+    route = RouteLimit("POST /api/courses/{course_id}/complete", 60, 1)
+    assert route.matches("POST", "/api/courses/abc-1/complete")
+    assert not route.matches("GET", "/api/courses/abc-1/complete")
+    assert not route.matches("POST", "/api/courses/a/b/complete")
+    assert not route.matches("POST", "/api/courses/abc-1/complete/x")
+    assert route.rate == 1.0
+
+
+def test_limit_is_per_user_and_answers_429_with_retry_after():
+    async def scenario():
+        inner, calls = make_app()
+        app = RateLimitMiddleware(inner, InMemoryRateLimiter(Clock()), parse_route_limits({"POST /api/mood-diary": (6, 2)}))
+        body = b'{"user_id": "u1", "mood": 3}'
+        assert [(await call(app, body))[0] for _ in range(3)] == [200, 200, 429]
+        status, headers = await call(app, body)
+        assert status == 429 and headers[b"retry-after"] == b"10"
+        # The endpoint still receives the body the middleware read
+        assert calls == [body, body]
+        # Another user from the same address has a separate bucket
+        assert (await call(app, b'{"user_id": "u2"}'))[0] == 200
+        assert (await call(app, query=b"user_id=u2"))[0] == 200
+        assert (await call(app, query=b"user_id=u2"))[0] == 429
+        # Unlimited routes are untouched
+        assert (await call(app, path="/api/users/u1"))[0] == 200
+        assert app.counters["limited"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_rotating_user_ids_are_still_limited_per_address():
+    async def scenario():
+        inner, _ = make_app()
+        routes = parse_route_limits({"POST /api/mood-diary": (6, 2)})
+        app = RateLimitMiddleware(inner, InMemoryRateLimiter(Clock()), routes, address_factor=3)
+        statuses = [(await call(app, b'{"user_id": "u%d"}' % i))[0] for i in range(8)]
+        # 3x the burst for the address, however many user ids it names
+        assert statuses == [200] * 6 + [429] * 2
+        assert (await call(app, b'{"user_id": "u9"}', client="10.0.0.2"))[0] == 200
+
+    asyncio.run(scenario())
+
+
+def test_anonymous_requests_are_keyed_by_the_proxy_appended_address():
+    async def scenario():
+        inner, _ = make_app()
+        routes = parse_route_limits({"POST /api/users": (60, 1)})
+        # The client wrote the first entry; the proxy appended the second
+        spoofed = ((b"x-forwarded-for", b"203.0.113.9, 198.51.100.4"),)
+        respoofed = ((b"x-forwarded-for", b"192.0.2.77, 198.51.100.4"),)
+
+        app = RateLimitMiddleware(inner, InMemoryRateLimiter(Clock()), routes, trust_forwarded=True)
+        assert (await call(app, path="/api/users", headers=spoofed))[0] == 200
+        assert (await call(app, path="/api/users", headers=respoofed))[0] == 429
+        assert (await call(app, path="/api/users"))[0] == 200
+
+        # Off by default: the header is ignored and the peer address used
+        untrusting = RateLimitMiddleware(inner, InMemoryRateLimiter(Clock()), routes)
+        assert (await call(untrusting, path="/api/users", headers=spoofed))[0] == 200
+        assert (await call(untrusting, path="/api/users"))[0] == 429
+
+    asyncio.run(scenario())
+
+
+def test_requests_over_the_in_flight_cap_are_shed():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow(scope, receive, send):
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        app = RateLimitMiddleware(slow, InMemoryRateLimiter(), [], max_in_flight=2, exempt_paths=("/api/healthz",))
+        first = asyncio.create_task(call(app))
+        second = asyncio.create_task(call(app))
+        await asyncio.sleep(0)
+        status, headers = await call(app)
+        assert status == 503 and headers[b"retry-after"] == b"1"
+        release.set()
+        assert [(await first)[0], (await second)[0]] == [200, 200]
+        assert (await call(app, path="/api/healthz"))[0] == 200
+        assert app.counters["shed"] == 1 and app.in_flight == 0
+
+    asyncio.run(scenario())
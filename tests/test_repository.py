@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from repository import UserProfileRepository, new_referral_code
+
+
+class CollidingCollection:
+    """insert_one that rejects the first `collisions` documents on the given unique key"""
+
+    def __init__(self, collisions, key_pattern):
+        self.collisions = collisions
+        self.key_pattern = key_pattern
+        self.inserted = []
+
+    async def insert_one(self, doc):
+        doc["_id"] = len(self.inserted)
+        if self.collisions:
+            self.collisions -= 1
+            raise DuplicateKeyError("E11000 duplicate key error", 11000, {"keyPattern": self.key_pattern})
+        self.inserted.append(dict(doc))
+
+
+def test_referral_codes_are_48_bit_hex():
+    code = new_referral_code()
+    assert len(code) == 12 and int(code, 16) >= 0
+    assert new_referral_code() != code
+
+
+def test_insert_draws_a_new_referral_code_on_collision():
+    async def scenario():
+        collection = CollidingCollection(2, {"referral_code": 1})
+        doc = {"id": "u1", "referral_code": "taken"}
+        await UserProfileRepository(collection).insert(doc)
+        assert [row["referral_code"] for row in collection.inserted] == [doc["referral_code"]]
+        assert doc["referral_code"] != "taken"
+
+        # Every attempt colliding gives up with the error
+        with pytest.raises(DuplicateKeyError):
+            await UserProfileRepository(CollidingCollection(5, {"referral_code": 1})).insert({"id": "u2", "referral_code": "x"})
+
+        # Other unique keys are not retried
+        collection = CollidingCollection(1, {"id": 1})
+        with pytest.raises(DuplicateKeyError):
+            await UserProfileRepository(collection).insert({"id": "u1", "referral_code": "y"})
+        assert collection.inserted == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,40 @@
+import asyncio
+
+from request_body import buffer_body
+
+
+def receiver(messages):
+    queue = list(messages)
+
+    async def receive():
+        return queue.pop(0)
+
+    return receive
+
+
+def test_chunked_body_is_joined_and_replayed_once():
+    async def scenario():
+        receive = receiver([
+            {"type": "http.request", "body": b'{"user_id":', "more_body": True},
+            {"type": "http.request", "body": b' "u1"}', "more_body": False},
+            {"type": "http.disconnect"},
+        ])
+        body, replay = await buffer_body(receive)
+        return body, await replay(), await replay()
+
+    body, first, after = asyncio.run(scenario())
+    assert body == b'{"user_id": "u1"}'
+    assert first == {"type": "http.request", "body": body, "more_body": False}
+    assert after == {"type": "http.disconnect"}
+
+
+def test_disconnect_before_the_body_ends_is_passed_on():
+    async def scenario():
+        receive = receiver([
+            {"type": "http.request", "body": b"partial", "more_body": True},
+            {"type": "http.disconnect"},
+        ])
+        body, replay = await buffer_body(receive)
+        return body, await replay()
+
+    assert asyncio.run(scenario()) == (None, {"type": "http.disconnect"})
@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import rollups
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+NOW = datetime.utcnow().replace(microsecond=0)
+TODAY = NOW.date()
+YESTERDAY = NOW - timedelta(days=1)
+
+
+def fresh_db():
+    return mongomock_motor.AsyncMongoMockClient()["zen_rollups"]
+
+
+def test_sessions_are_counted_per_day_and_users_are_active_once_a_day():
+    async def scenario():
+        db = fresh_db()
+        await rollups.record_sessions(db, "u1", [(NOW, 6, 120), (NOW, 4, 60), (YESTERDAY, 2, 30)])
+        await rollups.record_sessions(db, "u1", [(NOW, 1, 10)])
+        await rollups.record_sessions(db, "u2", [(NOW, 3, 45)])
+        await rollups.record_sessions(db, "u3", [])
+
+        today = await db.oasis_stats.find_one({"_id": rollups.day_id(TODAY)})
+        assert (today["total_sessions"], today["total_cycles"], today["active_users"]) == (4, 14, 2)
+        yesterday = await db.oasis_stats.find_one({"_id": rollups.day_id(YESTERDAY.date())})
+        assert (yesterday["total_sessions"], yesterday["active_users"], yesterday["day"]) == (1, 1, YESTERDAY.date().isoformat())
+        totals = await db.oasis_stats.find_one({"_id": rollups.GLOBAL_ID})
+        assert (totals["total_sessions"], totals["total_cycles"], totals["total_breath_seconds"]) == (5, 16, 265)
+        assert "active_users" not in totals
+
+    asyncio.run(scenario())
+
+
+def test_read_stats_combines_totals_with_today():
+    async def scenario():
+        db = fresh_db()
+        assert (await rollups.read_stats(db, TODAY))["total_sessions"] == 0
+
+        await rollups.record_sessions(db, "u1", [(YESTERDAY, 5, 600), (NOW, 3, 90)])
+        await rollups.record_course_completion(db, NOW)
+        await rollups.record_mood_entry(db, YESTERDAY)
+        await rollups.record_new_user(db, NOW)
+        return await rollups.read_stats(db, TODAY)
+
+    stats = asyncio.run(scenario())
+    assert stats == {
+        "total_sessions": 2,
+        "total_cycles": 8,
+        "total_breath_minutes": 11,
+        "total_users": 1,
+        "courses_completed": 1,
+        "mood_entries": 1,
+        "active_users_today": 1,
+        "sessions_today": 1,
+        "total_elements_grown": 8,
+        "active_gardens": 1,
+        "collective_breath_cycles": 8,
+    }
+
+
+class WatchedStats:
+    """oasis_stats wrapper reading the stats back after every write to it"""
+
+    def __init__(self, db, snapshots):
+        self.collection = db.oasis_stats
+        self.db = db
+        self.snapshots = snapshots
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def bulk_write(self, *args, **kwargs):
+        result = await self.collection.bulk_write(*args, **kwargs)
+        self.snapshots.append(await rollups.read_stats(self.db, TODAY))
+        return result
+
+    async def delete_many(self, *args, **kwargs):
+        result = await self.collection.delete_many(*args, **kwargs)
+        self.snapshots.append(await rollups.read_stats(self.db, TODAY))
+        return result
+
+
+class WatchedDb:
+    def __init__(self, db, snapshots):
+        self.db = db
+        self.oasis_stats = WatchedStats(db, snapshots)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+def test_backfill_rebuilds_in_place_without_a_window_of_missing_stats(monkeypatch):
+    monkeypatch.setattr(rollups, "BACKFILL_CHUNK", 2)
+
+    async def scenario():
+        db = fresh_db()
+        await db.breathing_sessions.insert_many([
+            {"user_id": "u1", "completed_at": YESTERDAY, "cycles_completed": 5, "duration_seconds": 300},
+            {"user_id": "u1", "completed_at": NOW, "cycles_completed": 3, "duration_seconds": 120},
+            {"user_id": "u2", "completed_at": NOW, "cycles_completed": 2, "duration_seconds": 60},
+        ])
+        await db.course_completions.insert_one({"user_id": "u1", "completed_at": NOW})
+        await db.mood_diary_entries.insert_one({"user_id": "u2", "created_at": YESTERDAY})
+        await db.user_profiles.insert_many([{"id": "u1", "created_at": YESTERDAY}, {"id": "u2", "created_at": NOW}])
+        # Drifted rollups, including a day with no history left
+        await rollups.record_sessions(db, "u1", [(NOW, 50, 6000)] * 7)
+        await rollups.record_sessions(db, "ghost", [(NOW - timedelta(days=30), 1, 10)])
+
+        snapshots = []
+        assert await rollups.backfill(WatchedDb(db, snapshots)) == 2
+        # Every read during the rebuild saw either old or rebuilt totals, never an empty document
+        assert snapshots and all(stats["total_sessions"] in (8, 3) for stats in snapshots)
+
+        stats = await rollups.read_stats(db, TODAY)
+        assert (stats["total_sessions"], stats["total_cycles"], stats["total_breath_minutes"]) == (3, 10, 8)
+        assert (stats["total_users"], stats["courses_completed"], stats["mood_entries"]) == (2, 1, 1)
+        assert (stats["active_users_today"], stats["sessions_today"]) == (2, 2)
+        ids = sorted(doc["_id"] for doc in await db.oasis_stats.find({}, {"_id": 1}).to_list(None))
+        assert ids == sorted([rollups.GLOBAL_ID, rollups.day_id(TODAY), rollups.day_id(YESTERDAY.date())])
+
+        # Markers were recreated, so a later session does not count u2 as active twice
+        await rollups.record_sessions(db, "u2", [(NOW, 1, 10)])
+        assert (await rollups.read_stats(db, TODAY))["active_users_today"] == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,143 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from metrics import REGISTRY
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+async def create_user(api, username="alice"):
+    response = await api.post("/api/users", json={"username": username})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_negative_award_lowers_the_balance_and_counts_a_deduction(server, client):
+    async def scenario():
+        async with client() as api:
+            user = await create_user(api)
+            award = {"user_id": user["id"], "transaction_type": "paid_subscription", "description": "welcome gift"}
+            assert (await api.post("/api/zen-coins/award", json={**award, "amount": 50})).status_code == 200
+            awarded = sample("zen_coins_awarded_total", type="paid_subscription")
+            deducted = sample("zen_coins_deducted_total", type="paid_subscription")
+
+            response = await api.post("/api/zen-coins/award", json={**award, "amount": -30, "description": "correction"})
+            assert response.status_code == 200
+            balance = (await api.get(f"/api/zen-coins/{user['id']}/balance")).json()
+            assert balance["zen_coins"] == user["zen_coins"] + 20
+            assert sample("zen_coins_awarded_total", type="paid_subscription") == awarded
+            assert sample("zen_coins_deducted_total", type="paid_subscription") == deducted + 30
+
+    asyncio.run(scenario())
+
+
+def session(**fields):
+    return {"intention": "calm", "pattern_name": "just-breathe", "cycles_completed": 6, "duration_seconds": 120, **fields}
+
+
+def test_batch_sessions_are_ordered_and_fold_the_streak(server, client):
+    async def scenario():
+        today = datetime.utcnow().date()
+        async with client() as api:
+            user = await create_user(api)
+            response = await api.post("/api/breathing-sessions/batch", json={"user_id": user["id"], "sessions": [
+                session(intention="today"),
+                session(intention="yesterday", completed_at=f"{today - timedelta(days=1)}T08:00:00"),
+                # 01:30 UTC two days ago
+                session(intention="two days ago", completed_at=f"{today - timedelta(days=3)}T23:30:00-02:00"),
+            ]})
+            assert response.status_code == 200
+            result = response.json()
+            assert [row["intention"] for row in result["sessions"]] == ["two days ago", "yesterday", "today"]
+            assert result["sessions"][0]["completed_at"] == f"{today - timedelta(days=2)}T01:30:00"
+            assert (result["zen_coins_earned"], result["consecutive_days"]) == (30, 3)
+
+            profile = (await api.get(f"/api/users/{user['id']}")).json()
+            assert (profile["total_sessions"], profile["consecutive_days"]) == (3, 3)
+            transactions = (await api.get(f"/api/zen-coins/{user['id']}/transactions")).json()
+            assert sum(txn["amount"] for txn in transactions if "session_id" in txn["metadata"]) == 30
+            assert profile["zen_coins"] == user["zen_coins"] + sum(txn["amount"] for txn in transactions)
+            assert profile["last_practice_date"] == str(today)
+
+            # Replaying an older day keeps the streak
+            response = await api.post("/api/breathing-sessions/batch", json={"user_id": user["id"], "sessions": [
+                session(completed_at=f"{today - timedelta(days=10)}T08:00:00"),
+            ]})
+            assert response.json()["consecutive_days"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_batch_sessions_from_the_future_count_as_completed_now(server, client):
+    async def scenario():
+        async with client() as api:
+            user = await create_user(api)
+            response = await api.post("/api/breathing-sessions/batch", json={"user_id": user["id"], "sessions": [
+                session(completed_at="2030-01-01T00:00:00Z"),
+            ]})
+            assert response.status_code == 200
+            completed_at = datetime.fromisoformat(response.json()["sessions"][0]["completed_at"])
+            assert completed_at <= datetime.utcnow()
+            profile = (await api.get(f"/api/users/{user['id']}")).json()
+            assert profile["last_practice_date"] == str(completed_at.date())
+
+    asyncio.run(scenario())
+
+
+def test_batch_sessions_for_unknown_user_write_nothing(server, client):
+    async def scenario():
+        async with client() as api:
+            response = await api.post("/api/breathing-sessions/batch", json={"user_id": "ghost", "sessions": [session()]})
+            assert response.status_code == 404
+        assert await server.db.breathing_sessions.count_documents({}) == 0
+        assert await server.db.zen_coin_transactions.count_documents({}) == 0
+
+    asyncio.run(scenario())
+
+
+def test_session_and_course_for_unknown_user_write_nothing(server, client):
+    async def scenario():
+        async with client() as api:
+            response = await api.post("/api/breathing-sessions", json={"user_id": "ghost", **session()})
+            assert response.status_code == 404
+            course = server.catalog.courses[0]
+            response = await api.post(f"/api/courses/{course.id}/complete", params={"user_id": "ghost"})
+            assert response.status_code == 404
+            stats = (await api.get("/api/oasis/stats")).json()
+        assert await server.db.breathing_sessions.count_documents({}) == 0
+        assert await server.db.course_completions.count_documents({}) == 0
+        assert (stats["total_sessions"], stats["total_cycles"]) == (0, 0)
+        assert await server.db.oasis_stats.count_documents({}) == 0
+
+    asyncio.run(scenario())
+
+
+def test_bootstrap_matches_the_endpoints_it_replaces(server, client):
+    async def scenario():
+        async with client() as api:
+            user = await create_user(api)
+            await create_user(api, "bob")
+            await api.post("/api/breathing-sessions", json={"user_id": user["id"], **session()})
+
+            response = await api.get(f"/api/bootstrap/{user['id']}", params={"leaderboard_limit": 5})
+            assert response.status_code == 200
+            bootstrap = response.json()
+            assert set(bootstrap) == {
+                "user", "achievements", "user_achievements", "courses", "available_courses", "leaderboard", "rank",
+            }
+            profile = (await api.get(f"/api/users/{user['id']}")).json()
+            assert bootstrap["user"] == profile
+            assert bootstrap["achievements"] == (await api.get("/api/achievements")).json()
+            assert bootstrap["user_achievements"] == (await api.get(f"/api/achievements/{user['id']}")).json()
+            assert {achievement["id"] for achievement in bootstrap["user_achievements"]} == set(profile["achievements"])
+            assert bootstrap["courses"] == (await api.get("/api/courses")).json()
+            assert bootstrap["available_courses"] == (await api.get(f"/api/courses/{user['id']}/available")).json()
+            assert bootstrap["leaderboard"] == (await api.get("/api/leaderboard", params={"limit": 5})).json()
+            assert bootstrap["rank"] == (await api.get(f"/api/leaderboard/rank/{user['id']}")).json()
+            assert bootstrap["rank"]["rank"] == 1 and len(bootstrap["leaderboard"]) == 2
+
+            assert (await api.get("/api/bootstrap/ghost")).status_code == 404
+
+    asyncio.run(scenario())
@@ -0,0 +1,132 @@
+import asyncio
+from datetime import date, datetime
+
+from leaderboard import InMemoryLeaderboard
+import pytest
+
+from unit_of_work import ProfileNotFound, UnitOfWork, merge_update
+
+
+class RecordingProfiles:
+    """Stands in for UserProfileRepository and records every call it gets"""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.calls = []
+
+    async def get(self, user_id, projection):
+        self.calls.append(("get", user_id))
+        return dict(self.doc)
+
+    async def update_and_get(self, user_id, update, projection):
+        self.calls.append(("update_and_get", user_id, update))
+        return dict(self.doc)
+
+    async def record_practice(self, user_id, days, now, projection, update):
+        self.calls.append(("record_practice", user_id, days, update))
+        return dict(self.doc)
+
+
+class RecordingLedger:
+    def __init__(self, known=None):
+        self.submits = []
+        self.known = known
+
+    async def submit(self, user_id, inc, transactions):
+        self.submits.append((user_id, inc, transactions))
+        return inc is None or self.known is None or user_id in self.known
+
+
+def test_merge_update_combines_operators():
+    update = {}
+    merge_update(update, {"$inc": {"zen_coins": 10}, "$addToSet": {"achievements": {"$each": ["a"]}}})
+    merge_update(update, {"$inc": {"zen_coins": 5, "mood_entries": 1}, "$addToSet": {"achievements": "b"}})
+    merge_update(update, {"$bit": {"course_bits.0": {"or": 1}}, "$set": {"x": 1}})
+    merge_update(update, {"$bit": {"course_bits.0": {"or": 4}}, "$set": {"x": 2}})
+    assert update == {
+        "$inc": {"zen_coins": 15, "mood_entries": 1},
+        "$addToSet": {"achievements": {"$each": ["a", "b"]}},
+        "$bit": {"course_bits.0": {"or": 5}},
+        "$set": {"x": 2},
+    }
+
+
+def test_profile_is_read_once_and_written_once():
+    async def scenario():
+        profiles, ledger = RecordingProfiles({"id": "u1"}), RecordingLedger()
+        uow = UnitOfWork(profiles, ledger, InMemoryLeaderboard())
+        await uow.get("u1")
+        await uow.get("u1")
+        uow.inc("u1", {"zen_coins": 10})
+        uow.inc("u1", {"zen_coins": 5, "courses_completed": 1})
+        uow.stage("u1", {"$bit": {"course_bits.0": {"or": 2}}})
+        uow.record("u1", {"amount": 10})
+        uow.record("u1", {"amount": 5})
+        await uow.flush("u1")
+        await uow.get("u1")
+        await uow.commit()
+
+        assert [call[0] for call in profiles.calls] == ["get", "update_and_get"]
+        update = profiles.calls[1][2]
+        assert update["$inc"] == {"zen_coins": 15, "courses_completed": 1}
+        assert update["$bit"] == {"course_bits.0": {"or": 2}}
+        assert ledger.submits == [("u1", None, [{"amount": 10}, {"amount": 5}])]
+        assert await uow.leaderboard.rank("u1") == (0, 15)
+
+    asyncio.run(scenario())
+
+
+def test_practice_folds_staged_increments_into_the_pipeline():
+    async def scenario():
+        profiles = RecordingProfiles({"id": "u1"})
+        uow = UnitOfWork(profiles, RecordingLedger(), InMemoryLeaderboard())
+        uow.practice("u1", date(2025, 6, 5), datetime(2025, 6, 5, 9))
+        uow.practice("u1", date(2025, 6, 4), datetime(2025, 6, 5, 9))
+        uow.inc("u1", {"zen_coins": 10})
+        await uow.commit()
+        assert profiles.calls == [
+            ("record_practice", "u1", [date(2025, 6, 5), date(2025, 6, 4)], {"$inc": {"zen_coins": 10}})
+        ]
+
+    asyncio.run(scenario())
+
+
+def test_increment_only_changes_are_group_committed_by_the_ledger():
+    async def scenario():
+        profiles, ledger = RecordingProfiles({"id": "u1"}), RecordingLedger()
+        uow = UnitOfWork(profiles, ledger, InMemoryLeaderboard())
+        uow.inc("u1", {"zen_coins": 25})
+        uow.record("u1", {"amount": 25})
+        await uow.commit()
+        assert profiles.calls == []
+        assert ledger.submits == [("u1", {"zen_coins": 25}, [{"amount": 25}])]
+
+    asyncio.run(scenario())
+
+
+def test_changes_for_unknown_users_are_not_ranked_and_raise():
+    async def scenario():
+        leaderboard = InMemoryLeaderboard()
+        uow = UnitOfWork(RecordingProfiles({"id": "u1"}), RecordingLedger(known={"u1"}), leaderboard)
+        uow.inc("ghost", {"zen_coins": 5})
+        uow.inc("u1", {"zen_coins": 5})
+        with pytest.raises(ProfileNotFound) as raised:
+            await uow.commit()
+        assert raised.value.user_id == "ghost"
+        assert await leaderboard.rank("ghost") is None
+        assert await leaderboard.rank("u1") == (0, 5)
+
+        profiles = RecordingProfiles({"id": "u1"})
+
+        async def missing(*args):
+            return None
+
+        profiles.update_and_get = missing
+        uow = UnitOfWork(profiles, RecordingLedger(), leaderboard)
+        uow.stage("ghost", {"$set": {"x": 1}})
+        uow.record("ghost", {"amount": 5})
+        with pytest.raises(ProfileNotFound):
+            await uow.commit()
+        assert uow.ledger.submits == []
+
+    asyncio.run(scenario())